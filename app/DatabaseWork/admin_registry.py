@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+class AdminRegistry:
+    """
+    Список администраторов бота в памяти процесса (таблица users из master.db).
+    \n\nЗагружается один раз (при запуске бота или при первом обращении) и пополняется в DatabaseManager.set_admin,
+    поэтому проверка прав и поиск главного администратора не обращаются к базе данных.
+    \nГлавный администратор - первый добавленный (наименьший id в таблице users).
+    """
+
+    def __init__(self):
+        self._admins: set[int] = set()
+        self._ordered_admins: List[int] = []
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"AdminRegistry('admins:{len(self._admins)}', 'loaded:{self._loaded}')"
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self, loader: Callable[[], Awaitable[Optional[List[int]]]]):
+        """
+        Загружает (или перезагружает) список администраторов.
+
+        :param loader: Корутина, возвращающая telegram_id администраторов в порядке добавления
+            или None, если master.db еще не инициализирована (тогда загрузка повторится при следующем обращении).
+        """
+        async with self._lock:
+            admins_telegram_id = await loader()
+
+            if admins_telegram_id is None:
+                return
+
+            self._ordered_admins = list(dict.fromkeys(admins_telegram_id))
+            self._admins = set(self._ordered_admins)
+            self._loaded = True
+
+            logger.info(f'Список администраторов загружен: {len(self._admins)}')
+
+    async def ensure_loaded(self, loader: Callable[[], Awaitable[Optional[List[int]]]]):
+        """Загружает список администраторов, если он еще не загружен."""
+        if not self._loaded:
+            await self.load(loader)
+
+    def add(self, telegram_id: int):
+        """Добавляет администратора после записи в таблицу users."""
+        if telegram_id not in self._admins:
+            self._admins.add(telegram_id)
+            self._ordered_admins.append(telegram_id)
+
+    def is_admin(self, telegram_id: int) -> bool:
+        return telegram_id in self._admins
+
+    def get_admins(self) -> List[int]:
+        """telegram_id администраторов в порядке добавления."""
+        return list(self._ordered_admins)
+
+    def get_owner(self) -> Optional[int]:
+        """telegram_id главного администратора или None, если администраторов нет."""
+        return self._ordered_admins[0] if self._ordered_admins else None
+
+
+# Общий список администраторов для всех экземпляров DatabaseManager
+admin_registry = AdminRegistry()
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+import aiosqlite
+from SPyderSQL import AsyncSQLite
+
+logger = logging.getLogger(__name__)
+
+
+# Constants
+MAX_OPEN_CONNECTIONS = 64
+
+# Настройки SQLite для каждого открываемого соединения, переопределяются переменными окружения (.env).
+# journal_mode=WAL: читатели не ждут писателей. synchronous=NORMAL в режиме WAL не теряет целостность базы,
+# cache_size < 0 - размер кэша страниц в КиБ на соединение, mmap_size - байт файла, читаемых через mmap (0 - выключено).
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-4000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024))),
+}
+
+WAL_CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+class ConnectionRegistry:
+    """
+    Реестр долгоживущих асинхронных соединений, общий для всего процесса.
+    \n\nНа каждый файл базы данных (database/{number_match}.db и master.db) открывается одно соединение,
+    которое переиспользуется всеми экземплярами DatabaseManager.
+    \nЧисло открытых соединений ограничено max_open: при превышении закрывается самое давно использованное (LRU).
+    """
+
+    def __init__(self, max_open: int = MAX_OPEN_CONNECTIONS, pragmas: Optional[Dict[str, Any]] = None):
+        self.max_open = max_open
+        self.pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        self._connections: OrderedDict[str, aiosqlite.Connection] = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._registry_lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"ConnectionRegistry('open:{len(self._connections)}', 'max_open:{self.max_open}')"
+
+    def __len__(self):
+        return len(self._connections)
+
+    def _lock(self, db_path: str) -> asyncio.Lock:
+        lock = self._locks.get(db_path)
+        if lock is None:
+            lock = self._locks[db_path] = asyncio.Lock()
+        return lock
+
+    async def _open(self, db_path: str) -> aiosqlite.Connection:
+        """Возвращает открытое соединение для db_path, при необходимости открывая новое и вытесняя старые."""
+        async with self._registry_lock:
+            db = self._connections.get(db_path)
+
+            if db is not None:
+                self._connections.move_to_end(db_path)
+                return db
+
+            await self._evict()
+
+            db = aiosqlite.connect(db_path)
+            db.daemon = True  # Поток соединения не должен удерживать процесс, если бот упал до close_all
+            await db
+            db.row_factory = aiosqlite.Row  # Для доступа к столбцам по имени
+
+            await self._apply_pragmas(db_path, db)
+
+            self._connections[db_path] = db
+            logger.info(f'Открыто соединение с {db_path}. Открытых соединений: {len(self._connections)}')
+
+            return db
+
+    async def _apply_pragmas(self, db_path: str, db: aiosqlite.Connection):
+        """
+        Применяет self.pragmas к только что открытому соединению.
+        \n\njournal_mode=WAL записывается в сам файл базы, остальные настройки действуют только на это соединение.
+        """
+        for name, value in self.pragmas.items():
+            async with db.execute(f'PRAGMA {name} = {value}') as cursor:
+                row = await cursor.fetchone()
+
+            if name == 'journal_mode' and row and str(row[0]).upper() != str(value).upper():
+                logger.warning(f'Не удалось включить journal_mode={value} для {db_path}, текущий режим: {row[0]}')
+
+    async def _evict(self):
+        """
+        Закрывает давно не использованные соединения, пока их число не станет меньше max_open.
+        \n\nСоединения, занятые запросом в данный момент, не трогаются.
+        """
+        for db_path in list(self._connections):
+            if len(self._connections) < self.max_open:
+                return
+
+            if self._lock(db_path).locked():
+                continue
+
+            db = self._connections.pop(db_path)
+            await db.close()
+            logger.info(f'Соединение с {db_path} закрыто (LRU).')
+
+        if len(self._connections) >= self.max_open:
+            logger.warning(f'Все {len(self._connections)} соединений заняты, лимит {self.max_open} временно превышен.')
+
+    @asynccontextmanager
+    async def connection(self, db_path: str) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Выдает соединение с базой данных в монопольное пользование на время блока async with.
+        \n\nВнутри блока нельзя обращаться к тому же файлу через DatabaseManager - соединение уже занято.
+
+        :param db_path: Путь к файлу базы данных.
+        """
+        async with self._lock(db_path):
+            yield await self._open(db_path)
+
+    @asynccontextmanager
+    async def transaction(self, db_path: str, immediate: bool = False) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Выдает соединение внутри одной транзакции: COMMIT при успешном выходе из блока, ROLLBACK при ошибке.
+
+        :param db_path: Путь к файлу базы данных.
+        :param immediate: BEGIN IMMEDIATE - сразу взять блокировку на запись (для read-modify-write).
+        """
+        async with self.connection(db_path) as db:
+            await db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            else:
+                await db.commit()
+
+    async def execute(self, db_path: str, query: str, parameters: tuple = ()) -> Optional[List[Dict[str, Any]]]:
+        """
+        Выполняет запрос на общем соединении.
+
+        :return: Список словарей для SELECT, иначе None.
+        """
+        async with self.connection(db_path) as db:
+            try:
+                async with db.execute(query, parameters) as cursor:
+                    if query.strip().upper().startswith('SELECT'):
+                        return [dict(row) for row in await cursor.fetchall()]
+                await db.commit()
+                return None
+            except aiosqlite.Error:
+                await db.rollback()
+                raise
+
+    async def executemany(self, db_path: str, query: str, parameters_list: List[tuple]):
+        """Выполняет запрос для множества параметров одной транзакцией на общем соединении."""
+        async with self.connection(db_path) as db:
+            try:
+                await db.executemany(query, parameters_list)
+                await db.commit()
+            except aiosqlite.Error:
+                await db.rollback()
+                raise
+
+    async def checkpoint(self, db_path: str, mode: str = 'PASSIVE') -> Dict[str, Any]:
+        """
+        Переносит страницы из WAL-файла в базу данных (PRAGMA wal_checkpoint).
+        \n\nPASSIVE не ждет читателей и писателей: переносит только то, что можно перенести прямо сейчас.
+
+        :param db_path: Путь к файлу базы данных.
+        :param mode: PASSIVE, FULL, RESTART или TRUNCATE.
+        :return: {'busy': 0|1, 'wal_frames': ..., 'checkpointed_frames': ..., 'wal_size': байт WAL-файла после checkpoint}
+        """
+        mode = mode.upper()
+
+        if mode not in WAL_CHECKPOINT_MODES:
+            raise ValueError(f'Неизвестный режим checkpoint: {mode}')
+
+        async with self.connection(db_path) as db:
+            async with db.execute(f'PRAGMA wal_checkpoint({mode})') as cursor:
+                busy, wal_frames, checkpointed_frames = await cursor.fetchone()
+
+        return {
+            'busy': busy,
+            'wal_frames': wal_frames,
+            'checkpointed_frames': checkpointed_frames,
+            'wal_size': get_wal_size(db_path),
+        }
+
+    async def close(self, db_path: str):
+        """Закрывает соединение с конкретной базой данных (например, перед удалением файла матча)."""
+        async with self._lock(db_path):
+            async with self._registry_lock:
+                db = self._connections.pop(db_path, None)
+
+            if db is not None:
+                await db.close()
+                logger.info(f'Соединение с {db_path} закрыто.')
+
+    async def close_all(self):
+        """Закрывает все открытые соединения. Вызывается при выключении бота."""
+        for db_path in list(self._connections):
+            await self.close(db_path)
+
+
+def get_wal_size(db_path: str) -> int:
+    """Размер WAL-файла базы данных в байтах, 0 - если файла нет."""
+    try:
+        return os.path.getsize(f'{db_path}-wal')
+    except OSError:
+        return 0
+
+
+connection_registry = ConnectionRegistry()
+
+
+class PooledAsyncSQLite(AsyncSQLite):
+    """
+    AsyncSQLite из SPyderSQL, который выполняет запросы через connection_registry,
+    вместо открытия и закрытия файла базы данных на каждый запрос.
+    \n\nПостроение запросов (create, select, where, update...) не меняется.
+    """
+
+    async def execute(self, parameters: Optional[tuple] = None) -> Optional[List[Dict[str, Any]]]:
+        try:
+            return await connection_registry.execute(self.db_path, self.query, parameters or tuple(self.parameters))
+        except aiosqlite.Error as error:
+            logger.error(f"Ошибка при выполнении запроса: {error}")
+            return None
+        finally:
+            self.reset()
+
+    async def executemany(self, parameters_list: List[tuple]):
+        try:
+            await connection_registry.executemany(self.db_path, self.query, parameters_list)
+        except aiosqlite.Error as error:
+            logger.error(f"Ошибка при выполнении множественного запроса: {error}")
+        finally:
+            self.reset()
+
+    async def fetch_one(self, parameters: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+        try:
+            result = await connection_registry.execute(self.db_path, self.query, parameters or tuple(self.parameters))
+            if result:
+                return result[0]
+            return None
+        except aiosqlite.Error as error:
+            logger.error(f"Ошибка при выполнении запроса: {error}")
+            return None
+        finally:
+            self.reset()
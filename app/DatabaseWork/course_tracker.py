@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Callable, Awaitable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+# Constants
+COURSE_UPDATE_DEBOUNCE = 2.0  # секунд тишины после последнего изменения перед пересчетом
+COURSE_UPDATE_MAX_DELAY = 10.0  # пересчет не откладывается дольше этого времени после первого изменения
+
+
+class CourseUpdateTracker:
+    """
+    Отслеживание валют, у которых изменился current_amount ("грязные" валюты), и отложенный пересчет только их курсов.
+    \n\nПосле записи DatabaseManager отмечает валюту через mark_dirty. Пересчет по матчу запускается, когда изменения
+    затихли на debounce секунд, но не позже max_delay секунд после первого изменения - серия переводов дает один UPDATE.
+    \nПолный пересчет всех матчей в планировщике остается как страховка согласованности.
+    """
+
+    def __init__(self, debounce: float = COURSE_UPDATE_DEBOUNCE, max_delay: float = COURSE_UPDATE_MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self._dirty: Dict[str, set[int]] = {}
+        self._first_marked: Dict[str, float] = {}
+        self._last_marked: Dict[str, float] = {}
+        self._recalculate: Dict[str, Callable[[set[int]], Awaitable[int]]] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._flushing: set[str] = set()  # матчи, у которых сейчас идет recalculate
+        self._stopping = False
+
+        self.marked = 0
+        self.flushes = 0
+        self.recalculated = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return f"CourseUpdateTracker('dirty_matches:{len(self._dirty)}', 'flushes:{self.flushes}')"
+
+    def mark_dirty(self, match_key: str, currency_ids: Iterable[int], recalculate: Callable[[set[int]], Awaitable[int]]):
+        """
+        Отмечает валюты матча для пересчета курса.
+
+        :param match_key: Ключ матча (DatabaseManager.metadata_key).
+        :param currency_ids: Id валют, у которых изменился current_amount.
+        :param recalculate: Корутина пересчета курсов переданных валют (DatabaseManager.update_course_currencies).
+        """
+        currency_ids = set(currency_ids)
+
+        if not currency_ids:
+            return
+
+        now = time.monotonic()
+
+        self._dirty.setdefault(match_key, set()).update(currency_ids)
+        self._first_marked.setdefault(match_key, now)
+        self._last_marked[match_key] = now
+        self._recalculate[match_key] = recalculate
+        self.marked += len(currency_ids)
+
+        timer = self._timers.get(match_key)
+
+        if timer is None or timer.done():
+            self._timers[match_key] = asyncio.create_task(self._wait_and_flush(match_key), name=f'course_update:{match_key}')
+
+    async def _wait_and_flush(self, match_key: str):
+        """
+        Ждет затишья в изменениях матча (или max_delay) и пересчитывает накопленные валюты.
+        \n\nВалюты, отмеченные во время пересчета или возвращенные после ошибки, не запускают новый таймер
+        (этот еще работает), поэтому после пересчета цикл проверяет их и пересчитывает следующим кругом.
+        При выключении (flush_all) цикл завершается после текущего пересчета, остальное пересчитывает flush_all.
+        """
+        while match_key in self._dirty and not self._stopping:
+            now = time.monotonic()
+            deadline = min(self._last_marked[match_key] + self.debounce, self._first_marked[match_key] + self.max_delay)
+
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+                continue
+
+            await self.flush(match_key)
+
+    async def flush(self, match_key: str) -> int:
+        """
+        Сразу пересчитывает накопленные валюты матча.
+        \n\nЕсли пересчет упал или был отменен, валюты возвращаются в ожидание (restore_dirty) и пересчитываются
+        следующим кругом, а не остаются со старым курсом до полного пересчета в планировщике.
+
+        :return: количество валют, у которых пересчитан курс
+        """
+        currency_ids = self._dirty.pop(match_key, None)
+        self._first_marked.pop(match_key, None)
+        self._last_marked.pop(match_key, None)
+        recalculate = self._recalculate.pop(match_key, None)
+
+        if not currency_ids or recalculate is None:
+            return 0
+
+        self._flushing.add(match_key)
+
+        try:
+            count_updated = await recalculate(currency_ids)
+        except asyncio.CancelledError:
+            self.restore_dirty(match_key, currency_ids, recalculate)
+            raise
+        except Exception as error:
+            self.errors += 1
+            self.restore_dirty(match_key, currency_ids, recalculate)
+            logger.error(f'Ошибка при пересчете курсов валют {sorted(currency_ids)} для {match_key}: {error}')
+            return 0
+        finally:
+            self._flushing.discard(match_key)
+
+        self.flushes += 1
+        self.recalculated += count_updated
+
+        logger.info(f'Курсы пересчитаны для {match_key}: валют {count_updated}')
+
+        return count_updated
+
+    def restore_dirty(self, match_key: str, currency_ids: set[int], recalculate: Callable[[set[int]], Awaitable[int]]):
+        """
+        Возвращает в ожидание валюты, пересчет которых не выполнен. Валюты, отмеченные за время пересчета, сохраняются.
+        \n\nОтсчет debounce начинается заново: после ошибки пересчет повторяется не сразу, а через debounce секунд.
+        """
+        now = time.monotonic()
+
+        self._dirty.setdefault(match_key, set()).update(currency_ids)
+        self._first_marked[match_key] = now
+        self._last_marked[match_key] = now
+        self._recalculate.setdefault(match_key, recalculate)
+
+    async def flush_all(self) -> int:
+        """
+        Пересчитывает все накопленные валюты всех матчей, не дожидаясь debounce. Вызывается при выключении бота.
+        \n\nТаймеры, которые ждут debounce, отменяются, а пересчеты, которые уже идут, дорабатывают до конца.
+        """
+        self._stopping = True
+
+        try:
+            for match_key, timer in self._timers.items():
+                if match_key not in self._flushing:
+                    timer.cancel()
+
+            await asyncio.gather(*self._timers.values(), return_exceptions=True)
+            self._timers.clear()
+
+            count_updated = 0
+
+            for match_key in list(self._dirty):
+                count_updated += await self.flush(match_key)
+        finally:
+            self._stopping = False
+
+        return count_updated
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: отмечено валют, пересчетов, пересчитано курсов, ошибок, матчей в ожидании."""
+        return {
+            'marked': self.marked,
+            'flushes': self.flushes,
+            'recalculated': self.recalculated,
+            'errors': self.errors,
+            'pending_matches': len(self._dirty),
+        }
+
+
+# Общий трекер для всех экземпляров DatabaseManager
+course_tracker = CourseUpdateTracker()
@@ -1,20 +1,35 @@
-import os
+import asyncio, hashlib, json, os, time
 from datetime import datetime
 import pytz
 
 import logging
 from typing import List, Dict, Any, Optional
 
-from SPyderSQL import AsyncSQLite
+import aiosqlite
+from app.MyException import InsufficientFundsError
+from app.DatabaseWork.connection_registry import PooledAsyncSQLite, connection_registry, get_wal_size
+from app.DatabaseWork.metadata_cache import metadata_cache, SECTION_COUNTRIES, SECTION_CURRENCY
+from app.DatabaseWork.admin_registry import admin_registry
+from app.DatabaseWork.course_tracker import course_tracker
 
 logger = logging.getLogger(__name__)
 
 
 # Constants
 MASTER_DB_PATH = 'database/master.db'
+TEMPLATES_DIRECTORY = 'database/templates'
 
+# Способ хранения матчей (переменная окружения DATABASE_STORAGE_MODE в .env):
+# files - отдельный файл database/{number_match}.db на каждый матч,
+# consolidated - все матчи в одной базе CONSOLIDATED_DB_PATH, строки матча отличаются столбцом match_number.
+STORAGE_FILES = 'files'
+STORAGE_CONSOLIDATED = 'consolidated'
+STORAGE_MODE = os.getenv('DATABASE_STORAGE_MODE', STORAGE_FILES)
+CONSOLIDATED_DB_PATH = os.getenv('DATABASE_CONSOLIDATED_PATH', 'database/matches.db')
 
-SPyderSQLite = AsyncSQLite
+
+# Все запросы идут через общий реестр долгоживущих соединений, а не открывают файл на каждый запрос
+SPyderSQLite = PooledAsyncSQLite
 
 
 COUNTRIES_BY_TYPE_MATCH = {
@@ -65,17 +80,284 @@ def get_country_names(type_match: str) -> List[str]:
     return COUNTRIES_BY_TYPE_MATCH.get(type_match, [])
 
 
+# Таблицы базы данных матча (id INTEGER PRIMARY KEY AUTOINCREMENT добавляется автоматически)
+MATCH_TABLES = {
+    'countries': {
+        'name': 'TEXT',
+        'telegram_id': 'INTEGER',
+        'admin': 'BLOB'
+    },
+    'country_choice_requests': {
+        'telegram_id': 'INTEGER',
+        'number_match': 'INTEGER',
+        'name_country': 'TEXT',
+        'unique_word': 'TEXT',
+        'admin_decision_message_id': 'INTEGER'
+    },
+    'currency': {
+        'country_id': 'INTEGER',
+        'name': 'TEXT',
+        'tick': 'TEXT',
+        'following_resource': 'TEXT',
+        'course_following': 'REAL',
+        'capitalization': 'INTEGER',
+        'emission': 'REAL',
+        'current_amount': 'REAL',
+        'current_course': 'REAL'
+    },
+    'currency_emission_requests': {
+        'number_match': 'INTEGER',
+        'telegram_id': 'INTEGER',
+        'country_id': 'INTEGER',
+        'name_currency': 'TEXT',
+        'tick_currency': 'TEXT',
+        'following_resource': 'TEXT',
+        'course_following': 'REAL',
+        'capitalization': 'INTEGER',
+        'amount_emission_currency': 'REAL',
+        'date_request_creation': 'TEXT',
+        'status_confirmed': 'BLOB',
+        'date_confirmed': 'TEXT',
+        'message_id_delete': 'INTEGER'
+    },
+    'bank_transfer_requests': {
+        'number_match': 'INTEGER',
+        'payer_country_id': 'INTEGER',
+        'beneficiary_country_id': 'INTEGER',
+        'currency_id': 'INTEGER',
+        'amount_currency_transfer': 'REAL',
+        'comment': 'TEXT',
+        'date_request_creation': 'TEXT',
+        'status_cancelled': 'BLOB',
+        'date_cancelled': 'TEXT'
+    },
+    'currency_holdings': {
+        'country_id': 'INTEGER',
+        'currency_id': 'INTEGER',
+        'amount': 'REAL'
+    },
+    'course_history': {
+        'resolution': 'TEXT',
+        'timestamp': 'INTEGER',
+        'currency_id': 'INTEGER',
+        'course': 'REAL',
+        'amount': 'REAL'
+    }
+}
+
+
+# Индексы базы данных матча под частые поиски: (название индекса, таблица, столбцы, уникальный)
+MATCH_INDEXES = [
+    ('idx_countries_telegram_id', 'countries', ['telegram_id'], False),
+    ('idx_countries_name', 'countries', ['name'], False),
+    ('idx_country_choice_requests_telegram_id', 'country_choice_requests', ['telegram_id'], False),
+    ('idx_country_choice_requests_unique_word', 'country_choice_requests', ['unique_word'], False),
+    ('idx_currency_country_id', 'currency', ['country_id'], False),
+    ('idx_currency_name', 'currency', ['name'], True),
+    ('idx_currency_tick', 'currency', ['tick'], True),
+    ('idx_currency_emission_requests_telegram_id', 'currency_emission_requests', ['telegram_id'], False),
+    ('idx_currency_emission_requests_country_id', 'currency_emission_requests', ['country_id'], False),
+    ('idx_bank_transfer_requests_payer', 'bank_transfer_requests', ['payer_country_id', 'date_request_creation'], False),
+    ('idx_bank_transfer_requests_currency_id', 'bank_transfer_requests', ['currency_id'], False),
+    ('idx_currency_holdings_country_currency', 'currency_holdings', ['country_id', 'currency_id'], True),
+    ('idx_course_history_currency_timestamp', 'course_history', ['currency_id', 'timestamp', 'resolution'], True),
+    ('idx_course_history_resolution_timestamp', 'course_history', ['resolution', 'timestamp'], False),
+]
+
+
+# Капитал государств: списание (только при достаточном остатке), удаление нулевых остатков и зачисление.
+# Параметры: :country_id, :currency_id, :amount. Подстановки {match_*} заполняет DatabaseManager.match_query.
+HOLDINGS_DEBIT_QUERY = (
+    "UPDATE currency_holdings SET amount = amount - :amount "
+    "WHERE country_id = :country_id AND currency_id = :currency_id AND amount >= :amount{match_and}"
+)
+HOLDINGS_CLEANUP_QUERY = (
+    "DELETE FROM currency_holdings "
+    "WHERE country_id = :country_id AND currency_id = :currency_id AND amount <= 0{match_and}"
+)
+HOLDINGS_CREDIT_QUERY = (
+    "INSERT INTO currency_holdings ({match_column}country_id, currency_id, amount) "
+    "VALUES ({match_value}:country_id, :currency_id, :amount) "
+    "ON CONFLICT ({match_column}country_id, currency_id) DO UPDATE SET amount = MAX(amount, 0) + excluded.amount"
+)
+
+
+# Пересчет курсов всех валют матча одним запросом: 1 / ((current_amount / emission) * course_following),
+# при current_amount <= 0 (или NULL, когда эмитент полностью раздал валюту) курс равен 1.
+# Валюты с нулевыми emission или course_following пропускаются, как и в update_course_alone_currency (деление на ноль).
+COURSE_RECALCULATION_QUERY = (
+    "UPDATE currency SET current_course = CASE "
+    "WHEN current_amount IS NULL OR current_amount <= 0 THEN 1 "
+    "ELSE ROUND(1.0 / ((current_amount * 1.0 / emission) * course_following), 9) END "
+    "WHERE (current_amount IS NULL OR current_amount <= 0 OR (emission != 0 AND course_following != 0)){match_and}"
+)
+
+# Запись курса одной валюты, посчитанного в update_course_alone_currency. Параметры: :currency_id, :course.
+COURSE_SET_QUERY = "UPDATE currency SET current_course = :course WHERE id = :currency_id{match_and}"
+
+
+# История курсов валют (таблица course_history): точки пишутся при каждом пересчете курса (raw),
+# со временем сжимаются в средние за час (hour), затем за сутки (day), самые старые сутки удаляются.
+# timestamp - unix-время начала интервала, секунд. Интервалы разных разрешений не пересекаются,
+# поэтому выборка без фильтра по разрешению дает непрерывный ряд: старые точки реже, свежие подробнее.
+COURSE_HISTORY_RAW = 'raw'
+COURSE_HISTORY_HOUR = 'hour'
+COURSE_HISTORY_DAY = 'day'
+
+COURSE_HISTORY_RAW_RETENTION = 2 * 24 * 60 * 60  # столько живут сырые точки до сжатия в часовые
+COURSE_HISTORY_HOUR_RETENTION = 60 * 24 * 60 * 60  # столько живут часовые точки до сжатия в суточные
+COURSE_HISTORY_DAY_RETENTION = 2 * 365 * 24 * 60 * 60  # суточные точки старше удаляются
+
+# Шаги сжатия: (исходное разрешение, итоговое разрешение, длина интервала, секунд, срок хранения исходных точек)
+COURSE_HISTORY_DOWNSAMPLING = [
+    (COURSE_HISTORY_RAW, COURSE_HISTORY_HOUR, 60 * 60, COURSE_HISTORY_RAW_RETENTION),
+    (COURSE_HISTORY_HOUR, COURSE_HISTORY_DAY, 24 * 60 * 60, COURSE_HISTORY_HOUR_RETENTION),
+]
+
+# Запись текущих курсов в историю. Параметры: :timestamp, :currency_ids (JSON-список id или NULL - все валюты).
+COURSE_HISTORY_RECORD_QUERY = (
+    "INSERT INTO course_history ({match_column}resolution, timestamp, currency_id, course, amount) "
+    "SELECT {match_column}'raw', :timestamp, id, current_course, current_amount FROM currency "
+    "WHERE current_course IS NOT NULL "
+    "AND (:currency_ids IS NULL OR id IN (SELECT value FROM json_each(:currency_ids))){match_and} "
+    "ON CONFLICT ({match_column}currency_id, timestamp, resolution) "
+    "DO UPDATE SET course = excluded.course, amount = excluded.amount"
+)
+
+# Сжатие точек :source старше :cutoff в средние значения за интервалы :bucket секунд с разрешением :target
+COURSE_HISTORY_DOWNSAMPLE_QUERY = (
+    "INSERT INTO course_history ({match_column}resolution, timestamp, currency_id, course, amount) "
+    "SELECT {match_column}:target, timestamp / :bucket * :bucket AS bucket_start, currency_id, AVG(course), AVG(amount) "
+    "FROM course_history WHERE resolution = :source AND timestamp < :cutoff{match_and} "
+    "GROUP BY {match_column}currency_id, bucket_start "
+    "ON CONFLICT ({match_column}currency_id, timestamp, resolution) "
+    "DO UPDATE SET course = excluded.course, amount = excluded.amount"
+)
+COURSE_HISTORY_DELETE_QUERY = "DELETE FROM course_history WHERE resolution = :source AND timestamp < :cutoff{match_and}"
+
+# Выборка истории за период. Параметры: :currency_ids (JSON-список id), :start, :end, :resolution (NULL - все).
+COURSE_HISTORY_RANGE_QUERY = (
+    "SELECT timestamp, currency_id, course, amount, resolution FROM course_history "
+    "WHERE currency_id IN (SELECT value FROM json_each(:currency_ids)) AND timestamp BETWEEN :start AND :end "
+    "AND (:resolution IS NULL OR resolution = :resolution){match_and} "
+    "ORDER BY currency_id, timestamp"
+)
+
+
+def get_match_scope(consolidated: bool, alias: str = '') -> Dict[str, str]:
+    """
+    Подстановки для шаблонов SQL-запросов по таблицам матча.
+    \n\nВ режиме files матч - это отдельный файл и подстановки пустые,
+    в режиме consolidated запрос ограничивается строками :match_number.
+
+    :param consolidated: Матч хранится в общей базе CONSOLIDATED_DB_PATH.
+    :param alias: Псевдоним таблицы с точкой (например 'h.') для запросов с JOIN.
+    """
+    if not consolidated:
+        return {'match_and': '', 'match_where': '', 'match_column': '', 'match_value': ''}
+
+    return {
+        'match_and': f' AND {alias}match_number = :match_number',
+        'match_where': f' WHERE {alias}match_number = :match_number',
+        'match_column': 'match_number, ',
+        'match_value': ':match_number, ',
+    }
+
+
+def get_all_matches_scope() -> Dict[str, str]:
+    """Подстановки для шаблонов SQL-запросов по строкам всех матчей общей базы: match_number без фильтра по матчу."""
+    return {**get_match_scope(consolidated=True), 'match_and': '', 'match_where': ''}
+
+
+def get_course_history_cutoffs(now: float) -> List[tuple]:
+    """
+    Границы сжатия истории курсов на момент now, выровненные по интервалам итогового разрешения,
+    чтобы сжимались только полностью прошедшие интервалы.
+
+    :return: [(исходное разрешение, итоговое разрешение, длина интервала, граница), ...]
+    """
+    return [
+        (source, target, bucket, int(now - retention) // bucket * bucket)
+        for source, target, bucket, retention in COURSE_HISTORY_DOWNSAMPLING
+    ]
+
+
+def remove_database_files(db_path: str):
+    """Удаляет файл базы данных вместе с файлами WAL-журнала (-wal, -shm), если они есть."""
+    for file_path in (db_path, f'{db_path}-wal', f'{db_path}-shm'):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def get_match_index_query(index_name: str, table_name: str, columns: List[str], unique: bool = False) -> str:
+    """Возвращает SQL-запрос создания индекса из MATCH_INDEXES."""
+    return f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})"
+
+
+def get_consolidated_tables() -> Dict[str, Dict[str, str]]:
+    """Таблицы матча для общей базы: те же MATCH_TABLES со столбцом match_number первым."""
+    return {
+        table_name: {'match_number': 'INTEGER NOT NULL', **columns}
+        for table_name, columns in MATCH_TABLES.items()
+    }
+
+
+def get_consolidated_indexes() -> List[tuple]:
+    """
+    Индексы MATCH_INDEXES для общей базы: match_number первым столбцом каждого индекса,
+    уникальность (например, названия валюты) действует в пределах матча.
+    """
+    return [
+        (index_name, table_name, ['match_number', *columns], unique)
+        for index_name, table_name, columns, unique in MATCH_INDEXES
+    ]
+
+
+def get_match_template_path(type_match: str) -> str:
+    """
+    Путь к шаблону базы данных матча для type_match.
+    \n\nВ названии файла есть отпечаток схемы и списка стран, поэтому при их изменении путь меняется и шаблон собирается заново.
+    """
+    fingerprint_source = json.dumps(
+        [type_match, get_country_names(type_match), MATCH_TABLES, MATCH_INDEXES],
+        ensure_ascii=False,
+        sort_keys=True
+    )
+
+    type_hash = hashlib.md5(type_match.encode()).hexdigest()[:8]
+    fingerprint = hashlib.md5(fingerprint_source.encode()).hexdigest()[:12]
+
+    return f'{TEMPLATES_DIRECTORY}/{type_hash}_{fingerprint}.db'
+
 
 
 class DatabaseManager:
 
     count = 0  # Статическая переменная для хранения количества экземпляров
 
-    def __init__(self, database_path: str = None):
+    templates_lock = asyncio.Lock()  # Один шаблон матча собирается только одной задачей
 
+    consolidated_lock = asyncio.Lock()  # Схема общей базы матчей создается один раз за процесс
+    consolidated_ready = False
+
+    course_history_ready: set[str] = set()  # Базы, в которых таблица course_history уже проверена за этот процесс
+
+    def __init__(self, database_path: str = None, storage_mode: str = None):
+        """
+        :param database_path: Номер матча. Без номера - мастер-база.
+        :param storage_mode: STORAGE_FILES или STORAGE_CONSOLIDATED. По умолчанию STORAGE_MODE из настроек.
+        """
         DatabaseManager.count += 1
 
-        if database_path:
+        storage_mode = storage_mode or STORAGE_MODE
+
+        # Номер матча в общей базе. None - мастер-база или матч в отдельном файле.
+        self.match_number: int | None = None
+
+        if database_path and storage_mode == STORAGE_CONSOLIDATED:
+            self.match_number = int(database_path)
+            self.SPyderSQLite = SPyderSQLite(CONSOLIDATED_DB_PATH)
+        elif database_path:
             self.SPyderSQLite = SPyderSQLite(f'database/{database_path}.db')
         else:
             self.SPyderSQLite = SPyderSQLite(MASTER_DB_PATH)
@@ -91,6 +373,45 @@ class DatabaseManager:
         return f"count:{self.count}', database_path:{self.SPyderSQLite}"
 
 
+    @property
+    def consolidated(self) -> bool:
+        """Матч хранится в общей базе CONSOLIDATED_DB_PATH."""
+        return self.match_number is not None
+
+    @property
+    def metadata_key(self) -> str:
+        """Ключ матча в metadata_cache: путь к файлу матча или путь к общей базе с номером матча."""
+        if self.consolidated:
+            return f'{self.SPyderSQLite.db_path}#{self.match_number}'
+        return self.SPyderSQLite.db_path
+
+    def match_query(self, query: str, alias: str = '') -> str:
+        """Заполняет подстановки {match_*} в шаблоне SQL-запроса по таблицам матча (см. get_match_scope)."""
+        return query.format(**get_match_scope(self.consolidated, alias))
+
+    def match_parameters(self, parameters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Добавляет :match_number к именованным параметрам запроса, если матч хранится в общей базе."""
+        parameters = dict(parameters or {})
+
+        if self.consolidated:
+            parameters['match_number'] = self.match_number
+
+        return parameters
+
+    def match_where(self, table_name: str, where_clause: dict = None) -> dict | None:
+        """Ограничивает where_clause строками текущего матча для таблиц MATCH_TABLES в общей базе."""
+        if self.consolidated and table_name in MATCH_TABLES:
+            return {**(where_clause or {}), 'match_number': self.match_number}
+
+        return where_clause
+
+    def match_insert(self, table_name: str, columns: List[str], values: tuple) -> tuple[List[str], tuple]:
+        """Добавляет столбец match_number к вставляемой строке для таблиц MATCH_TABLES в общей базе."""
+        if self.consolidated and table_name in MATCH_TABLES:
+            return ['match_number', *columns], (self.match_number, *values)
+
+        return columns, values
+
     async def create(self, table_name: str, columns: dict):
         """Создает таблицу в базе данных."""
         await self.SPyderSQLite.create(
@@ -101,6 +422,8 @@ class DatabaseManager:
 
     async def insert(self, table_name: str, columns: List[str], values: tuple):
         """Вставляет запись в таблицу."""
+        columns, values = self.match_insert(table_name, columns, values)
+
         await self.SPyderSQLite.insert(
             name_table=table_name,
             names_columns=columns
@@ -108,6 +431,8 @@ class DatabaseManager:
 
     async def select(self, table_name: str, columns: List[str] = None, where_clause: dict = None):
         """Выбирает записи из таблицы."""
+        where_clause = self.match_where(table_name, where_clause)
+
         if columns and where_clause is None:
             return await self.SPyderSQLite.select(
                 name_table=table_name,
@@ -134,23 +459,65 @@ class DatabaseManager:
             logger.error('Что-то пошло не так. проблема в методе SELECT в DatabaseManager из app.DatabaseWork.database.py')
             return None
 
+    async def select_one(self, table_name: str, columns: List[str], where_clause: dict) -> dict | None:
+        """Выбирает первую запись из таблицы, подходящую под where_clause (WHERE ... LIMIT 1)."""
+        where_clause = self.match_where(table_name, where_clause)
+
+        records = await self.SPyderSQLite.select(
+            name_table=table_name,
+            names_columns=columns,
+        ).where(conditions=where_clause).limit(1).execute()
+
+        if records:
+            return records[0]
+        return None
+
     async def delete(self, table_name: str, where_clause: dict):
         """Удаляет записи из таблицы."""
+        where_clause = self.match_where(table_name, where_clause)
+
         await self.SPyderSQLite.delete(
             name_table=table_name,
         ).where(where_clause).execute()
 
     async def update(self, table_name: str, data_set: Dict[str, Any], where_clause: Dict[str, Any]):
         """Обновляет записи в таблице."""
+        where_clause = self.match_where(table_name, where_clause)
+
         await self.SPyderSQLite.update(
             name_table=table_name,
             data_set=data_set
         ).where(where_clause).execute()
 
+    async def execute(self, query: str, parameters: tuple = ()) -> Optional[List[Dict[str, Any]]]:
+        """
+        Выполняет готовый SQL-запрос, которого нет в конструкторе SPyderSQL (индексы, EXISTS, арифметика в UPDATE).
+        \n\nВ отличие от остальных методов, ошибки базы данных не глушит, а пробрасывает выше.
+
+        :return: Список словарей для SELECT, иначе None.
+        """
+        return await connection_registry.execute(self.SPyderSQLite.db_path, query, parameters)
+
+
+    async def checkpoint_wal(self, mode: str = 'PASSIVE') -> Dict[str, Any] | None:
+        """
+        Запускает checkpoint WAL-журнала базы данных (мастер-базы или матча).
+        \n\nЕсли WAL-файла нет (соединение закрыто, журнал уже перенесен), база не открывается и возвращается None.
+
+        :param mode: PASSIVE, FULL, RESTART или TRUNCATE
+        :return: {'busy', 'wal_frames', 'checkpointed_frames', 'wal_size'} или None
+        """
+        db_path = self.SPyderSQLite.db_path
+
+        if not get_wal_size(db_path):
+            return None
+
+        return await connection_registry.checkpoint(db_path, mode=mode)
+
 
     async def update_course_alone_currency(self, data_currency: dict):
         """
-        Обновляет курс конкретной валюты
+        Обновляет курс конкретной валюты и записывает его в историю курсов одной транзакцией.
         \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param data_currency: Пример {'id': 1, 'country_id': 28, 'name': 'крон', 'tick': 'KRN', 'following_resource': 'silver', 'course_following': 1000.0, 'capitalization': 50000, 'emission': 50000000.0, 'current_amount': 50000000.0, 'current_course': 1.001}
@@ -171,43 +538,274 @@ class DatabaseManager:
             new_course = 1
 
 
-        data_set = {
-            'current_course': new_course
-        }
+        async with connection_registry.transaction(self.SPyderSQLite.db_path, immediate=True) as db:
+            await db.execute(
+                self.match_query(COURSE_SET_QUERY),
+                self.match_parameters({'course': new_course, 'currency_id': currency_id})
+            )
+            await self.record_course_history(db, currency_ids=[currency_id])
 
-        where_clause = {
-            'id': currency_id
-        }
 
-        await self.update(
-            table_name='currency',
-            data_set=data_set,
-            where_clause=where_clause
+    async def update_course_all_currencies(self) -> int:
+        """
+        Пересчитывает курсы всех валют матча одним UPDATE (COURSE_RECALCULATION_QUERY) вместо запроса на каждую валюту.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+
+        :return: количество валют, у которых пересчитан курс
+        """
+        await self.create_course_history_table()
+
+        async with connection_registry.transaction(self.SPyderSQLite.db_path) as db:
+            cursor = await db.execute(self.match_query(COURSE_RECALCULATION_QUERY), self.match_parameters())
+            await self.record_course_history(db)
+
+            return cursor.rowcount
+
+    async def update_course_currencies(self, currency_ids: set[int] | list[int]) -> int:
+        """
+        Пересчитывает курсы только переданных валют матча одним UPDATE (COURSE_RECALCULATION_QUERY по списку id).
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+
+        :param currency_ids: Id валют, у которых изменился current_amount
+        :return: количество валют, у которых пересчитан курс
+        """
+        await self.create_course_history_table()
+
+        async with connection_registry.transaction(self.SPyderSQLite.db_path) as db:
+            cursor = await db.execute(
+                self.match_query(COURSE_RECALCULATION_QUERY) + " AND id IN (SELECT value FROM json_each(:currency_ids))",
+                self.match_parameters({'currency_ids': json.dumps(sorted(currency_ids))})
+            )
+            await self.record_course_history(db, currency_ids=currency_ids)
+
+            return cursor.rowcount
+
+    def mark_courses_dirty(self, *currency_ids: int):
+        """
+        Отмечает валюты матча, у которых изменился current_amount: их курсы пересчитает course_tracker
+        после короткой паузы (debounce), одним запросом на серию изменений.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+        """
+        course_tracker.mark_dirty(self.metadata_key, currency_ids, self.update_course_currencies)
+
+    @staticmethod
+    async def update_course_all_matches() -> int:
+        """
+        Пересчитывает курсы валют всех матчей общей базы (режим consolidated) одним UPDATE.
+
+        :return: количество валют, у которых пересчитан курс
+        """
+        await DatabaseManager.initialize_consolidated_storage()
+
+        async with connection_registry.transaction(CONSOLIDATED_DB_PATH) as db:
+            cursor = await db.execute(COURSE_RECALCULATION_QUERY.format(**get_match_scope(consolidated=False)))
+            await db.execute(
+                COURSE_HISTORY_RECORD_QUERY.format(**get_all_matches_scope()),
+                {'timestamp': int(time.time()), 'currency_ids': None}
+            )
+
+            return cursor.rowcount
+
+    async def create_course_history_table(self):
+        """
+        Создает таблицу course_history с индексами в базе матча, если ее нет (матчи, созданные до истории курсов).
+        \n\nПроверка выполняется один раз за процесс для каждой базы данных.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+        """
+        db_path = self.SPyderSQLite.db_path
+
+        if db_path in DatabaseManager.course_history_ready:
+            return
+
+        if self.consolidated:
+            # Схема общей базы создается целиком, вместе с course_history
+            await self.initialize_consolidated_storage()
+        else:
+            sql_builder = SPyderSQLite(db_path)
+
+            async with connection_registry.transaction(db_path) as db:
+                await db.execute(
+                    sql_builder.create(
+                        name_table='course_history',
+                        append_columns=MATCH_TABLES['course_history'],
+                        id_primary_key=True
+                    ).build()
+                )
+
+                for index in MATCH_INDEXES:
+                    if index[1] == 'course_history':
+                        await db.execute(get_match_index_query(*index))
+
+        DatabaseManager.course_history_ready.add(db_path)
+
+    async def record_course_history(self, db: aiosqlite.Connection, currency_ids: set[int] | list[int] = None):
+        """
+        Записывает текущие курсы валют матча в историю курсов (разрешение raw) в рамках транзакции db.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+
+        :param db: Соединение из connection_registry.transaction, в котором пересчитаны курсы.
+        :param currency_ids: Id валют, None - все валюты матча.
+        """
+        await db.execute(
+            self.match_query(COURSE_HISTORY_RECORD_QUERY),
+            self.match_parameters({
+                'timestamp': int(time.time()),
+                'currency_ids': json.dumps(sorted(currency_ids)) if currency_ids is not None else None
+            })
         )
 
+    @staticmethod
+    async def downsample_course_history(db_path: str, scope: Dict[str, str], parameters: Dict[str, Any]) -> int:
+        """
+        Сжимает историю курсов по шагам COURSE_HISTORY_DOWNSAMPLING и удаляет суточные точки
+        старше COURSE_HISTORY_DAY_RETENTION. Выполняется одной транзакцией.
+
+        :param db_path: Путь к базе данных.
+        :param scope: Подстановки {match_*} (get_match_scope или get_all_matches_scope).
+        :param parameters: Параметры матча (:match_number).
+        :return: количество удаленных точек истории
+        """
+        now = time.time()
+        count_deleted = 0
+
+        async with connection_registry.transaction(db_path) as db:
+            for source, target, bucket, cutoff in get_course_history_cutoffs(now):
+                step_parameters = {**parameters, 'source': source, 'target': target, 'bucket': bucket, 'cutoff': cutoff}
+
+                await db.execute(COURSE_HISTORY_DOWNSAMPLE_QUERY.format(**scope), step_parameters)
+                cursor = await db.execute(COURSE_HISTORY_DELETE_QUERY.format(**scope), step_parameters)
+                count_deleted += cursor.rowcount
+
+            cursor = await db.execute(
+                COURSE_HISTORY_DELETE_QUERY.format(**scope),
+                {**parameters, 'source': COURSE_HISTORY_DAY, 'cutoff': int(now - COURSE_HISTORY_DAY_RETENTION)}
+            )
+            count_deleted += cursor.rowcount
+
+        return count_deleted
+
+    async def compact_course_history(self) -> int:
+        """
+        Сжимает историю курсов матча: raw -> hour -> day, и удаляет устаревшие суточные точки.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+
+        :return: количество удаленных точек истории
+        """
+        await self.create_course_history_table()
+
+        return await self.downsample_course_history(
+            db_path=self.SPyderSQLite.db_path,
+            scope=get_match_scope(self.consolidated),
+            parameters=self.match_parameters()
+        )
+
+    @staticmethod
+    async def compact_course_history_all_matches() -> int:
+        """
+        Сжимает историю курсов всех матчей общей базы (режим consolidated) одной транзакцией.
+
+        :return: количество удаленных точек истории
+        """
+        await DatabaseManager.initialize_consolidated_storage()
+
+        return await DatabaseManager.downsample_course_history(
+            db_path=CONSOLIDATED_DB_PATH,
+            scope=get_all_matches_scope(),
+            parameters={}
+        )
+
+    async def get_course_history(
+            self,
+            currency_ids: List[int] = None,
+            start: datetime | float = None,
+            end: datetime | float = None,
+            resolution: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Возвращает историю курсов валют матча за период одним запросом по индексу (currency_id, timestamp).
+        \n\nБез resolution возвращается непрерывный ряд из точек всех разрешений: старые - суточные, свежие - сырые.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+
+        :param currency_ids: Id валют, None - все валюты матча.
+        :param start: Начало периода (datetime или unix-время), None - с начала истории.
+        :param end: Конец периода (datetime или unix-время), None - по текущий момент.
+        :param resolution: COURSE_HISTORY_RAW, COURSE_HISTORY_HOUR или COURSE_HISTORY_DAY, None - все.
+        :return: Пример [{'timestamp': 1735689600, 'currency_id': 1, 'course': 1.001, 'amount': 49950000.0, 'resolution': 'raw'}, ...],
+            упорядочено по currency_id и timestamp
+        """
+        if currency_ids is None:
+            currency_ids = list((await self.get_metadata(SECTION_CURRENCY))['by_id'])
+
+        if not currency_ids:
+            return []
+
+        await self.create_course_history_table()
+
+        start = start.timestamp() if isinstance(start, datetime) else start
+        end = end.timestamp() if isinstance(end, datetime) else end
+
+        return await self.execute(
+            self.match_query(COURSE_HISTORY_RANGE_QUERY),
+            self.match_parameters({
+                'currency_ids': json.dumps(sorted(currency_ids)),
+                'start': int(start) if start is not None else 0,
+                'end': int(end) if end is not None else int(time.time()),
+                'resolution': resolution
+            })
+        ) or []
+
 
     async def set_admin(self, telegram_id: int):
-        """Добавляет администратора в таблицу users из master.db."""
+        """Добавляет администратора в таблицу users из master.db и в admin_registry."""
+        if await self.is_admin(telegram_id):
+            return
+
         await self.insert(
             table_name='users',
             columns=['telegram_id', 'admin'],
             values=(telegram_id, True)
         )
 
+        admin_registry.add(telegram_id)
+
+    async def select_admins_telegram_id(self) -> List[int] | None:
+        """
+        Читает telegram_id администраторов из таблицы users из master.db в порядке добавления.
+
+        :return: список telegram_id, None - master.db еще не инициализирована
+        """
+        if not os.path.exists(MASTER_DB_PATH):
+            return None
+
+        try:
+            data_admins = await self.execute("SELECT telegram_id FROM users WHERE admin = ? ORDER BY id", (True,))
+        except aiosqlite.OperationalError as error:
+            logger.error(f"Не удалось загрузить список администраторов: {error}")
+            return None
+
+        return [data_admin['telegram_id'] for data_admin in data_admins or []]
+
+    async def load_admin_registry(self):
+        """Загружает (перезагружает) admin_registry из master.db. Вызывается при запуске бота."""
+        await admin_registry.load(self.select_admins_telegram_id)
+
+    async def is_admin(self, telegram_id: int) -> bool:
+        """Проверяет, является ли пользователь администратором (по admin_registry, без запроса к базе данных)."""
+        await admin_registry.ensure_loaded(self.select_admins_telegram_id)
+
+        return admin_registry.is_admin(telegram_id)
+
     async def get_admins_telegram_id(self) -> List[int] | None:
-        """Возвращает список информации администрации из таблицы users из master.db"""
-        data_admins = await self.select(
-            table_name='users',
-            where_clause={'admin': True}
-        )
-        return [data_admin['telegram_id'] for data_admin in data_admins]
+        """Возвращает список telegram_id администрации (из admin_registry)"""
+        await admin_registry.ensure_loaded(self.select_admins_telegram_id)
+
+        return admin_registry.get_admins()
 
     async def get_owner_admin_telegram_id(self) -> Optional[int] | None:
-        """Возвращает telegram_id главного администратора."""
-        admins_telegram_id = await self.get_admins_telegram_id()
-        chat_id_admin = admins_telegram_id[0]
+        """Возвращает telegram_id главного администратора (из admin_registry)."""
+        await admin_registry.ensure_loaded(self.select_admins_telegram_id)
 
-        return chat_id_admin
+        return admin_registry.get_owner()
 
 
     async def match_exists(self, number_match: int) -> bool:
@@ -285,103 +883,211 @@ class DatabaseManager:
 
     async def initialize_match(self, type_match: str):
         """
-        Инициализирует новый матч.
+        Инициализирует новый матч копированием готового шаблона базы данных для type_match (SQLite backup API).
+        \n\nЕсли шаблон подготовить не удалось, матч собирается напрямую через build_match_schema.
 
         :param type_match: Тип карты матча.
         :var set_match(number_match, type_match): Добавляет новый матч в таблицу match в master.db.
         """
-        tables = {
-            'countries': {
-                'name': 'TEXT',
-                'telegram_id': 'INTEGER',
-                'admin': 'BLOB'
-            },
-            'country_choice_requests': {
-                'telegram_id': 'INTEGER',
-                'number_match': 'INTEGER',
-                'name_country': 'TEXT',
-                'unique_word': 'TEXT',
-                'admin_decision_message_id': 'INTEGER'
-            },
-            'currency': {
-                'country_id': 'INTEGER',
-                'name': 'TEXT',
-                'tick': 'TEXT',
-                'following_resource': 'TEXT',
-                'course_following': 'REAL',
-                'capitalization': 'INTEGER',
-                'emission': 'REAL',
-                'current_amount': 'REAL',
-                'current_course': 'REAL'
-            },
-            'currency_emission_requests': {
-                'number_match': 'INTEGER',
-                'telegram_id': 'INTEGER',
-                'country_id': 'INTEGER',
-                'name_currency': 'TEXT',
-                'tick_currency': 'TEXT',
-                'following_resource': 'TEXT',
-                'course_following': 'REAL',
-                'capitalization': 'INTEGER',
-                'amount_emission_currency': 'REAL',
-                'date_request_creation': 'TEXT',
-                'status_confirmed': 'BLOB',
-                'date_confirmed': 'TEXT',
-                'message_id_delete': 'INTEGER'
-            },
-            'bank_transfer_requests': {
-                'number_match': 'INTEGER',
-                'payer_country_id': 'INTEGER',
-                'beneficiary_country_id': 'INTEGER',
-                'currency_id': 'INTEGER',
-                'amount_currency_transfer': 'REAL',
-                'comment': 'TEXT',
-                'date_request_creation': 'TEXT',
-                'status_cancelled': 'BLOB',
-                'date_cancelled': 'TEXT'
-            }
-        }
+        match_path = self.SPyderSQLite.db_path
 
-        for table_name, columns in tables.items():
-            await self.create(
-                table_name=table_name,
-                columns=columns
-            )
+        if self.consolidated:
+            # В общей базе схема общая для всех матчей, новому матчу нужен только список стран
+            await self.initialize_consolidated_storage()
+            await self.set_country_names(type_match=type_match)
 
-        await self.set_country_names(type_match=type_match)
+            metadata_cache.invalidate(self.metadata_key)
+            return
 
-        await self.initialize_currency_capitals(type_match=type_match)
+        try:
+            template_path = await self.prepare_match_template(type_match=type_match)
 
-    async def initialize_currency_capitals(self, type_match: str):
+            async with connection_registry.connection(template_path) as template_db:
+                async with connection_registry.connection(match_path) as match_db:
+                    await template_db.backup(match_db)
+        except (aiosqlite.Error, OSError) as error:
+            logger.error(f"Не удалось скопировать шаблон матча {type_match} в {match_path}: {error}. Собираю матч напрямую.")
+            await self.build_match_schema(db_path=match_path, type_match=type_match)
+
+        metadata_cache.invalidate(self.metadata_key)
+
+    @staticmethod
+    async def initialize_consolidated_storage():
         """
-        Создание таблицы в базе данных конкретного матча, где хранятся данные капиталов всех государств, во всех валютах.
+        Создает таблицы и индексы матчей в общей базе CONSOLIDATED_DB_PATH (режим consolidated), если их еще нет.
+        \n\nВсе таблицы MATCH_TABLES получают столбец match_number, индексы - match_number первым столбцом.
+        """
+        async with DatabaseManager.consolidated_lock:
+            if DatabaseManager.consolidated_ready:
+                return
 
-        :param type_match: Тип матча
-        :return:
+            sql_builder = SPyderSQLite(CONSOLIDATED_DB_PATH)
+
+            async with connection_registry.transaction(CONSOLIDATED_DB_PATH) as db:
+                for table_name, columns in get_consolidated_tables().items():
+                    await db.execute(
+                        sql_builder.create(
+                            name_table=table_name,
+                            append_columns=columns,
+                            id_primary_key=True
+                        ).build()
+                    )
+
+                for index in get_consolidated_indexes():
+                    await db.execute(get_match_index_query(*index))
+
+            DatabaseManager.consolidated_ready = True
+
+    @staticmethod
+    async def prepare_match_template(type_match: str) -> str:
         """
-        countries_id = {'currency_id': 'INTEGER'}
+        Возвращает путь к шаблону базы данных матча для type_match, при необходимости создает его.
+        \n\nШаблон пересоздается автоматически, если изменились COUNTRIES_BY_TYPE_MATCH или схема матча,
+        устаревшие шаблоны этого типа удаляются.
 
+        :param type_match: Тип карты матча.
+        :return: путь к файлу шаблона
+        """
+        template_path = get_match_template_path(type_match)
+
+        async with DatabaseManager.templates_lock:
+            if os.path.exists(template_path):
+                return template_path
+
+            os.makedirs(TEMPLATES_DIRECTORY, exist_ok=True)
+
+            # Сборка во временный файл, чтобы недостроенный шаблон никогда не попал в матч
+            build_path = f'{template_path}.build'
+            remove_database_files(build_path)
+
+            await DatabaseManager.build_match_schema(db_path=build_path, type_match=type_match)
+            await connection_registry.close(build_path)
+            os.replace(build_path, template_path)
+
+            logger.info(f"Шаблон матча {type_match} создан: {template_path}")
+
+            template_prefix = os.path.basename(template_path).split('_')[0]
+            for file_name in os.listdir(TEMPLATES_DIRECTORY):
+                file_path = f'{TEMPLATES_DIRECTORY}/{file_name}'
+                if file_name.startswith(f'{template_prefix}_') and file_name.endswith('.db') and file_path != template_path:
+                    await connection_registry.close(file_path)
+                    remove_database_files(file_path)
+                    logger.info(f"Устаревший шаблон матча {type_match} удален: {file_path}")
+
+        return template_path
+
+    @staticmethod
+    async def build_match_schema(db_path: str, type_match: str):
+        """
+        Собирает базу данных матча с нуля: таблицы MATCH_TABLES, список стран и индексы.
+        \n\nВсё создается одной транзакцией на одном соединении, страны вставляются одним executemany.
+
+        :param db_path: путь к файлу базы данных (матча или шаблона)
+        :param type_match: Тип карты матча.
+        """
         country_names = get_country_names(type_match)
-        count_country_id = len(country_names)
 
-        for country_id in range(1, count_country_id + 1):
-            countries_id['country_' + str(country_id)] = 'REAL'
+        sql_builder = SPyderSQLite(db_path)
 
-        await self.create(
-            table_name='currency_capitals',
-            columns=countries_id
-        )
+        async with connection_registry.transaction(db_path) as db:
+            for table_name, columns in MATCH_TABLES.items():
+                await db.execute(
+                    sql_builder.create(
+                        name_table=table_name,
+                        append_columns=columns,
+                        id_primary_key=True
+                    ).build()
+                )
+
+            await db.executemany(
+                sql_builder.insert(
+                    name_table='countries',
+                    names_columns=['name', 'telegram_id', 'admin']
+                ).build(),
+                [(name_country, 0, False) for name_country in country_names]
+            )
+
+            for index in MATCH_INDEXES:
+                await db.execute(get_match_index_query(*index))
+
+    async def create_match_indexes(self):
+        """
+        Создает индексы MATCH_INDEXES в базе данных матча. Повторный вызов безопасен.
+        \n\nЕсли уникальный индекс создать нельзя (в старом матче уже есть дубликаты), создается обычный индекс.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+        """
+        if self.consolidated:
+            # Индексы общей базы создаются вместе с ее схемой
+            await self.initialize_consolidated_storage()
+            return
+
+        # В старых матчах нет таблицы course_history, индексы которой есть в MATCH_INDEXES
+        await self.create_course_history_table()
+
+        for index_name, table_name, columns, unique in MATCH_INDEXES:
+            try:
+                await self.execute(get_match_index_query(index_name, table_name, columns, unique))
+            except aiosqlite.IntegrityError as error:
+                logger.error(f"Уникальный индекс {index_name} не создан в {self.SPyderSQLite.db_path}: {error}. Создаю обычный индекс.")
+                await self.execute(get_match_index_query(index_name, table_name, columns))
+
+    async def migrate_currency_capitals_to_holdings(self) -> bool:
+        """
+        Переносит капиталы из старой широкой таблицы currency_capitals (столбцы country_1..country_N)
+        в currency_holdings (country_id, currency_id, amount) и удаляет старую таблицу. Выполняется одной транзакцией.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+
+        :return: True - перенос выполнен, False - старой таблицы нет
+        """
+        if self.consolidated:
+            # Общая база создается сразу с currency_holdings
+            return False
+
+        old_table = await self.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'currency_capitals'")
+
+        if not old_table:
+            return False
+
+        sql_builder = SPyderSQLite(self.SPyderSQLite.db_path)
+
+        async with connection_registry.transaction(self.SPyderSQLite.db_path) as db:
+            await db.execute(
+                sql_builder.create(
+                    name_table='currency_holdings',
+                    append_columns=MATCH_TABLES['currency_holdings'],
+                    id_primary_key=True
+                ).build()
+            )
+            await db.execute(get_match_index_query('idx_currency_holdings_country_currency', 'currency_holdings', ['country_id', 'currency_id'], True))
 
+            async with db.execute("PRAGMA table_info(currency_capitals)") as cursor:
+                country_columns = [row['name'] for row in await cursor.fetchall() if row['name'].startswith('country_')]
+
+            for country_column in country_columns:
+                country_id = int(country_column.removeprefix('country_'))
+
+                await db.execute(
+                    f"INSERT INTO currency_holdings (country_id, currency_id, amount) "
+                    f"SELECT {country_id}, currency_id, {country_column} FROM currency_capitals "
+                    f"WHERE currency_id IS NOT NULL AND {country_column} > 0 "
+                    f"ON CONFLICT (country_id, currency_id) DO UPDATE SET amount = amount + excluded.amount"
+                )
+
+            await db.execute("DROP TABLE currency_capitals")
+
+        logger.info(f"Капиталы {self.SPyderSQLite.db_path} перенесены в currency_holdings ({len(country_columns)} государств).")
+
+        return True
 
     async def set_country_names(self, type_match):
-        """Добавляет список стран в таблицу countries"""
+        """Добавляет список стран в таблицу countries, одним запросом."""
         country_names = get_country_names(type_match)
-        for name_country in country_names:
-            await self.insert(
-                table_name='countries',
-                columns=['name', 'telegram_id', 'admin'],
-                values=(name_country, 0, False)
-            )
+        columns, _ = self.match_insert('countries', ['name', 'telegram_id', 'admin'], ())
+
+        await self.SPyderSQLite.insert(
+            name_table='countries',
+            names_columns=columns
+        ).executemany([self.match_insert('countries', [], (name_country, 0, False))[1] for name_country in country_names])
 
     async def get_template(self, name_table: str, column_names: list, where_clause: dict = None, alone: bool = True):
         """
@@ -414,119 +1120,127 @@ class DatabaseManager:
 
             return much_records
 
-    async def get_countries_names(self, free: bool = False, busy: bool = False):
+    async def get_metadata(self, section: str) -> Dict[str, Any]:
         """
-        Возвращает список стран из таблицы countries
+        Возвращает раздел кэша справочников матча (metadata_cache), при промахе загружая его одним запросом.
         \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
-        :param free: Возвращает свободные государства
-        :param busy: Возвращает занятые государства
-        :return: Free : True - список свободных стран. Busy : True - список занятых стран
+        :param section: SECTION_COUNTRIES - государства, SECTION_CURRENCY - валюты
+        :return: {'rows': [...], 'by_id': {id: row}, ...}
         """
-        if free:
-            free_countries = await self.get_template(
-                name_table='countries',
-                column_names=['name'],
-                where_clause={'telegram_id': 0},
-                alone=False
-            )
+        async def load_section(query: str) -> Optional[List[Dict[str, Any]]]:
+            return await self.execute(self.match_query(query), self.match_parameters())
 
-            free_countries_from_match = list()
+        return await metadata_cache.get_section(
+            match_key=self.metadata_key,
+            section=section,
+            loader=load_section
+        )
 
-            for data_country in free_countries:
-                free_countries_from_match.append(data_country['name'])
+    def invalidate_metadata(self, *sections: str):
+        """
+        Сбрасывает кэш справочников матча. Вызывать после каждой записи в таблицы countries и currency.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
-            return free_countries_from_match
+        :param sections: SECTION_COUNTRIES и/или SECTION_CURRENCY. Без аргументов сбрасываются все разделы.
+        """
+        metadata_cache.invalidate(self.metadata_key, *sections)
 
-        elif busy:
-            busy_countries = await self.get_template(
-                name_table='countries',
-                column_names=['name', 'telegram_id'],
-                alone=False
-            )
+    @staticmethod
+    def get_metadata_cache_stats() -> Dict[str, Any]:
+        """Счетчики кэша справочников матчей: hits, misses, hit_ratio, invalidations, matches."""
+        return metadata_cache.stats()
 
-            busy_countries_from_match = list()
+    @staticmethod
+    def get_course_tracker_stats() -> Dict[str, Any]:
+        """Счетчики отложенного пересчета курсов: marked, flushes, recalculated, errors, pending_matches."""
+        return course_tracker.stats()
+
+    async def get_countries_names(self, free: bool = False, busy: bool = False):
+        """
+        Возвращает список стран из таблицы countries (через кэш справочников матча)
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
-            for data_country in busy_countries:
-                if data_country['telegram_id'] != 0:
-                    busy_countries_from_match.append(data_country['name'])
+        :param free: Возвращает свободные государства
+        :param busy: Возвращает занятые государства
+        :return: Free : True - список свободных стран. Busy : True - список занятых стран
+        """
+        countries = await self.get_metadata(SECTION_COUNTRIES)
 
-            return busy_countries_from_match
+        if free:
+            return [data_country['name'] for data_country in countries['rows'] if data_country['telegram_id'] == 0]
 
-    async def get_country_id(self, country_name: str) -> int:
+        elif busy:
+            return [data_country['name'] for data_country in countries['rows'] if data_country['telegram_id'] != 0]
+
+    async def get_country_id(self, country_name: str) -> int | None:
         """
         Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param country_name: название государства, по которому ищем его id
-        :return: Возвращает id искомого государства
+        :return: Возвращает id искомого государства, None - если государство не найдено
         """
-        country_id = await self.get_template(
-            name_table='countries',
-            column_names=['id'],
-            where_clause={'name': country_name}
-        )
+        countries = await self.get_metadata(SECTION_COUNTRIES)
 
-        return country_id
+        return countries['id_by_name'].get(country_name)
 
-    async def get_country_name(self, country_id: int) -> int:
+    async def get_country_name(self, country_id: int) -> str | None:
         """
         Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param country_id: Id государства, по которому ищем его название
-        :return: Возвращает название искомого государства
+        :return: Возвращает название искомого государства, None - если государство не найдено
         """
-        country_name = await self.get_template(
-            name_table='countries',
-            column_names=['name'],
-            where_clause={'id': country_id}
-        )
+        countries = await self.get_metadata(SECTION_COUNTRIES)
+        data_country = countries['by_id'].get(country_id)
 
-        return country_name
+        return data_country['name'] if data_country else None
 
-    async def get_country_telegram_id(self, country_id: int) -> int:
+    async def get_country_telegram_id(self, country_id: int) -> int | None:
         """
         Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param country_id: Id государства, по которому ищем его название
-        :return: Возвращает telegram id искомого государства
+        :return: Возвращает telegram id искомого государства, None - если государство не найдено
         """
-        telegram_id = await self.get_template(
-            name_table='countries',
-            column_names=['telegram_id'],
-            where_clause={'id': country_id}
-        )
+        countries = await self.get_metadata(SECTION_COUNTRIES)
+        data_country = countries['by_id'].get(country_id)
 
-        return telegram_id
+        return data_country['telegram_id'] if data_country else None
 
-    async def get_currency_name(self, currency_id: int) -> str:
+    async def get_currency_name(self, currency_id: int) -> str | None:
         """
         Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param currency_id: Id искомой валюты
-        :return: возвращает название искомой валюты
+        :return: возвращает название искомой валюты, None - если валюта не найдена
         """
-        currency_name = await self.get_template(
-            name_table='currency',
-            column_names=['name'],
-            where_clause={'id': currency_id}
-        )
+        currencies = await self.get_metadata(SECTION_CURRENCY)
+        data_currency = currencies['by_id'].get(currency_id)
 
-        return currency_name
+        return data_currency['name'] if data_currency else None
 
-    async def get_currency_tick(self, currency_id: int) -> str:
+    async def get_currency_tick(self, currency_id: int) -> str | None:
         """
         Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param currency_id: Id искомой валюты
-        :return: возвращает Tick искомой валюты
+        :return: возвращает Tick искомой валюты, None - если валюта не найдена
         """
-        currency_tick = await self.get_template(
-            name_table='currency',
-            column_names=['tick'],
-            where_clause={'id': currency_id}
-        )
+        currencies = await self.get_metadata(SECTION_CURRENCY)
+        data_currency = currencies['by_id'].get(currency_id)
+
+        return data_currency['tick'] if data_currency else None
+
+    async def get_currency_ticks(self) -> Dict[int, str]:
+        """
+        Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
-        return currency_tick
+        :return: Tick всех валют матча по id, пример {1: 'USD', 2: 'EUR'}
+        """
+        currencies = await self.get_metadata(SECTION_CURRENCY)
+
+        return {currency_id: data_currency['tick'] for currency_id, data_currency in currencies['by_id'].items()}
 
 
     async def delete_match_record(self, number_match: str) -> bool:
@@ -546,44 +1260,68 @@ class DatabaseManager:
             return False
 
     async def delete_match(self, number_match: str) -> bool:
-        """Удаляет матч из мастер-базы и саму соответствующую базу данных."""
+        """Удаляет матч из мастер-базы и саму соответствующую базу данных (или строки матча в общей базе)."""
         database_path = f'database/{number_match}.db'
 
         try:
-            if os.path.exists(database_path):
-
-                os.remove(database_path)
-                logger.info(f"База данных {database_path} успешно удалена.")
+            match_db = DatabaseManager(database_path=number_match)
 
-                success = await self.delete_match_record(number_match=number_match)
+            if match_db.consolidated:
+                await match_db.delete_match_rows()
+                logger.info(f"Строки матча {number_match} удалены из {CONSOLIDATED_DB_PATH}.")
 
-                if not success:
+            elif os.path.exists(database_path):
 
-                    return False
+                await connection_registry.close(database_path)
 
-                await self.delete_charts_from_match(number_match=number_match)
+                remove_database_files(database_path)
+                logger.info(f"База данных {database_path} успешно удалена.")
             else:
                 raise Exception(f"Файл {database_path} не найден.")
 
+            metadata_cache.invalidate(match_db.metadata_key)
+
+            success = await self.delete_match_record(number_match=number_match)
+
+            if not success:
+
+                return False
+
+            await self.delete_charts_from_match(number_match=number_match)
+
             return True
         except Exception as error:
             logger.error(f"Ошибка при удалении номера матча {number_match} из таблицы match: {error}")
             return False
 
+    async def delete_match_rows(self):
+        """
+        Удаляет все строки матча из таблиц общей базы (режим consolidated) одной транзакцией.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+        """
+        async with connection_registry.transaction(self.SPyderSQLite.db_path) as db:
+            for table_name in MATCH_TABLES:
+                await db.execute(f"DELETE FROM {table_name} WHERE match_number = ?", (self.match_number,))
+
+        metadata_cache.invalidate(self.metadata_key)
+
     @staticmethod
     async def delete_charts_from_match(number_match: str):
-        """Удаляет все диаграммы и графики связанные с конкретным номером матча"""
+        """
+        Удаляет все диаграммы и графики связанные с конкретным номером матча.
+        \n\nДиаграммы рисуются в память, на диске остаются только копии режима отладки (CHART_DEBUG_SAVE в chartzer).
+        """
         try:
-            name_directory = f"chart/"
+            name_directory = 'chart/'
             if not os.path.exists(name_directory):
-                raise Exception(f"Директория {name_directory} не существует.")
+                return
 
             count_deleted_files = 0
             for file_name in os.listdir(name_directory):
                 file_path = os.path.join(name_directory, file_name)
 
-                # Проверяем условия: начинается с `chart/{number_match}` и заканчивается на `.png`
-                if file_name.startswith(number_match) and file_name.endswith('.png'):
+                # Проверяем условия: начинается с `chart/{number_match}_` и заканчивается на `.png`
+                if file_name.startswith(f'{number_match}_') and file_name.endswith('.png'):
                     os.remove(file_path)
                     count_deleted_files += 1
                     logger.info(f"Файлов {file_path} удалёно: {count_deleted_files} ед.")
@@ -602,29 +1340,21 @@ class DatabaseManager:
         """
         try:
             if name_requests == 'country_choice':
-                column_names = ['telegram_id']
                 name_requests = 'country_choice_requests'
+                where_clause = {'telegram_id': user_id}
             elif name_requests == 'currency_emission':
-                column_names = ['telegram_id', 'status_confirmed', 'date_confirmed']
                 name_requests = 'currency_emission_requests'
+                where_clause = {'telegram_id': user_id, 'status_confirmed': False, 'date_confirmed': ''}
             else:
                 raise Exception('Не правильно выбрано название таблицы заявок, для проверки заявки.')
 
-            data_requests = await self.select(
+            request = await self.select_one(
                 table_name=name_requests,
-                columns=column_names
+                columns=['id'],
+                where_clause=where_clause
             )
 
-            if name_requests == 'country_choice_requests':
-                for request in data_requests:
-                    if request['telegram_id'] == user_id:
-                        return True
-            elif name_requests == 'currency_emission_requests':
-                for request in data_requests:
-                    if request['telegram_id'] == user_id and request['status_confirmed'] == 0 and request['date_confirmed'] == '':
-                        return True
-
-            return False
+            return request is not None
         except Exception as error:
             print(f'ERROR: {error}')
             return None
@@ -642,14 +1372,14 @@ class DatabaseManager:
         """
         column_names = ['name', 'telegram_id']
 
-        data_country = await self.select(
+        country = await self.select_one(
             table_name='countries',
-            columns=column_names
+            columns=column_names,
+            where_clause={'telegram_id': user_id}
         )
 
-        for country in data_country:
-            if country['telegram_id'] == user_id:
-                return {'telegram_id': country['telegram_id'], 'name_country': country['name']}
+        if country:
+            return {'telegram_id': country['telegram_id'], 'name_country': country['name']}
 
         return None
 
@@ -708,15 +1438,15 @@ class DatabaseManager:
         """
         column_names = ['telegram_id', 'name_country', 'unique_word', 'admin_decision_message_id']
 
-        data_users = await self.select(
+        user = await self.select_one(
             table_name='country_choice_requests',
-            columns=column_names
+            columns=column_names,
+            where_clause={'unique_word': unique_word}
         )
 
-        for user in data_users:
-            if user['unique_word'] == unique_word:
-                return {'telegram_id': user['telegram_id'], 'name_country': user['name_country'], 'number_match': number_match,
-                        'unique_word': user['unique_word'], 'admin_decision_message_id': user['admin_decision_message_id']}
+        if user:
+            return {'telegram_id': user['telegram_id'], 'name_country': user['name_country'], 'number_match': number_match,
+                    'unique_word': user['unique_word'], 'admin_decision_message_id': user['admin_decision_message_id']}
 
     async def deleted_request_country_in_match(self, data_user: dict):
         """
@@ -733,6 +1463,8 @@ class DatabaseManager:
                 where_clause=where_clause
             )
 
+            self.invalidate_metadata(SECTION_COUNTRIES)
+
         except Exception as error:
             print(f"Ошибка при удалении заявки на подтверждения государства: {data_user['name_country']}: {error}")
             return False
@@ -754,6 +1486,8 @@ class DatabaseManager:
             where_clause=where_clause
         )
 
+        self.invalidate_metadata(SECTION_COUNTRIES)
+
         await self.deleted_request_country_in_match(data_user)
 
 
@@ -876,61 +1610,15 @@ class DatabaseManager:
             'message_id_delete'
         ]
 
-        data_requests = await self.select(
+        where_clause = {'telegram_id': user_id, 'status_confirmed': False, 'date_confirmed': ''}
+
+        request = await self.select_one(
             table_name='currency_emission_requests',
             columns=column_names,
+            where_clause=where_clause
         )
 
-        for request in data_requests:
-            if (request['telegram_id'] == user_id and
-                    not request['status_confirmed'] and
-                    request['date_confirmed'] == ''):
-                return {
-                    'id': request['id'],
-                    'number_match': request['number_match'],
-                    'telegram_id': request['telegram_id'],
-                    'country_id': request['country_id'],
-                    'name_currency': request['name_currency'],
-                    'tick_currency': request['tick_currency'],
-                    'following_resource': request['following_resource'],
-                    'course_following': request['course_following'],
-                    'capitalization': request['capitalization'],
-                    'amount_emission_currency': request['amount_emission_currency'],
-                    'date_request_creation': request['date_request_creation'],
-                    'status_confirmed': request['status_confirmed'],
-                    'date_confirmed': request['date_confirmed'],
-                    'message_id_delete': request['message_id_delete']
-                }
-        return None
-
-        # TODO придумать нужно где идет поиск одной заявки, а не всех. чтобы вывести ее, а не перебирать список заявок.
-
-        # where = {'telegram_id': user_id, 'status_confirmed': False, 'date_confirmed': ''}
-        #
-        # request = await self.select(
-        #     table_name='currency_emission_requests',
-        #     columns=column_names,
-        #     where_clause=where
-        # )
-        #
-        # if request:
-        #     return {
-        #             'id': request['id'],
-        #             'number_match': request['number_match'],
-        #             'telegram_id': request['telegram_id'],
-        #             'country_id': request['country_id'],
-        #             'name_currency': request['name_currency'],
-        #             'tick_currency': request['tick_currency'],
-        #             'following_resource': request['following_resource'],
-        #             'course_following': request['course_following'],
-        #             'capitalization': request['capitalization'],
-        #             'amount_emission_currency': request['amount_emission_currency'],
-        #             'date_request_creation': request['date_request_creation'],
-        #             'status_confirmed': request['status_confirmed'],
-        #             'date_confirmed': request['date_confirmed'],
-        #             'message_id_delete': request['message_id_delete']
-        #         }
-        # return None
+        return request
 
 
     async def check_data_currency_exists(self, name_currency: str = '', tick_currency: str = '') -> bool | None:
@@ -942,32 +1630,23 @@ class DatabaseManager:
         :param tick_currency: Тикер валюты
         :return: True - есть совпадение, False - нет совпадений, None - ничего не проверяется
         """
-        column_names = []
-        name_parameter : str = ''
-        check_parameter = None
+        where_clause = {}
 
         try:
             if name_currency != '':
-                column_names = ['name']
-                name_parameter = 'name'
-                check_parameter = name_currency
+                where_clause['name'] = name_currency
             elif tick_currency != '':
-                column_names = ['tick']
-                name_parameter = 'tick'
-                check_parameter = tick_currency
+                where_clause['tick'] = tick_currency
             elif name_currency == '' or tick_currency == '':
                 raise Exception('При проверке данных валюты, на совпадение, ничего не было введено для проверки')
 
-            parameters_currency = await self.select(
+            currency = await self.select_one(
                 table_name='currency',
-                columns=column_names
+                columns=['id'],
+                where_clause=where_clause
             )
 
-            for parameter in parameters_currency:
-                if parameter[name_parameter] == check_parameter:
-                    return True
-
-            return False
+            return currency is not None
         except Exception as error:
             print(f'Error: {error}')
             return None
@@ -1137,6 +1816,8 @@ class DatabaseManager:
                 values=values
             )
 
+            self.invalidate_metadata(SECTION_CURRENCY)
+
             data_currency = {
                 'id': data_request['id'],
                 'country_id': data_request['country_id'],
@@ -1155,7 +1836,7 @@ class DatabaseManager:
 
     async def set_national_currency_in_currency_capitals(self, user_id: int, number_match: str):
         """
-        установка национальной валюты в таблицу капиталов государств.
+        установка национальной валюты в таблицу капиталов государств (currency_holdings).
         """
         data_country = await self.get_data_country(
             user_id=user_id,
@@ -1165,99 +1846,54 @@ class DatabaseManager:
             data_country=data_country
         )
 
-        table_name = 'currency_capitals'
-
-        country_id = 'country_' + str(data_country['country_id'])
-        column_names = ['currency_id', country_id]
-
+        country_id = data_country['country_id']
         currency_id = data_currency['currency'][0]['id']
         amount_from_country_x = data_currency['currency'][0]['current_amount']
-        values = (currency_id, amount_from_country_x)
-
 
         await self.insert(
-            table_name=table_name,
-            columns=column_names,
-            values=values
+            table_name='currency_holdings',
+            columns=['country_id', 'currency_id', 'amount'],
+            values=(country_id, currency_id, amount_from_country_x)
         )
 
-    @staticmethod
-    async def filter_currency_capitals(country_id: str, data_currency_capitals: list[dict]) -> list[dict]:
-        """
-        Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
-
-        :param country_id: id государства
-        :param data_currency_capitals: не отфильтрованный словарь в списке
-        :return: отфильтрованный словарь в списке, в котором есть данные капиталов тех валют, что больше "0"
-        """
-        country_currency_capitals = [
-            {
-                'currency_id': data_capital['currency_id'],
-                'amount': data_capital[country_id]
-            }
-            for data_capital in data_currency_capitals
-            if data_capital[country_id] is not None
-        ]
-
-        return country_currency_capitals
-
-        # country_currency_capitals = []
-        #
-        # for data_capital in data_currency_capitals:
-        #     if data_capital[country_id] is not None:
-        #         country_currency_capitals.append({
-        #             'currency_id': data_capital['currency_id'],
-        #             country_id: data_capital[country_id]
-        #         })
-        #
-        # return country_currency_capitals
-
-    async def get_data_currency_capitals_from_country(self, user_id: int, number_match: str) -> list | None:
+    async def get_data_currency_capitals_from_country(self, user_id: int = None, number_match: str = '', country_id: int = None) -> list | None:
         """
-        Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
+        Возвращает капитал государства одним запросом: currency_holdings соединяется с countries и currency.
+        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
         :param user_id: message.from_user.id | callback.from_user.id
         :param number_match: Id матча
-        :return: возвращает словарь в списке, в словаре есть данные капиталов валют, которыми владеет государство, на данный момент. | None
+        :param country_id: Id государства, если известен (тогда user_id не нужен)
+        :return: возвращает словарь в списке [{'currency_id', 'amount', 'currency_name', 'currency_tick'}], в словаре есть данные капиталов валют, которыми владеет государство, на данный момент. | None
         """
-        data_country = await self.get_data_country(
-            user_id=user_id,
-            number_match=number_match
-        )
-
-        country_id = 'country_' + str(data_country['country_id'])
-
-        column_names = ['currency_id', country_id]
-
-        data_currency_capitals = await self.select(
-            table_name='currency_capitals',
-            columns=column_names
-        )
+        if country_id:
+            where_query, parameter = "h.country_id = :parameter", country_id
+        elif user_id:
+            where_query, parameter = "co.telegram_id = :parameter", user_id
+        else:
+            logger.error(f"Не указано государство для получения капитала. № Матч {number_match}.")
+            return None
 
-        country_currency_capitals = await self.filter_currency_capitals(
-            country_id=country_id,
-            data_currency_capitals=data_currency_capitals
+        country_currency_capitals = await self.execute(
+            self.match_query(
+                "SELECT h.currency_id, h.amount, c.name AS currency_name, c.tick AS currency_tick "
+                "FROM currency_holdings AS h "
+                "JOIN countries AS co ON co.id = h.country_id "
+                "JOIN currency AS c ON c.id = h.currency_id "
+                f"WHERE {where_query} AND h.amount > 0{{match_and}} "
+                "ORDER BY h.id",
+                alias='h.'
+            ),
+            self.match_parameters({'parameter': parameter})
         )
 
-        finally_country_currency_capitals = []
-
-        for currency_capital in country_currency_capitals:
-            currency_id = currency_capital['currency_id']
-            if currency_id is not None:
-                currency_name = await self.get_currency_name(currency_id=currency_id)
-                currency_capital['currency_name'] = currency_name
-                currency_tick = await self.get_currency_tick(currency_id=currency_id)
-                currency_capital['currency_tick'] = currency_tick
-            finally_country_currency_capitals.append(currency_capital)
-
-
-        if finally_country_currency_capitals:
-            return finally_country_currency_capitals
+        if country_currency_capitals:
+            return country_currency_capitals
         else:
             return None
 
 
-    async def register_bank_transfer(
+    async def perform_bank_transfer(
             self,
             number_match: str,
             payer_country_id: int,
@@ -1265,291 +1901,109 @@ class DatabaseManager:
             currency_id: int,
             amount_currency_transfer: float,
             comment: str,
-            date_request_creation: str,
-            status_cancelled: bool,
-            date_cancelled: str
-    ):
+            date_request_creation: str
+    ) -> int:
         """
-        Сохраняет заявку банковского перевода в базу данных.
+        Выполняет банковский перевод одной транзакцией BEGIN IMMEDIATE: проверка остатка и списание у отправителя,
+        зачисление получателю, изменение current_amount у эмитента валюты и запись заявки в bank_transfer_requests.
+        \nВся арифметика выполняется в SQL, поэтому параллельные переводы не теряют обновлений и не тратят средства дважды.
         \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
 
-        :param number_match:
-        :param payer_country_id:
-        :param beneficiary_country_id:
-        :param currency_id:
-        :param amount_currency_transfer:
-        :param comment:
-        :param date_request_creation:
-        :param status_cancelled:
-        :param date_cancelled:
-        """
-        try:
-            # Preparing data for insertion
-            column_names = [
-                'number_match',
-                'payer_country_id',
-                'beneficiary_country_id',
-                'currency_id',
-                'amount_currency_transfer',
-                'comment',
-                'date_request_creation',
-                'status_cancelled',
-                'date_cancelled',
-            ]
-
-            values = (
-                number_match,
-                payer_country_id,
-                beneficiary_country_id,
-                currency_id,
-                amount_currency_transfer,
-                comment,
-                date_request_creation,
-                status_cancelled,
-                date_cancelled
-            )
-
-            # Checking data length
-            if len(column_names) != len(values):
-                raise ValueError(f"Mismatch between columns and values! Values: {values} for Columns: {column_names}")
-
-            # Inserting data into the database
-            await self.insert(
-                table_name='bank_transfer_requests',
-                columns=column_names,
-                values=values
-            )
-        except (ValueError, TypeError) as error:
-            print(f'Error "DatabaseManager/register_bank_transfer": {error}')
-
-    async def transfer_capital(self, country_id: int, currency_id: int, amount_currency_transfer: float, payer: bool = False, beneficiary: bool = False):
-        """
-        Совершение перевода капитала
-        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
-
-        :param country_id: Id государства с которыми
-        :param currency_id: ID валюты
+        :param number_match: номер матча
+        :param payer_country_id: Id государства отправителя
+        :param beneficiary_country_id: Id государства получателя
+        :param currency_id: Id валюты перевода
         :param amount_currency_transfer: объем перевода
-        :param payer: отправитель
-        :param beneficiary: получатель
-        :return:
+        :param comment: комментарий к переводу
+        :param date_request_creation: дата и время создания перевода
+        :return: Id созданной заявки банковского перевода
+        :raise ValueError: объем перевода не больше 0 или отправитель совпадает с получателем
+        :raise InsufficientFundsError: у отправителя нет такого объема валюты
         """
-        column_names = [
-            f'country_{country_id}'
-        ]
+        if amount_currency_transfer <= 0:
+            raise ValueError('Объем перевода не может быть меньше или равно 0')
+        if payer_country_id == beneficiary_country_id:
+            raise ValueError('Отправитель и получатель перевода совпадают')
 
-        where_clause = {
-            f'currency_id': currency_id
-        }
-
-        data_amount_capital_payer = await self.select(
-            table_name='currency_capitals',
-            columns=column_names,
-            where_clause=where_clause
-        )
-
-        amount_capital_payer = data_amount_capital_payer[0][f'country_{country_id}']
-
-        if amount_capital_payer is None:
-            amount_capital_payer = 0.00
-        elif amount_capital_payer <= 0:
-            amount_capital_payer = 0.00
-
-        logger.info(f'Найденный капитал у ({country_id}): {amount_capital_payer}')
-
-        new_amount_capital = 0
-
-        if payer:
-            new_amount_capital = amount_capital_payer - amount_currency_transfer
-        elif beneficiary:
-            new_amount_capital = amount_capital_payer + amount_currency_transfer
-
-        if new_amount_capital <= 0:
-            new_amount_capital = None
-
-        logger.info(f'Новый показатель капитала у ({country_id}): {new_amount_capital}')
-
-        data_set = {
-            f'country_{country_id}': new_amount_capital
-        }
-
-        where_clause = {
+        parameters = self.match_parameters({
+            'amount': amount_currency_transfer,
             'currency_id': currency_id,
-        }
-
-        await self.update(
-            table_name='currency_capitals',
-            data_set=data_set,
-            where_clause=where_clause
-        )
-
-    async def execution_bank_transfer(self, data_bank_transfer_request: dict):
-        """
-        Выполнение банковского перевода от отправителя к получателю
-        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
-
-        :param data_bank_transfer_request: [
-            'id',
-            'number_match',
-            'payer_country_id',
-            'beneficiary_country_id',
-            'currency_id',
-            'amount_currency_transfer',
-            'comment',
-            'date_request_creation',
-            'status_cancelled',
-            'date_cancelled',
-        ]
-        """
-        payer_country_id = data_bank_transfer_request['payer_country_id']
-        beneficiary_country_id = data_bank_transfer_request['beneficiary_country_id']
-        currency_id = data_bank_transfer_request['currency_id']
-        amount_currency_transfer = data_bank_transfer_request['amount_currency_transfer']
-
-        await self.transfer_capital(
-            country_id=payer_country_id,
-            currency_id=currency_id,
-            amount_currency_transfer=amount_currency_transfer,
-            payer=True
-        )
-
-        await self.transfer_capital(
-            country_id=beneficiary_country_id,
-            currency_id=currency_id,
-            amount_currency_transfer=amount_currency_transfer,
-            beneficiary=True
-        )
-
-    async def get_bank_transfer(self, payer_country_id: int = 0, date_request_creation: str = '', request_id: int = 0) -> dict | None:
-        """
-        Обязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
-
-        :param request_id: Id сделки
-        :param date_request_creation: Дата и время создания банковского перевода
-        :param payer_country_id: Id отправителя
-        :return: возвращает словарь в списке, в словаре есть данные о банковском переводе | None
-        """
-        column_names = [
-            'id',
-            'number_match',
-            'payer_country_id',
-            'beneficiary_country_id',
-            'currency_id',
-            'amount_currency_transfer',
-            'comment',
-            'date_request_creation',
-            'status_cancelled',
-            'date_cancelled',
-        ]
-
-        where_clause = {}
-
-        if payer_country_id != 0:
-            where_clause['payer_country_id'] = payer_country_id
-        if request_id != 0:
-            where_clause['id'] = request_id
-        if date_request_creation != '':
-            where_clause['date_request_creation'] = date_request_creation
-
-        data_requests = await self.select(
-            table_name='bank_transfer_requests',
-            columns=column_names,
-            where_clause=where_clause
-        )
-
-        if data_requests:
-            return data_requests[0]
-        else:
-            return None
-
-    async def update_amount_national_currency_for_issuer(
-            self,
-            number_match: str,
-            country_id: int,
-            currency_id: int,
-            currency_name: str,
-            amount_currency_transfer: float,
-            payer: bool = False,
-            beneficiary: bool = False
-    ) -> bool | None:
-        """
-        Проверяет государство на эмитента, при банковском переводе. Если проверяемое государство является таковым, то обновляет текущий объем валюты нац. валюты у эмитента, если проверяемое id государства является таковым.
-        \n\nОбязательно поставьте номер матча, в DatabaseManager(database_path=number_match)
-
-        :param payer: отправитель
-        :param beneficiary: получатель
-        :param number_match: номер матча
-        :param country_id: ID проверяемого государства
-        :param currency_id: ID искомой валюты эмитента
-        :param currency_name: Наименование искомой валюты эмитента
-        :param amount_currency_transfer: объем изменений валюты, если проверяемое государство является эмитентом искомой валюты
-        """
-        status_country = ''
-
-        if payer:
-            status_country = 'payer'
-        elif beneficiary:
-            status_country = 'beneficiary'
-
-        try:
-            data_country = await self.get_data_country(
-                number_match=number_match,
-                country_id=country_id
+            'payer_country_id': payer_country_id,
+            'beneficiary_country_id': beneficiary_country_id
+        })
+
+        async with connection_registry.transaction(self.SPyderSQLite.db_path, immediate=True) as db:
+            # Списание у отправителя, только если хватает средств. Нулевой остаток удаляется из currency_holdings.
+            cursor = await db.execute(self.match_query(HOLDINGS_DEBIT_QUERY), {**parameters, 'country_id': payer_country_id})
+
+            if cursor.rowcount != 1:
+                raise InsufficientFundsError('Вы не располагаете таким объемом валюты')
+
+            await db.execute(self.match_query(HOLDINGS_CLEANUP_QUERY), {**parameters, 'country_id': payer_country_id})
+            await db.execute(self.match_query(HOLDINGS_CREDIT_QUERY), {**parameters, 'country_id': beneficiary_country_id})
+
+            # Эмитент валюты отдает свою валюту - ее текущий запас уменьшается
+            payer_issuer_cursor = await db.execute(
+                "UPDATE currency "
+                "SET current_amount = CASE WHEN MAX(COALESCE(current_amount, 0), 0) - :amount > 0 "
+                "THEN MAX(COALESCE(current_amount, 0), 0) - :amount ELSE NULL END "
+                "WHERE id = :currency_id AND country_id = :payer_country_id",
+                parameters
             )
 
-            if not data_country:
-                raise Exception(f'Данные ГОСУДАРСТВА искомого эмитента в роли {status_country}, по валюте {currency_name}: не найдены')
-
-            data_currency = await self.get_data_currency(
-                data_country=data_country
+            # Эмитент валюты получает свою валюту обратно - ее текущий запас растет
+            beneficiary_issuer_cursor = await db.execute(
+                "UPDATE currency "
+                "SET current_amount = MAX(COALESCE(current_amount, 0), 0) + :amount "
+                "WHERE id = :currency_id AND country_id = :beneficiary_country_id",
+                parameters
             )
 
-            if not data_currency:
-                raise Exception(f'Данные ВАЛЮТЫ искомого эмитента в роли {status_country}, по валюте {currency_name}: не найдены')
-
-
-            if data_currency['currency'][0]['id'] == currency_id:
-                column_names = ['current_amount']
-                where_clause = {'id': currency_id}
-
-                data_amount_national_currency_for_issuer = await self.select(
-                    table_name='currency',
-                    columns=column_names,
-                    where_clause=where_clause
+            column_names, values = self.match_insert(
+                table_name='bank_transfer_requests',
+                columns=[
+                    'number_match',
+                    'payer_country_id',
+                    'beneficiary_country_id',
+                    'currency_id',
+                    'amount_currency_transfer',
+                    'comment',
+                    'date_request_creation',
+                    'status_cancelled',
+                    'date_cancelled',
+                ],
+                values=(
+                    number_match,
+                    payer_country_id,
+                    beneficiary_country_id,
+                    currency_id,
+                    amount_currency_transfer,
+                    comment,
+                    date_request_creation,
+                    False,
+                    ''
                 )
+            )
 
-                current_amount_national_currency = data_amount_national_currency_for_issuer[0]['current_amount']
-
-                if current_amount_national_currency is None:
-                    current_amount_national_currency = 0.00
-                elif current_amount_national_currency <= 0:
-                    current_amount_national_currency = 0.00
-
-                logger.info(f'Найденный капитала эмитента ({country_id}), он же {status_country}: {current_amount_national_currency}')
+            # Свой построитель запроса: общий self.SPyderSQLite после build() без execute() хранил бы состояние этого запроса
+            sql_builder = SPyderSQLite(self.SPyderSQLite.db_path)
 
-                new_amount_national_currency = 0
+            cursor = await db.execute(
+                sql_builder.insert(
+                    name_table='bank_transfer_requests',
+                    names_columns=column_names
+                ).build(),
+                values
+            )
 
-                if payer:
-                    new_amount_national_currency = current_amount_national_currency - amount_currency_transfer
-                elif beneficiary:
-                    new_amount_national_currency = current_amount_national_currency + amount_currency_transfer
+            request_id = cursor.lastrowid
 
-                if new_amount_national_currency <= 0:
-                    new_amount_national_currency = None
+            # current_amount изменился только если одна из сторон - эмитент валюты
+            issuer_changed = payer_issuer_cursor.rowcount > 0 or beneficiary_issuer_cursor.rowcount > 0
 
-                logger.info(f'Новый показатель капитала эмитента ({country_id}), он же {status_country}: {new_amount_national_currency}')
+        if issuer_changed:
+            self.mark_courses_dirty(currency_id)
 
-                data_set = {'current_amount': new_amount_national_currency}
-                where_clause = {'id': currency_id}
+        logger.info(f'Банковский перевод #{request_id} выполнен: {payer_country_id} -> {beneficiary_country_id}, {amount_currency_transfer} (currency_id {currency_id}). № Матч {number_match}.')
 
-                await self.update(
-                    table_name='currency',
-                    data_set=data_set,
-                    where_clause=where_clause
-                )
-                return True
-            else:
-                return False
-        except Exception as error:
-            logger.error(f'Данные не обнаружены: {error}')
-            return None
+        return request_id
@@ -0,0 +1,123 @@
+import logging
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+# Разделы кэша: каждый раздел читается из своей таблицы матча целиком и сбрасывается независимо.
+# {match_where} заполняет DatabaseManager.match_query (строки одного матча в общей базе).
+SECTION_COUNTRIES = 'countries'
+SECTION_CURRENCY = 'currency'
+
+METADATA_SECTIONS = {
+    SECTION_COUNTRIES: 'SELECT id, name, telegram_id FROM countries{match_where} ORDER BY id',
+    SECTION_CURRENCY: 'SELECT id, name, tick FROM currency{match_where} ORDER BY id',
+}
+
+
+class MatchMetadataCache:
+    """
+    Кэш редко меняющихся справочников матча в памяти процесса: государства (id, name, telegram_id) и валюты (id, name, tick).
+    \n\nКлюч матча - путь к файлу матча, а для общей базы - путь с номером матча (DatabaseManager.metadata_key).
+    \nРаздел загружается из базы матча одним запросом при первом обращении и живет до явной инвалидации
+    методами DatabaseManager, которые меняют соответствующую таблицу.
+    \nЕсли раздел сбросили, пока он загружался, результат загрузки не сохраняется (счетчик поколений).
+    """
+
+    def __init__(self):
+        self._sections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._generations: Dict[str, Dict[str, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __repr__(self):
+        return f"MatchMetadataCache('matches:{len(self._sections)}', 'hits:{self.hits}', 'misses:{self.misses}')"
+
+    def _generation(self, match_key: str, section: str) -> int:
+        return self._generations.get(match_key, {}).get(section, 0)
+
+    @staticmethod
+    def _build_section(section: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Раскладывает строки таблицы по словарям для поиска за O(1)."""
+        by_id = {row['id']: row for row in rows}
+
+        if section == SECTION_COUNTRIES:
+            return {
+                'rows': rows,
+                'by_id': by_id,
+                'id_by_name': {row['name']: row['id'] for row in rows},
+            }
+
+        return {'rows': rows, 'by_id': by_id}
+
+    async def get_section(
+            self,
+            match_key: str,
+            section: str,
+            loader: Callable[[str], Awaitable[Optional[List[Dict[str, Any]]]]]
+    ) -> Dict[str, Any]:
+        """
+        Возвращает раздел кэша для базы матча, при промахе загружая его через loader.
+
+        :param match_key: Ключ матча (DatabaseManager.metadata_key).
+        :param section: SECTION_COUNTRIES или SECTION_CURRENCY.
+        :param loader: Корутина, выполняющая шаблон SQL-запроса раздела и возвращающая список строк.
+        """
+        cached = self._sections.get(match_key, {}).get(section)
+
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        generation = self._generation(match_key, section)
+
+        rows = await loader(METADATA_SECTIONS[section])
+        cached = self._build_section(section, rows or [])
+
+        if generation == self._generation(match_key, section):
+            self._sections.setdefault(match_key, {})[section] = cached
+
+        return cached
+
+    def invalidate(self, match_key: str, *sections: str):
+        """
+        Сбрасывает разделы кэша для базы матча. Без sections сбрасывает все разделы матча.
+
+        :param match_key: Ключ матча (DatabaseManager.metadata_key).
+        :param sections: SECTION_COUNTRIES и/или SECTION_CURRENCY.
+        """
+        sections = sections or tuple(METADATA_SECTIONS)
+        cached_sections = self._sections.get(match_key, {})
+        generations = self._generations.setdefault(match_key, {})
+
+        for section in sections:
+            cached_sections.pop(section, None)
+            generations[section] = generations.get(section, 0) + 1
+
+        if not cached_sections:
+            self._sections.pop(match_key, None)
+
+        self.invalidations += 1
+
+    def clear(self):
+        """Сбрасывает кэш всех матчей."""
+        for match_key in list(self._sections):
+            self.invalidate(match_key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: попадания, промахи, доля попаданий, сбросы и число матчей в кэше."""
+        total = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'invalidations': self.invalidations,
+            'matches': len(self._sections),
+        }
+
+
+# Общий кэш справочников для всех экземпляров DatabaseManager
+metadata_cache = MatchMetadataCache()
@@ -0,0 +1,188 @@
+"""
+Разовые миграции баз данных существующих матчей.
+
+Запуск из корня проекта:
+    python -m app.DatabaseWork.migrations
+Перенос файлов матчей в общую базу (DATABASE_STORAGE_MODE=consolidated):
+    python -m app.DatabaseWork.migrations consolidate
+"""
+import asyncio, logging, os, sys
+
+from app.DatabaseWork.database import (
+    DatabaseManager, MATCH_TABLES, CONSOLIDATED_DB_PATH, STORAGE_FILES, STORAGE_CONSOLIDATED
+)
+from app.DatabaseWork.connection_registry import connection_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Ссылки между таблицами матча: {таблица: {столбец: таблица, на id которой он ссылается}}.
+# В общей базе id сквозные для всех матчей, поэтому при переносе ссылки пересчитываются.
+MATCH_FOREIGN_KEYS = {
+    'currency': {'country_id': 'countries'},
+    'currency_emission_requests': {'country_id': 'countries'},
+    'bank_transfer_requests': {
+        'payer_country_id': 'countries',
+        'beneficiary_country_id': 'countries',
+        'currency_id': 'currency'
+    },
+    'currency_holdings': {'country_id': 'countries', 'currency_id': 'currency'},
+    'course_history': {'currency_id': 'currency'},
+}
+
+
+async def get_existing_match_numbers() -> list[str]:
+    """Возвращает номера матчей из таблицы match в master.db, у которых есть файл базы данных."""
+    all_match_numbers: list[int] | None = await DatabaseManager().get_all_match_numbers()
+
+    existing_match_numbers = []
+
+    for number_match in all_match_numbers or []:
+        if not os.path.exists(f'database/{number_match}.db'):
+            logger.error(f'Файл базы данных матча {number_match} не найден, пропускаю.')
+            continue
+
+        existing_match_numbers.append(str(number_match))
+
+    return existing_match_numbers
+
+
+async def migrate_currency_holdings() -> int:
+    """
+    Переносит капиталы всех матчей из широкой таблицы currency_capitals в currency_holdings.
+
+    :return: количество перенесенных матчей
+    """
+    count_migrated = 0
+
+    for number_match in await get_existing_match_numbers():
+        if await DatabaseManager(database_path=number_match, storage_mode=STORAGE_FILES).migrate_currency_capitals_to_holdings():
+            count_migrated += 1
+            logger.info(f'Капиталы перенесены для № матча: {number_match}')
+
+    return count_migrated
+
+
+async def migrate_match_indexes() -> int:
+    """
+    Добавляет индексы MATCH_INDEXES во все базы данных матчей из таблицы match в master.db.
+
+    :return: количество обработанных матчей
+    """
+    count_migrated = 0
+
+    for number_match in await get_existing_match_numbers():
+        await DatabaseManager(database_path=number_match, storage_mode=STORAGE_FILES).create_match_indexes()
+
+        count_migrated += 1
+        logger.info(f'Индексы созданы для № матча: {number_match}')
+
+    return count_migrated
+
+
+async def import_match_file(number_match: str) -> bool:
+    """
+    Переносит все таблицы матча из файла database/{number_match}.db в общую базу CONSOLIDATED_DB_PATH
+    одной транзакцией. Файл матча не удаляется.
+    \n\nСтроки получают новые сквозные id, ссылки MATCH_FOREIGN_KEYS пересчитываются.
+
+    :return: True - матч перенесен, False - матч уже есть в общей базе
+    """
+    source_db = DatabaseManager(database_path=number_match, storage_mode=STORAGE_FILES)
+    target_db = DatabaseManager(database_path=number_match, storage_mode=STORAGE_CONSOLIDATED)
+
+    await DatabaseManager.initialize_consolidated_storage()
+
+    if await target_db.select_one(table_name='countries', columns=['id'], where_clause={}):
+        logger.info(f'Матч {number_match} уже есть в {CONSOLIDATED_DB_PATH}, пропускаю.')
+        return False
+
+    # Старые матчи сначала приводятся к текущей схеме (currency_holdings вместо currency_capitals, course_history)
+    await source_db.migrate_currency_capitals_to_holdings()
+    await source_db.create_course_history_table()
+
+    source_rows = {
+        table_name: await source_db.execute(f'SELECT * FROM {table_name} ORDER BY id') or []
+        for table_name in MATCH_TABLES
+    }
+
+    new_ids = {table_name: {} for table_name in MATCH_TABLES}
+    count_lost_links = 0
+
+    async with connection_registry.transaction(CONSOLIDATED_DB_PATH) as db:
+        # MATCH_TABLES перечислены так, что countries и currency переносятся раньше ссылающихся на них таблиц
+        for table_name, columns in MATCH_TABLES.items():
+            foreign_keys = MATCH_FOREIGN_KEYS.get(table_name, {})
+            column_names, _ = target_db.match_insert(table_name, list(columns), ())
+
+            query = target_db.SPyderSQLite.insert(
+                name_table=table_name,
+                names_columns=column_names
+            ).build()
+
+            for row in source_rows[table_name]:
+                values = []
+
+                for column in columns:
+                    value = row.get(column)
+
+                    if column in foreign_keys and value is not None:
+                        new_value = new_ids[foreign_keys[column]].get(value)
+
+                        if new_value is None:
+                            count_lost_links += 1
+
+                        value = new_value
+
+                    values.append(value)
+
+                cursor = await db.execute(query, target_db.match_insert(table_name, [], tuple(values))[1])
+                new_ids[table_name][row['id']] = cursor.lastrowid
+
+    if count_lost_links:
+        logger.warning(f'Матч {number_match}: {count_lost_links} ссылок на несуществующие строки перенесены как NULL.')
+
+    return True
+
+
+async def migrate_match_files_to_consolidated() -> int:
+    """
+    Переносит все матчи из отдельных файлов в общую базу CONSOLIDATED_DB_PATH.
+    \n\nОшибка в одном матче откатывает только его перенос, остальные матчи продолжают переноситься.
+
+    :return: количество перенесенных матчей
+    """
+    count_migrated = 0
+
+    for number_match in await get_existing_match_numbers():
+        try:
+            if await import_match_file(number_match):
+                count_migrated += 1
+                logger.info(f'Матч {number_match} перенесен в {CONSOLIDATED_DB_PATH}')
+        except Exception as error:
+            logger.error(f'Не удалось перенести матч {number_match} в {CONSOLIDATED_DB_PATH}: {error}')
+
+    return count_migrated
+
+
+async def main(consolidate: bool = False):
+    try:
+        count_migrated = await migrate_currency_holdings()
+        logger.info(f'Миграция капиталов завершена. Матчей: {count_migrated}')
+
+        count_migrated = await migrate_match_indexes()
+        logger.info(f'Миграция индексов завершена. Матчей: {count_migrated}')
+
+        if consolidate:
+            count_migrated = await migrate_match_files_to_consolidated()
+            logger.info(
+                f'Перенос матчей в общую базу завершен. Матчей: {count_migrated}. '
+                f'Для работы с ней укажите DATABASE_STORAGE_MODE={STORAGE_CONSOLIDATED} в .env'
+            )
+    finally:
+        await connection_registry.close_all()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(main(consolidate='consolidate' in sys.argv[1:]))
@@ -3,3 +3,18 @@ class InvalidMatchNumberFormatError(Exception):
     Неверный формат номера матча
     """
     pass
+
+
+class InsufficientFundsError(Exception):
+    """
+    Недостаточно средств в капитале государства для банковского перевода
+    """
+    pass
+
+
+class ChartRenderUnavailableError(Exception):
+    """
+    Диаграмма не построена: очередь пула отрисовки переполнена, отрисовка не уложилась в таймаут или процесс пула упал.
+    Обработчик отвечает текстом без диаграммы.
+    """
+    pass
@@ -0,0 +1,168 @@
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Constants
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 16
+ADAPTIVE_INITIAL_CONCURRENCY = 4
+
+LATENCY_TOLERANCE = 1.5  # окно считается медленным, если средняя задержка выше базовой в столько раз
+MAX_ERROR_RATE = 0.1  # доля ошибок (и таймаутов) в окне, после которой лимит снижается
+BACKOFF_RATIO = 0.5  # множитель лимита при перегрузке
+BASELINE_DRIFT = 0.01  # скорость, с которой базовая задержка подтягивается к более медленным окнам
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Адаптивный лимит одновременных задач по схеме AIMD (аддитивный рост, мультипликативное снижение).
+    \n\nРешение принимается после каждого окна из limit завершенных задач:
+    \n- доля ошибок в окне выше max_error_rate или средняя задержка выше базовой в latency_tolerance раз -
+    лимит умножается на backoff_ratio;
+    \n- иначе, если в окне все места были заняты, лимит растет на 1.
+    \nБазовая задержка - самое быстрое окно, медленно подтягивающееся к текущим (BASELINE_DRIFT).
+    \nЗадержка задачи включает ожидание цикла событий, поэтому рост нагрузки от обработчиков бота
+    тоже замедляет задачи и снижает лимит - фоновые обходы уступают пользователям.
+    \nОдин лимитер можно делить между несколькими TaskRunner: in_flight считается общим. Задачи у них должны быть
+    одного вида: базовая задержка общая, и после окон быстрых задач окна медленных считаются перегрузкой.
+
+    :param min_limit: Нижняя граница лимита.
+    :param max_limit: Верхняя граница лимита.
+    :param initial: Начальный лимит.
+    :param latency_target: Абсолютный предел средней задержки окна, секунд (None - только относительно базовой).
+    :param name: Название для логов и метрик.
+    """
+
+    def __init__(
+            self,
+            min_limit: int = ADAPTIVE_MIN_CONCURRENCY,
+            max_limit: int = ADAPTIVE_MAX_CONCURRENCY,
+            initial: int = ADAPTIVE_INITIAL_CONCURRENCY,
+            latency_target: Optional[float] = None,
+            latency_tolerance: float = LATENCY_TOLERANCE,
+            max_error_rate: float = MAX_ERROR_RATE,
+            backoff_ratio: float = BACKOFF_RATIO,
+            name: str = 'limiter'
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f'Неверные границы лимита: min_limit={min_limit}, max_limit={max_limit}')
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.backoff_ratio = backoff_ratio
+        self.name = name
+
+        self.limit: float = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self.last_window_latency: Optional[float] = None
+
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+        self._window_saturated = False
+
+        self.completed = 0
+        self.errors = 0
+        self.increases = 0
+        self.decreases = 0
+
+    def __repr__(self):
+        return f"AdaptiveConcurrencyLimiter('{self.name}', 'limit:{self.current_limit}', 'in_flight:{self.in_flight}')"
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def has_capacity(self) -> bool:
+        """Можно ли запустить еще одну задачу."""
+        return self.in_flight < self.current_limit
+
+    def on_start(self):
+        """Задача запущена."""
+        self.in_flight += 1
+
+        if self.in_flight >= self.current_limit:
+            self._window_saturated = True
+
+    def on_finish(self, latency: float, ok: bool):
+        """
+        Задача завершена.
+
+        :param latency: Время выполнения задачи, секунд.
+        :param ok: False - задача завершилась ошибкой или таймаутом.
+        """
+        self.in_flight = max(self.in_flight - 1, 0)
+        self.completed += 1
+
+        self._window_count += 1
+        self._window_latency += latency
+
+        if not ok:
+            self.errors += 1
+            self._window_errors += 1
+
+        if self._window_count >= self.current_limit:
+            self._close_window()
+
+    def on_cancel(self):
+        """Задача отменена до завершения (прерван весь запуск) - в окно не учитывается."""
+        self.in_flight = max(self.in_flight - 1, 0)
+
+    def _close_window(self):
+        """Подводит итог окна и меняет лимит."""
+        window_latency = self._window_latency / self._window_count
+        error_rate = self._window_errors / self._window_count
+        saturated = self._window_saturated
+
+        self.last_window_latency = window_latency
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+        self._window_saturated = self.in_flight >= self.current_limit
+
+        overloaded = (
+            error_rate > self.max_error_rate
+            or (self.baseline_latency is not None and window_latency > self.baseline_latency * self.latency_tolerance)
+            or (self.latency_target is not None and window_latency > self.latency_target)
+        )
+
+        if self.baseline_latency is None or window_latency < self.baseline_latency:
+            self.baseline_latency = window_latency
+        else:
+            self.baseline_latency += (window_latency - self.baseline_latency) * BASELINE_DRIFT
+
+        if overloaded:
+            new_limit = max(self.limit * self.backoff_ratio, self.min_limit)
+
+            if int(new_limit) < self.current_limit:
+                self.decreases += 1
+                logger.info(
+                    f'Лимит {self.name} снижен: {self.current_limit} -> {int(new_limit)} '
+                    f'(задержка {window_latency:.3f} с, базовая {self.baseline_latency:.3f} с, ошибок {error_rate:.0%})'
+                )
+
+            self.limit = new_limit
+        elif saturated and self.limit < self.max_limit:
+            self.limit = min(self.limit + 1, self.max_limit)
+            self.increases += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики: текущий лимит и границы, задачи в работе, завершено, ошибок, изменения лимита, задержки окна."""
+        return {
+            'limit': self.current_limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'errors': self.errors,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'last_window_latency': round(self.last_window_latency, 4) if self.last_window_latency is not None else None,
+            'baseline_latency': round(self.baseline_latency, 4) if self.baseline_latency is not None else None,
+        }
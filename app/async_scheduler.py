@@ -0,0 +1,247 @@
+import asyncio, json, logging, os, random, time
+from datetime import datetime
+from typing import Callable, Awaitable, Any, Dict, Optional
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    """
+    Периодическая задача планировщика AsyncScheduler.
+
+    :param name: Уникальное имя задачи, под ним хранится время последнего запуска.
+    :param func: Функция без аргументов, возвращающая корутину.
+    :param interval: Период запуска, секунд.
+    :param timeout: Максимальное время выполнения, секунд (None - без ограничения).
+    :param jitter: Случайная добавка к каждому сроку запуска от 0 до jitter секунд, чтобы задачи не стартовали одновременно.
+    :param run_at_start: Запустить сразу, если задача еще ни разу не запускалась.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            func: Callable[[], Awaitable[Any]],
+            interval: float,
+            timeout: Optional[float] = None,
+            jitter: float = 0.0,
+            run_at_start: bool = False
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.run_at_start = run_at_start
+
+        self.last_run: Optional[float] = None  # time.time() начала последнего запуска
+        self.next_run: float = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def __repr__(self):
+        return f"ScheduledJob('{self.name}', 'interval:{self.interval}', 'next_run:{datetime.fromtimestamp(self.next_run)}')"
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def schedule_next(self, now: float, from_now: bool = False):
+        """
+        Назначает следующий запуск: через interval после последнего запуска плюс случайный jitter.
+        \n\nПросроченный запуск (например, бот был выключен) назначается на now.
+
+        :param now: Текущее время time.time().
+        :param from_now: Отсчитать interval от now (срок пропущен, потому что задача еще выполняется).
+        """
+        base = now if from_now or self.last_run is None else self.last_run
+
+        if self.last_run is None and self.run_at_start and not from_now:
+            self.next_run = now
+        else:
+            self.next_run = max(base + self.interval, now)
+
+        if self.jitter:
+            self.next_run += random.uniform(0, self.jitter)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'last_run': datetime.fromtimestamp(self.last_run).isoformat(timespec='seconds') if self.last_run else None,
+            'next_run': datetime.fromtimestamp(self.next_run).isoformat(timespec='seconds'),
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+        }
+
+
+class AsyncScheduler:
+    """
+    Планировщик периодических задач на asyncio, без опроса по таймеру.
+    \n\nЦикл спит ровно до ближайшего срока запуска (или до регистрации новой задачи / ручного запуска).
+    \nЗадача не запускается повторно, пока не завершился ее предыдущий запуск, и прерывается по timeout.
+    \nВремя последнего запуска каждой задачи сохраняется в state_path, поэтому после перезапуска бота
+    задача выполняется по своему расписанию, а не через полный интервал с момента старта.
+    """
+
+    def __init__(self, state_path: Optional[str] = None):
+        self.state_path = state_path
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._state: Dict[str, float] = {}
+        self._state_loaded = False
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def __repr__(self):
+        return f"AsyncScheduler('jobs:{len(self.jobs)}', 'state_path:{self.state_path}')"
+
+    def register(
+            self,
+            name: str,
+            func: Callable[[], Awaitable[Any]],
+            interval: float,
+            timeout: Optional[float] = None,
+            jitter: float = 0.0,
+            run_at_start: bool = False
+    ) -> ScheduledJob:
+        """
+        Регистрирует периодическую задачу (см. ScheduledJob). Повторная регистрация с тем же name заменяет задачу.
+        """
+        job = ScheduledJob(name, func, interval, timeout=timeout, jitter=jitter, run_at_start=run_at_start)
+
+        job.last_run = self._state.get(name)
+        job.schedule_next(time.time())
+
+        self.jobs[name] = job
+        self._wakeup.set()
+
+        return job
+
+    def trigger(self, name: str):
+        """Запускает задачу вне расписания при ближайшей возможности (если она не выполняется прямо сейчас)."""
+        self.jobs[name].next_run = time.time()
+        self._wakeup.set()
+
+    async def _load_state(self):
+        """Читает время последних запусков задач из state_path."""
+        self._state_loaded = True
+
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+
+        try:
+            async with aiofiles.open(self.state_path, mode='r', encoding='utf-8') as file:
+                self._state = {name: float(last_run) for name, last_run in json.loads(await file.read()).items()}
+        except (OSError, ValueError, AttributeError) as error:
+            logger.error(f'Не удалось прочитать состояние планировщика {self.state_path}: {error}')
+            return
+
+        now = time.time()
+
+        for job in self.jobs.values():
+            if job.name in self._state:
+                job.last_run = self._state[job.name]
+                job.schedule_next(now)
+
+    async def _save_state(self):
+        """Записывает время последних запусков задач в state_path (через временный файл, без порчи при сбое)."""
+        if not self.state_path:
+            return
+
+        temporary_path = f'{self.state_path}.tmp'
+
+        try:
+            async with aiofiles.open(temporary_path, mode='w', encoding='utf-8') as file:
+                await file.write(json.dumps(self._state, indent=2))
+
+            os.replace(temporary_path, self.state_path)
+        except OSError as error:
+            logger.error(f'Не удалось сохранить состояние планировщика {self.state_path}: {error}')
+
+    async def _run_job(self, job: ScheduledJob):
+        """Выполняет один запуск задачи с ограничением по времени и учетом результата."""
+        start = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout)
+            job.last_error = None
+        except asyncio.TimeoutError:
+            job.failures += 1
+            job.last_error = f'timeout {job.timeout} с'
+            logger.error(f'Задача планировщика {job.name} прервана по таймауту {job.timeout} с.')
+        except Exception as error:
+            job.failures += 1
+            job.last_error = repr(error)
+            logger.error(f'Ошибка в задаче планировщика {job.name}: {error}', exc_info=True)
+        finally:
+            job.runs += 1
+            job.last_duration = round(time.perf_counter() - start, 3)
+
+            self._state[job.name] = job.last_run
+            await self._save_state()
+
+            logger.info(f'Задача планировщика {job.name} завершена за {job.last_duration} с.')
+
+    def _start_due_jobs(self, now: float):
+        """Запускает задачи, срок которых наступил. Выполняющиеся задачи пропускают срок и переносятся на следующий."""
+        for job in self.jobs.values():
+            if job.next_run > now:
+                continue
+
+            if job.running:
+                job.skipped += 1
+                logger.warning(f'Задача планировщика {job.name} еще выполняется, запуск пропущен.')
+                job.schedule_next(now, from_now=True)
+                continue
+
+            job.last_run = now
+            job.schedule_next(now)
+            job.task = asyncio.create_task(self._run_job(job), name=f'scheduler:{job.name}')
+
+    async def run(self):
+        """Основной цикл: спит до ближайшего срока, запускает наступившие задачи. Работает до stop()."""
+        if not self._state_loaded:
+            await self._load_state()
+
+        logger.info(f'Планировщик запущен. Задачи: {", ".join(self.jobs) or "нет"}')
+
+        while not self._stopping:
+            now = time.time()
+            self._start_due_jobs(now)
+
+            next_deadline = min((job.next_run for job in self.jobs.values()), default=None)
+            delay = None if next_deadline is None else max(next_deadline - time.time(), 0)
+
+            self._wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self, timeout: float = 10.0):
+        """Останавливает цикл и ждет завершения выполняющихся задач не дольше timeout секунд, затем отменяет их."""
+        self._stopping = True
+        self._wakeup.set()
+
+        running_tasks = [job.task for job in self.jobs.values() if job.running]
+
+        if running_tasks:
+            done, pending = await asyncio.wait(running_tasks, timeout=timeout)
+
+            for task in pending:
+                task.cancel()
+
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние всех задач: время последнего и следующего запуска, число запусков, ошибок и пропусков."""
+        return {name: job.stats() for name, job in self.jobs.items()}
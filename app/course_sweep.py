@@ -0,0 +1,178 @@
+import asyncio, logging, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional
+
+from app.DatabaseWork.database import DatabaseManager, STORAGE_FILES
+from app.DatabaseWork.connection_registry import connection_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Обход курсов в отдельных процессах (переменные окружения в .env):
+# COURSE_SWEEP_WORKERS - число процессов (0 - обход в цикле событий бота, как раньше),
+# COURSE_SWEEP_SHARD_SIZE - сколько файлов матчей получает процесс за один раз (по завершении части пишется прогресс).
+COURSE_SWEEP_WORKERS = int(os.getenv('COURSE_SWEEP_WORKERS', str(min(4, os.cpu_count() or 1))))
+COURSE_SWEEP_SHARD_SIZE = int(os.getenv('COURSE_SWEEP_SHARD_SIZE', '25'))
+
+
+def split_into_shards(match_numbers: List[str], shard_size: int) -> List[List[str]]:
+    """Делит номера матчей на части по shard_size подряд идущих матчей."""
+    shard_size = max(shard_size, 1)
+
+    return [match_numbers[start:start + shard_size] for start in range(0, len(match_numbers), shard_size)]
+
+
+async def sweep_shard_async(match_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Пересчитывает курсы валют в файлах матчей одной части. Ошибка в матче не прерывает остальные матчи части.
+
+    :return: {'updated': {номер матча: количество валют}, 'errors': {номер матча: текст ошибки}}
+    """
+    result_shard = {'updated': {}, 'errors': {}}
+
+    try:
+        for number_match in match_numbers:
+            try:
+                db_manager = DatabaseManager(database_path=number_match, storage_mode=STORAGE_FILES)
+                result_shard['updated'][number_match] = await db_manager.update_course_all_currencies()
+            except Exception as error:
+                result_shard['errors'][number_match] = repr(error)
+    finally:
+        # У процесса свой connection_registry: соединения закрываются до возврата результата
+        await connection_registry.close_all()
+
+    return result_shard
+
+
+def sweep_shard(match_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Точка входа процесса пула: свой цикл событий на каждую часть матчей (см. sweep_shard_async)."""
+    return asyncio.run(sweep_shard_async(match_numbers))
+
+
+class CourseSweepPool:
+    """
+    Пул процессов обхода курсов на все время работы бота: процессы запускаются методом spawn (без копирования
+    потоков aiosqlite) при первом обходе, и следующие обходы используют их же, не тратя время на запуск.
+    \n\nУпавший пул отбрасывается и создается заново при следующем обходе.
+
+    :param workers: Число процессов.
+    """
+
+    def __init__(self, workers: int = COURSE_SWEEP_WORKERS):
+        self.workers = max(workers, 1)
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self.sweeps = 0
+        self.restarts = 0
+
+    def __repr__(self):
+        return f"CourseSweepPool('workers:{self.workers}', 'sweeps:{self.sweeps}')"
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Возвращает пул процессов, создавая его при первом обращении."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+        return self._executor
+
+    def reset_executor(self):
+        """Отбрасывает упавший пул, следующий обход создаст новый."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.restarts += 1
+
+    def shutdown(self):
+        """Останавливает пул, не дожидаясь еще не начатых частей. Вызывается при выключении бота."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: процессов, обходов, пересозданий упавшего пула, запущен ли пул."""
+        return {
+            'workers': self.workers,
+            'sweeps': self.sweeps,
+            'restarts': self.restarts,
+            'running': self._executor is not None,
+        }
+
+
+# Общий пул обхода курсов (процессы живут, пока работает бот)
+course_sweep_pool = CourseSweepPool()
+
+
+async def sweep_courses_in_process_pool(
+        match_numbers: List[str],
+        shard_size: int = COURSE_SWEEP_SHARD_SIZE,
+        pool: CourseSweepPool = course_sweep_pool
+) -> Dict[str, Any]:
+    """
+    Пересчитывает курсы валют во всех файлах матчей в пуле процессов, не занимая цикл событий бота.
+    \n\nМатчи делятся на части по shard_size, каждую часть целиком обрабатывает один процесс пула,
+    поэтому файл матча в обходе открыт только одним процессом. После каждой завершенной части пишется прогресс.
+    \nПроцессы пула не завершаются после обхода (см. CourseSweepPool).
+
+    :return: {'matches', 'shards', 'workers', 'updated_matches', 'currencies', 'errors': {номер матча: текст ошибки}, 'duration'}
+    """
+    start = time.perf_counter()
+    shards = split_into_shards([str(number_match) for number_match in match_numbers], shard_size)
+
+    report = {
+        'matches': sum(len(shard) for shard in shards),
+        'shards': len(shards),
+        'workers': min(pool.workers, len(shards)),
+        'updated_matches': 0,
+        'currencies': 0,
+        'errors': {},
+        'duration': 0.0,
+    }
+
+    if not shards:
+        return report
+
+    loop = asyncio.get_running_loop()
+    executor = pool.get_executor()
+    pool.sweeps += 1
+
+    pending = {loop.run_in_executor(executor, sweep_shard, shard): shard for shard in shards}
+    count_done_shards = 0
+    count_done_matches = 0
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for future in done:
+                shard = pending.pop(future)
+
+                try:
+                    result_shard = future.result()
+                except BrokenProcessPool as error:
+                    # Процесс пула упал - ошибка у всех матчей его части, пул пересоздается при следующем обходе
+                    pool.reset_executor()
+                    result_shard = {'updated': {}, 'errors': {number_match: repr(error) for number_match in shard}}
+                except Exception as error:
+                    result_shard = {'updated': {}, 'errors': {number_match: repr(error) for number_match in shard}}
+
+                report['updated_matches'] += len(result_shard['updated'])
+                report['currencies'] += sum(result_shard['updated'].values())
+                report['errors'].update(result_shard['errors'])
+
+                count_done_shards += 1
+                count_done_matches += len(shard)
+
+                logger.info(
+                    f"Обход курсов: частей {count_done_shards}/{len(shards)}, матчей {count_done_matches}/{report['matches']}, "
+                    f"ошибок {len(report['errors'])}"
+                )
+    finally:
+        # Прерванный обход (таймаут задачи планировщика) снимает еще не начатые части, пул остается для следующего обхода
+        for future in pending:
+            future.cancel()
+
+    report['duration'] = round(time.perf_counter() - start, 3)
+
+    return report
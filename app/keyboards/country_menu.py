@@ -60,6 +60,8 @@ async def lobby_statistic_menu(number_match: str, message_id_delete: int = None)
     builder = InlineKeyboardBuilder()
 
     builder.add(InlineKeyboardButton(text=str('Государства'), callback_data=f'Countries_{number_match}'))
+    builder.add(InlineKeyboardButton(text=str('Курсы валют'), callback_data=f'Currencies_{number_match}'))
+    builder.add(InlineKeyboardButton(text=str('Стоимость капитала'), callback_data=f'Portfolio_{number_match}'))
     builder.add(InlineKeyboardButton(text=str('Назад'), callback_data=f'CountryMenu_{number_match}_{message_id_delete}'))
 
     builder.adjust(1)
@@ -4,7 +4,8 @@ import logging
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
+from aiogram.exceptions import TelegramBadRequest
 
 import ClassesStatesMachine.SG as SG
 from ClassesStatesMachine.SG import update_state
@@ -12,7 +13,9 @@ from app.DatabaseWork.database import DatabaseManager
 from app.keyboards.universal import launch_solution
 from app.message_designer.formatzer import format_number_ultra
 from app.message_designer.deletezer import delete_message
-from app.message_designer.chartzer import create_chart_currency_capitals_from_country
+from app.message_designer.chartzer import get_photo_chart_currency_capitals_from_country
+from app.message_designer.chart_cache import chart_cache
+from app.MyException import InsufficientFundsError, ChartRenderUnavailableError
 from app.utils import callback_utils
 
 
@@ -124,6 +127,7 @@ async def input_name_currency_for_bank_transfer(message: Message, state: FSMCont
 
         form_choice_country = await state.get_data()
         number_match = form_choice_country['number_match']
+        payer_country_id = form_choice_country['payer_country_id']
         message_id_delete = form_choice_country['message_id_delete']
 
         names_country = await DatabaseManager(database_path=number_match).get_countries_names(busy=True)
@@ -161,7 +165,7 @@ async def input_name_currency_for_bank_transfer(message: Message, state: FSMCont
 
 
         data_currency_capitals_from_country = await DatabaseManager(database_path=number_match).get_data_currency_capitals_from_country(
-            user_id=message.from_user.id,
+            country_id=payer_country_id,
             number_match=number_match
         )
 
@@ -189,29 +193,40 @@ async def input_name_currency_for_bank_transfer(message: Message, state: FSMCont
 
         text += '\n\n<b>Введите название валюты, которую хотите перевести:</b>'
 
-        name_chart = await create_chart_currency_capitals_from_country(
-            number_match=number_match,
-            from_name_country=data_country['name_country'],
-            data_currency_capitals=data_currency_capitals_from_country
-        )
+        try:
+            chart_key, photo_chart = await get_photo_chart_currency_capitals_from_country(
+                number_match=number_match,
+                from_name_country=data_country['name_country'],
+                data_currency_capitals=data_currency_capitals_from_country
+            )
+        except ChartRenderUnavailableError as error:
+            # Пул отрисовки занят - капитал уже перечислен в тексте, отвечаем без диаграммы
+            logger.warning(f'Диаграмма капитала не построена, ответ без диаграммы: {error}')
+            chart_key, photo_chart = None, None
 
-        chart_path = name_chart
-        photo_chart = FSInputFile(chart_path)
+        if photo_chart:
+            try:
+                message = await message.answer_photo(
+                    photo=photo_chart,
+                    caption=text,
+                    parse_mode='html'
+                )
+            except TelegramBadRequest:
+                # Telegram не принял сохраненный file_id - в следующий раз диаграмма нарисуется заново
+                chart_cache.invalidate(chart_key)
+                raise
 
-        message = await message.answer_photo(
-            photo=photo_chart,
-            caption=text,
-            parse_mode='html'
-        )
+            chart_cache.set_file_id(chart_key, message.photo[-1].file_id)
+        else:
+            message = await message.answer(
+                text=text,
+                parse_mode='html'
+            )
 
         await update_state(state, message_id_delete=message.message_id)
 
         await state.set_state(SG.FormBankTransferRequest.currency_id)
 
-        await DatabaseManager(database_path=number_match).delete_charts_from_match(
-            number_match=number_match
-        )
-
     except (ValueError, Exception) as error:
         await callback_utils.handle_exception(message, 'input_name_currency_for_bank_transfer', error, '❌ <b>Ошибка на этапе выбора бенефициара.</b>')
 
@@ -232,12 +247,13 @@ async def input_amount_currency_for_bank_transfer(message: Message, state: FSMCo
 
         form_choice_country = await state.get_data()
         number_match = form_choice_country['number_match']
+        payer_country_id = form_choice_country['payer_country_id']
         message_id_delete = form_choice_country['message_id_delete']
 
 
         data_currency_capitals_from_country = await DatabaseManager(
             database_path=number_match).get_data_currency_capitals_from_country(
-            user_id=message.from_user.id,
+            country_id=payer_country_id,
             number_match=number_match
         )
 
@@ -295,12 +311,13 @@ async def input_comment_for_bank_transfer(message: Message, state: FSMContext):
     try:
         data_bank_transfer_request = await state.get_data()
         number_match = data_bank_transfer_request['number_match']
+        payer_country_id = data_bank_transfer_request['payer_country_id']
         currency_id = data_bank_transfer_request['currency_id']
         message_id_delete = data_bank_transfer_request['message_id_delete']
 
         data_currency_capitals_from_country = await DatabaseManager(
             database_path=number_match).get_data_currency_capitals_from_country(
-            user_id=message.from_user.id,
+            country_id=payer_country_id,
             number_match=number_match
         )
 
@@ -479,65 +496,48 @@ async def confirm_form_bank_transfer(callback: CallbackQuery, state: FSMContext)
             send_message_id=message_id_delete
         )
 
-        await DatabaseManager(database_path=number_match).register_bank_transfer(
-            number_match=number_match,
-            payer_country_id=payer_country_id,
-            beneficiary_country_id=beneficiary_country_id,
-            currency_id=currency_id,
-            amount_currency_transfer=amount_currency_transfer,
-            comment=comment,
-            date_request_creation=date_request_creation,
-            status_cancelled=status_cancelled,
-            date_cancelled=date_cancelled
-        )
-
         await state.clear()
 
-        data_bank_transfer_request = await DatabaseManager(database_path=number_match).get_bank_transfer(
-            payer_country_id=payer_country_id,
-            date_request_creation=date_request_creation
-        )
-
-        logger.info(f'data_bank_transfer_request from get_bank_transfer: {data_bank_transfer_request}')
-
-        await DatabaseManager(database_path=number_match).execution_bank_transfer(
-            data_bank_transfer_request=data_bank_transfer_request
-        )
-
-        payer_country_name = await DatabaseManager(database_path=number_match).get_country_name(country_id=data_bank_transfer_request['payer_country_id'])
-        beneficiary_country_name = await DatabaseManager(database_path=number_match).get_country_name(country_id=data_bank_transfer_request['beneficiary_country_id'])
-        currency_name = await DatabaseManager(database_path=number_match).get_currency_name(currency_id=data_bank_transfer_request['currency_id'])
+        match_db = DatabaseManager(database_path=number_match)
 
         try:
-            status_payer = await DatabaseManager(database_path=number_match).update_amount_national_currency_for_issuer(
+            bank_transfer_id = await match_db.perform_bank_transfer(
                 number_match=number_match,
-                country_id=payer_country_id,
+                payer_country_id=payer_country_id,
+                beneficiary_country_id=beneficiary_country_id,
                 currency_id=currency_id,
-                currency_name=currency_name,
                 amount_currency_transfer=amount_currency_transfer,
-                payer=True
+                comment=comment,
+                date_request_creation=date_request_creation
             )
-
-            if not status_payer:
-                status_beneficiary = await DatabaseManager(database_path=number_match).update_amount_national_currency_for_issuer(
-                    number_match=number_match,
-                    country_id=beneficiary_country_id,
-                    currency_id=currency_id,
-                    currency_name=currency_name,
-                    amount_currency_transfer=amount_currency_transfer,
-                    beneficiary=True
-                )
-
-                if not status_beneficiary:
-                    logger.info('payer и beneficiary не являются эмитентами искомой валюты')
-                elif status_beneficiary is None:
-                    raise Exception('Данные beneficiary при подтверждении эмитента по банковскому переводу пусты!')
-            elif status_payer is None:
-                raise Exception('Данные payer при подтверждении эмитента по банковскому переводу пусты!')
+        except (InsufficientFundsError, ValueError) as error:
+            await callback_utils.send_message(callback=callback,
+                text=f'❌ <b>Банковский перевод не выполнен.</b>\n{error}'
+            )
+            return
         except Exception as error:
-            logger.error(f'Ошибка в confirm_form_bank_transfer: {error}')
+            await callback_utils.handle_exception(callback, 'confirm_form_bank_transfer', error, '❌ <b>Банковский перевод не выполнен.</b>')
+            return
+
+        data_bank_transfer_request = {
+            'id': bank_transfer_id,
+            'number_match': number_match,
+            'payer_country_id': payer_country_id,
+            'beneficiary_country_id': beneficiary_country_id,
+            'currency_id': currency_id,
+            'amount_currency_transfer': amount_currency_transfer,
+            'comment': comment,
+            'date_request_creation': date_request_creation,
+            'status_cancelled': status_cancelled,
+            'date_cancelled': date_cancelled
+        }
+
+        logger.info(f'data_bank_transfer_request from perform_bank_transfer: {data_bank_transfer_request}')
+
+        payer_country_name = await match_db.get_country_name(country_id=payer_country_id)
+        beneficiary_country_name = await match_db.get_country_name(country_id=beneficiary_country_id)
+        currency_name = await match_db.get_currency_name(currency_id=currency_id)
 
-        bank_transfer_id = data_bank_transfer_request['id']
         amount_currency_transfer = format_number_ultra(data_bank_transfer_request['amount_currency_transfer'])
         comment = data_bank_transfer_request['comment']
 
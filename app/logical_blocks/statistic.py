@@ -1,10 +1,11 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import logging
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile
+from aiogram.exceptions import TelegramBadRequest
 
 import ClassesStatesMachine.SG as SG
 from ClassesStatesMachine.SG import update_state
@@ -12,7 +13,14 @@ from app.DatabaseWork.database import DatabaseManager
 from app.keyboards.universal import launch_solution
 from app.message_designer.formatzer import format_number_ultra
 from app.message_designer.deletezer import delete_message
-from app.message_designer.chartzer import create_chart_currency_capitals_from_country
+from app.message_designer.chartzer import (
+    CHART_HISTORY_DAYS,
+    create_chart_currency_capitals_from_country,
+    get_photo_chart_course_history,
+    get_photo_chart_portfolio_value
+)
+from app.message_designer.chart_cache import chart_cache
+from app.MyException import ChartRenderUnavailableError
 from app.utils import callback_utils
 
 
@@ -26,7 +34,8 @@ logger = logging.getLogger(__name__)
 # Callback prefixes
 PREFIXES = {
     "COUNTRIES": "Countries",
-    "CURRENCIES": "Currencies"
+    "CURRENCIES": "Currencies",
+    "PORTFOLIO": "Portfolio"
 }
 
 
@@ -96,3 +105,133 @@ async def statistic_countries(callback: CallbackQuery):
         )
 
 
+
+
+async def send_chart_or_text(callback: CallbackQuery, chart_key: str | None, photo_chart: str | BufferedInputFile | None, text: str):
+    """
+    Отправляет диаграмму с подписью text и запоминает ее file_id в chart_cache, без диаграммы - только text.
+    """
+    if not photo_chart:
+        await callback_utils.send_message(callback, text=text)
+        return
+
+    try:
+        message = await callback.message.answer_photo(
+            photo=photo_chart,
+            caption=text,
+            parse_mode='html'
+        )
+    except TelegramBadRequest:
+        # Telegram не принял сохраненный file_id - в следующий раз диаграмма нарисуется заново
+        chart_cache.invalidate(chart_key)
+        raise
+
+    chart_cache.set_file_id(chart_key, message.photo[-1].file_id)
+
+
+@router.callback_query(lambda c: c.data and c.data.startswith(f'{PREFIXES["CURRENCIES"]}_'))
+async def statistic_currencies(callback: CallbackQuery):
+    """
+    Диаграмма истории курсов всех валют матча за последние CHART_HISTORY_DAYS дней.
+    """
+    try:
+        number_match = callback_utils.parse_callback_data(callback.data, PREFIXES["CURRENCIES"])[0]
+
+        database_manager = DatabaseManager(database_path=number_match)
+
+        history_rows = await database_manager.get_course_history(
+            start=datetime.now() - timedelta(days=CHART_HISTORY_DAYS)
+        )
+
+        if not history_rows:
+            await callback_utils.send_message(callback, text="<b>История курсов валют пока пуста.</b>")
+            return
+
+        currency_ticks = await database_manager.get_currency_ticks()
+
+        text = (
+            f"<b>№ матча:</b> {number_match}\n"
+            f"<b>Курсы валют за последние {CHART_HISTORY_DAYS} дн.</b> (в серебре за единицу валюты)"
+        )
+
+        try:
+            chart_key, photo_chart = await get_photo_chart_course_history(
+                number_match=number_match,
+                history_rows=history_rows,
+                currency_ticks=currency_ticks
+            )
+        except ChartRenderUnavailableError as error:
+            logger.warning(f'Диаграмма истории курсов не построена, ответ без диаграммы: {error}')
+            chart_key, photo_chart = None, None
+            text += "\n\n<i>Диаграмма сейчас недоступна, попробуйте позже.</i>"
+
+        await send_chart_or_text(callback, chart_key, photo_chart, text)
+    except Exception as error:
+        await callback_utils.handle_exception(
+            callback_or_message=callback,
+            section='statistic_currencies',
+            error=error
+        )
+
+
+@router.callback_query(lambda c: c.data and c.data.startswith(f'{PREFIXES["PORTFOLIO"]}_'))
+async def statistic_portfolio(callback: CallbackQuery):
+    """
+    Диаграмма стоимости капитала государства пользователя в серебре за последние CHART_HISTORY_DAYS дней.
+    """
+    try:
+        number_match = callback_utils.parse_callback_data(callback.data, PREFIXES["PORTFOLIO"])[0]
+
+        database_manager = DatabaseManager(database_path=number_match)
+
+        data_currency_capitals = await database_manager.get_data_currency_capitals_from_country(
+            user_id=callback.from_user.id,
+            number_match=number_match
+        )
+
+        if not data_currency_capitals:
+            await callback_utils.send_message(callback, text="<b>Капитал вашего государства пуст.</b>")
+            return
+
+        data_country = await database_manager.get_data_country(
+            user_id=callback.from_user.id,
+            number_match=number_match
+        )
+
+        if not data_country:
+            raise ValueError("Не удалось получить данные страны.")
+
+        history_rows = await database_manager.get_course_history(
+            currency_ids=[capital['currency_id'] for capital in data_currency_capitals],
+            start=datetime.now() - timedelta(days=CHART_HISTORY_DAYS)
+        )
+
+        if not history_rows:
+            await callback_utils.send_message(callback, text="<b>История курсов валют вашего капитала пока пуста.</b>")
+            return
+
+        text = (
+            f"<b>№ матча:</b> {number_match}\n"
+            f"<b>Ваше государство:</b> {data_country['name_country']}\n\n"
+            f"<b>Стоимость нынешнего капитала в серебре за последние {CHART_HISTORY_DAYS} дн.</b>"
+        )
+
+        try:
+            chart_key, photo_chart = await get_photo_chart_portfolio_value(
+                number_match=number_match,
+                from_name_country=data_country['name_country'],
+                history_rows=history_rows,
+                data_currency_capitals=data_currency_capitals
+            )
+        except ChartRenderUnavailableError as error:
+            logger.warning(f'Диаграмма стоимости капитала не построена, ответ без диаграммы: {error}')
+            chart_key, photo_chart = None, None
+            text += "\n\n<i>Диаграмма сейчас недоступна, попробуйте позже.</i>"
+
+        await send_chart_or_text(callback, chart_key, photo_chart, text)
+    except Exception as error:
+        await callback_utils.handle_exception(
+            callback_or_message=callback,
+            section='statistic_portfolio',
+            error=error
+        )
@@ -3,6 +3,8 @@ from aiogram.types import CallbackQuery
 
 # Импортируйте модули, которые используются внутри функций
 from app.DatabaseWork.database import DatabaseManager
+import app.verify.checks as checks
+import ClassesStatesMachine.Statuses as Status
 from app.message_designer.deletezer import delete_message
 from app.utils import callback_utils
 
@@ -51,6 +53,10 @@ async def result_of_admin_decision_for_request_choice_country(callback: Callback
 @router.callback_query(lambda c: c.data and c.data.startswith('ConfirmRequestCountryByAdmin_'))
 async def confirm_request_country_by_admin(callback: CallbackQuery):
 
+    if await checks.identify_user_admin(callback.from_user.id) != Status.TypeUser.ADMIN:
+        await callback.answer('Вы не являетесь администратором.', show_alert=True)
+        return
+
     data_parts = callback_utils.parse_callback_data(callback.data, 'ConfirmRequestCountryByAdmin')
     unique_word, number_match = data_parts[0], data_parts[1]
 
@@ -68,6 +74,10 @@ async def confirm_request_country_by_admin(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data and c.data.startswith('RejectRequestCountryByAdmin_'))
 async def reject_request_country_by_admin_(callback: CallbackQuery):
 
+    if await checks.identify_user_admin(callback.from_user.id) != Status.TypeUser.ADMIN:
+        await callback.answer('Вы не являетесь администратором.', show_alert=True)
+        return
+
     data_parts = callback_utils.parse_callback_data(callback.data, 'RejectRequestCountryByAdmin')
     unique_word, number_match = data_parts[0], data_parts[1]
 
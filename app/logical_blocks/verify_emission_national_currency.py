@@ -3,6 +3,8 @@ from aiogram.types import CallbackQuery
 
 # Импортируйте модули, которые используются внутри функций
 from app.DatabaseWork.database import DatabaseManager
+import app.verify.checks as checks
+import ClassesStatesMachine.Statuses as Status
 from app.message_designer.formatzer import format_number_ultra
 from app.message_designer.deletezer import delete_message
 from app.utils import callback_utils
@@ -79,6 +81,10 @@ async def confirm_request_form_emis_nat_currency_by_admin(callback: CallbackQuer
     :param callback:
     """
 
+    if await checks.identify_user_admin(callback.from_user.id) != Status.TypeUser.ADMIN:
+        await callback.answer('Вы не являетесь администратором.', show_alert=True)
+        return
+
     number_match = callback_utils.parse_callback_data(callback.data, 'ConfirmRequestFormEmisNatCur')[0]
     telegram_id_user = int(callback_utils.parse_callback_data(callback.data, 'ConfirmRequestFormEmisNatCur')[1])
 
@@ -107,6 +113,10 @@ async def confirm_request_form_emis_nat_currency_by_admin(callback: CallbackQuer
 @router.callback_query(lambda c: c.data and c.data.startswith('RejectRequestFormEmisNatCur_'))
 async def reject_request_form_emis_nat_currency_by_admin(callback: CallbackQuery):
 
+    if await checks.identify_user_admin(callback.from_user.id) != Status.TypeUser.ADMIN:
+        await callback.answer('Вы не являетесь администратором.', show_alert=True)
+        return
+
     number_match = callback_utils.parse_callback_data(callback.data, 'RejectRequestFormEmisNatCur')[0]
     telegram_id_user = int(callback_utils.parse_callback_data(callback.data, 'RejectRequestFormEmisNatCur')[1])
 
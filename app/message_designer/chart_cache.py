@@ -0,0 +1,137 @@
+import hashlib, json, logging, os
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+
+# Максимум диаграмм в кэше (переменная окружения CHART_CACHE_SIZE в .env), дальше вытесняются давно не показанные
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', '512'))
+
+
+class CachedChart:
+    """
+    Диаграмма в кэше: PNG до первой отправки, затем только file_id Telegram.
+
+    :param png: Отрисованная диаграмма (None, когда уже известен file_id).
+    :param file_id: file_id фото, которое вернул Telegram после первой отправки.
+    """
+
+    __slots__ = ('png', 'file_id')
+
+    def __init__(self, png: Optional[bytes] = None, file_id: Optional[str] = None):
+        self.png = png
+        self.file_id = file_id
+
+    def __repr__(self):
+        return f"CachedChart('png:{len(self.png) if self.png else 0}', 'file_id:{self.file_id}')"
+
+
+class ChartCache:
+    """
+    Кэш диаграмм по содержимому: ключ - вид диаграммы, матч, государство и хэш данных, из которых она рисуется.
+    \n\nПока данные (например, капитал государства) не изменились, ключ тот же и диаграмма не рисуется заново.
+    После первой отправки в кэше остается только file_id Telegram: повторный показ не рисует и не загружает фото.
+    Изменившиеся данные дают новый ключ, старые записи вытесняются по LRU, явная инвалидация не нужна.
+
+    :param max_size: Максимум записей в кэше.
+    """
+
+    def __init__(self, max_size: int = CHART_CACHE_SIZE):
+        self.max_size = max(max_size, 1)
+
+        self._charts: OrderedDict[str, CachedChart] = OrderedDict()
+
+        self.hits = 0
+        self.file_id_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return f"ChartCache('charts:{len(self._charts)}/{self.max_size}', 'hits:{self.hits}', 'misses:{self.misses}')"
+
+    @staticmethod
+    def make_key(kind: str, number_match: str, name_country: str, rows: List[Dict[str, Any]]) -> str:
+        """
+        Ключ диаграммы.
+
+        :param kind: Вид диаграммы (например, 'currency_capitals').
+        :param number_match: Номер матча.
+        :param name_country: Государство (входит в подпись диаграммы).
+        :param rows: Данные диаграммы, порядок строк важен (он задает порядок секторов).
+        """
+        digest = hashlib.sha256(json.dumps(rows, ensure_ascii=False, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+        return f'{kind}:{number_match}:{name_country}:{digest}'
+
+    @staticmethod
+    def make_array_key(kind: str, number_match: str, name_country: str, *arrays: Any) -> str:
+        """
+        Ключ диаграммы по массивам NumPy (например, столбцам истории курсов) без перевода их в JSON.
+
+        :param arrays: Массивы данных диаграммы, хэшируется их содержимое в памяти.
+        """
+        digest = hashlib.sha256()
+
+        for array in arrays:
+            digest.update(array.tobytes())
+
+        return f'{kind}:{number_match}:{name_country}:{digest.hexdigest()[:32]}'
+
+    def get(self, key: str) -> Optional[CachedChart]:
+        """Возвращает диаграмму из кэша и отмечает ее как недавно показанную."""
+        chart = self._charts.get(key)
+
+        if chart is None:
+            self.misses += 1
+            return None
+
+        self._charts.move_to_end(key)
+        self.hits += 1
+
+        if chart.file_id:
+            self.file_id_hits += 1
+
+        return chart
+
+    def put(self, key: str, png: bytes):
+        """Сохраняет отрисованную диаграмму, вытесняя самые давно показанные сверх max_size."""
+        self._charts[key] = CachedChart(png=png)
+        self._charts.move_to_end(key)
+
+        while len(self._charts) > self.max_size:
+            self._charts.popitem(last=False)
+            self.evictions += 1
+
+    def set_file_id(self, key: str, file_id: str):
+        """Запоминает file_id после отправки фото, PNG больше не нужен."""
+        chart = self._charts.get(key)
+
+        if chart is not None:
+            chart.file_id = file_id
+            chart.png = None
+
+    def invalidate(self, key: str):
+        """Удаляет диаграмму из кэша (например, Telegram отклонил сохраненный file_id)."""
+        self._charts.pop(key, None)
+
+    def clear(self):
+        self._charts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: попадания (из них по file_id), промахи, вытеснения, записей и PNG в памяти."""
+        total = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'file_id_hits': self.file_id_hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+            'charts': len(self._charts),
+            'png_bytes': sum(len(chart.png) for chart in self._charts.values() if chart.png),
+        }
+
+
+# Общий кэш диаграмм для всех обработчиков
+chart_cache = ChartCache()
@@ -0,0 +1,186 @@
+import os
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+# Ограничения объема данных диаграмм истории (переменные окружения в .env), от них зависит время отрисовки:
+# CHART_MAX_POINTS_PER_LINE - максимум точек одной линии курса, лишние точки прореживаются,
+# CHART_MAX_GRID_POINTS - максимум точек общей шкалы времени стоимости капитала.
+CHART_MAX_POINTS_PER_LINE = int(os.getenv('CHART_MAX_POINTS_PER_LINE', '400'))
+CHART_MAX_GRID_POINTS = int(os.getenv('CHART_MAX_GRID_POINTS', '500'))
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def get_history_columns(history_rows: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
+    """
+    Переводит строки истории курсов (DatabaseManager.get_course_history) в столбцы NumPy.
+    \n\nСтолбцы передаются в процесс пула отрисовки вместо списка словарей: pickle массивов в разы быстрее,
+    а дальше вся подготовка данных идет операциями над массивами.
+
+    :param history_rows: [{'timestamp', 'currency_id', 'course', ...}, ...]
+    :return: {'timestamp': int64, 'currency_id': int64, 'course': float64}
+    """
+    count = len(history_rows)
+
+    return {
+        'timestamp': np.fromiter(map(itemgetter('timestamp'), history_rows), dtype=np.int64, count=count),
+        'currency_id': np.fromiter(map(itemgetter('currency_id'), history_rows), dtype=np.int64, count=count),
+        'course': np.fromiter(map(itemgetter('course'), history_rows), dtype=np.float64, count=count),
+    }
+
+
+def timestamps_to_date_numbers(timestamps: np.ndarray) -> np.ndarray:
+    """Unix-время в числа дат matplotlib (дни от 1970-01-01, эпоха matplotlib по умолчанию)."""
+    return timestamps / SECONDS_PER_DAY
+
+
+def sort_by_currency(timestamps: np.ndarray, currency_ids: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Сортирует точки по (currency_id, timestamp) и возвращает столбцы в этом порядке."""
+    order = np.lexsort((timestamps, currency_ids))
+
+    return timestamps[order], currency_ids[order], values[order]
+
+
+def get_series_bounds(sorted_currency_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Границы рядов отдельных валют в отсортированном по currency_id столбце.
+
+    :return: (id валют, начало ряда, длина ряда)
+    """
+    if not sorted_currency_ids.size:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_currency_ids)) + 1))
+    lengths = np.diff(np.append(starts, sorted_currency_ids.size))
+
+    return sorted_currency_ids[starts], starts, lengths
+
+
+def thin_series(starts: np.ndarray, lengths: np.ndarray, max_points: int = CHART_MAX_POINTS_PER_LINE) -> np.ndarray:
+    """
+    Маска прореживания всех рядов сразу: в каждом ряду остается не больше max_points точек
+    с равным шагом, первая и последняя точки ряда сохраняются.
+
+    :param starts: Начала рядов (get_series_bounds).
+    :param lengths: Длины рядов (get_series_bounds).
+    :param max_points: Максимум точек одного ряда.
+    :return: булева маска длиной lengths.sum()
+    """
+    total = int(lengths.sum())
+    series_index = np.repeat(np.arange(lengths.size), lengths)
+    position = np.arange(total) - starts[series_index]
+
+    steps = np.maximum(np.ceil(lengths / max(max_points - 1, 1)), 1).astype(np.int64)
+
+    return (position % steps[series_index] == 0) | (position == lengths[series_index] - 1)
+
+
+def prepare_course_lines(
+        timestamps: np.ndarray,
+        currency_ids: np.ndarray,
+        courses: np.ndarray,
+        max_points: int = CHART_MAX_POINTS_PER_LINE
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Линии истории курсов всех валют для LineCollection.
+
+    :return: (id валют, [массив точек (N, 2) в координатах (дата matplotlib, курс) для каждой валюты])
+    """
+    timestamps, currency_ids, courses = sort_by_currency(timestamps, currency_ids, courses)
+    series_ids, starts, lengths = get_series_bounds(currency_ids)
+
+    if not series_ids.size:
+        return series_ids, []
+
+    keep = thin_series(starts, lengths, max_points)
+    points = np.column_stack((timestamps_to_date_numbers(timestamps[keep]), courses[keep]))
+
+    # Границы рядов после прореживания: сколько точек каждого ряда осталось
+    kept_lengths = np.add.reduceat(keep.astype(np.int64), starts)
+
+    return series_ids, np.split(points, np.cumsum(kept_lengths)[:-1])
+
+
+def get_time_grid(timestamps: np.ndarray, max_points: int = CHART_MAX_GRID_POINTS) -> np.ndarray:
+    """
+    Общая шкала времени для всех валют: все моменты записи курсов (курсы пишутся пачкой, поэтому их немного),
+    а если их больше max_points - равномерная сетка от первого до последнего момента.
+    """
+    grid = np.unique(timestamps)
+
+    if grid.size > max_points:
+        grid = np.linspace(grid[0], grid[-1], max_points).astype(np.int64)
+
+    return grid
+
+
+def resample_on_grid(
+        timestamps: np.ndarray,
+        currency_ids: np.ndarray,
+        values: np.ndarray,
+        series_ids: np.ndarray,
+        grid: np.ndarray
+) -> np.ndarray:
+    """
+    Значения всех валют на общей шкале времени одним поиском: на каждый момент шкалы берется
+    последнее известное значение валюты (ступенчато, как меняется курс), до первой точки валюты - NaN.
+
+    :param series_ids: Id валют - строки результата.
+    :param grid: Шкала времени - столбцы результата.
+    :return: матрица (len(series_ids), len(grid))
+    """
+    if not series_ids.size or not values.size:
+        return np.full((series_ids.size, grid.size), np.nan)
+
+    timestamps, currency_ids, values = sort_by_currency(timestamps, currency_ids, values)
+
+    series_index = np.searchsorted(series_ids, currency_ids)
+    known = series_ids[np.minimum(series_index, series_ids.size - 1)] == currency_ids
+    timestamps, series_index, values = timestamps[known], series_index[known], values[known]
+
+    if not values.size:
+        return np.full((series_ids.size, grid.size), np.nan)
+
+    # Составной ключ (номер валюты, номер момента шкалы) упорядочен так же, как точки.
+    # Точка относится к первому моменту шкалы не раньше нее (после последнего момента - номер grid.size)
+    grid_index = np.searchsorted(grid, timestamps, side='left')
+    point_keys = series_index * (grid.size + 1) + grid_index
+    query_keys = np.arange(series_ids.size)[:, None] * (grid.size + 1) + np.arange(grid.size)[None, :]
+
+    positions = np.searchsorted(point_keys, query_keys, side='right') - 1
+    valid = positions >= 0
+    positions = np.maximum(positions, 0)
+    valid &= series_index[positions] == np.arange(series_ids.size)[:, None]
+
+    return np.where(valid, values[positions], np.nan)
+
+
+def prepare_portfolio_value(
+        timestamps: np.ndarray,
+        currency_ids: np.ndarray,
+        courses: np.ndarray,
+        holding_currency_ids: np.ndarray,
+        holding_amounts: np.ndarray,
+        max_points: int = CHART_MAX_GRID_POINTS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Стоимость капитала государства в серебре на общей шкале времени: объем валюты, умноженный на ее курс
+    (курс выражен в серебре за единицу валюты). До появления валюты в истории ее стоимость равна 0.
+    \n\nОбъемы капитала берутся текущие - диаграмма показывает, как менялась стоимость нынешнего капитала
+    вместе с курсами валют.
+
+    :return: (шкала времени в датах matplotlib, id валют по возрастанию, матрица стоимости (валюта, момент) в серебре)
+    """
+    order = np.argsort(holding_currency_ids)
+    holding_currency_ids, holding_amounts = holding_currency_ids[order], holding_amounts[order]
+
+    grid = get_time_grid(timestamps, max_points)
+    course_matrix = resample_on_grid(timestamps, currency_ids, courses, holding_currency_ids, grid)
+
+    values = np.nan_to_num(course_matrix, nan=0.0) * holding_amounts[:, None]
+
+    return timestamps_to_date_numbers(grid), holding_currency_ids, values
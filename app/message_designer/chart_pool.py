@@ -0,0 +1,180 @@
+import asyncio, logging, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Any, Dict, Optional
+
+from app.MyException import ChartRenderUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+# Пул процессов отрисовки диаграмм (переменные окружения в .env):
+# CHART_RENDER_WORKERS - число процессов,
+# CHART_RENDER_QUEUE_SIZE - сколько диаграмм может одновременно рисоваться и ждать очереди, остальным сразу отказ,
+# CHART_RENDER_TIMEOUT - сколько обработчик ждет диаграмму, секунд.
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))
+CHART_RENDER_QUEUE_SIZE = int(os.getenv('CHART_RENDER_QUEUE_SIZE', str(CHART_RENDER_WORKERS * 4)))
+CHART_RENDER_TIMEOUT = float(os.getenv('CHART_RENDER_TIMEOUT', '10'))
+
+
+# Прогрев пула после запуска бота (CHART_RENDER_PREWARM=0 - процессы запускаются при первой диаграмме)
+CHART_RENDER_PREWARM = os.getenv('CHART_RENDER_PREWARM', '1') == '1'
+
+
+def initialize_render_worker():
+    """Инициализация процесса пула: matplotlib без графического интерфейса (бэкенд закрепляется до импорта matplotlib)."""
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+class ChartRenderPool:
+    """
+    Отрисовка диаграмм matplotlib в отдельных процессах, чтобы отрисовка не блокировала цикл событий бота.
+    \n\nОчередь ограничена queue_size: диаграммы сверх нее не ставятся в очередь, а сразу получают отказ.
+    Диаграмма, не готовая за timeout секунд, тоже получает отказ, но занимает место в очереди,
+    пока процесс ее действительно не дорисует. Отказ - ChartRenderUnavailableError, обработчик отвечает текстом.
+    \nПроцессы запускаются методом spawn при прогреве (prewarm) или при первой диаграмме.
+    Упавший пул пересоздается при следующей диаграмме.
+
+    :param workers: Число процессов.
+    :param queue_size: Максимум диаграмм, которые рисуются или ждут очереди.
+    :param timeout: Сколько ждать одну диаграмму, секунд.
+    """
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS, queue_size: int = CHART_RENDER_QUEUE_SIZE, timeout: float = CHART_RENDER_TIMEOUT):
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.timeout = timeout
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self.pending = 0
+        self.submitted = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return f"ChartRenderPool('workers:{self.workers}', 'pending:{self.pending}/{self.queue_size}')"
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.queue_size
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Возвращает пул процессов, создавая его при первом обращении."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=initialize_render_worker
+            )
+
+        return self._executor
+
+    def reset_executor(self):
+        """Отбрасывает упавший пул, следующая диаграмма создаст новый."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def release(self, future: asyncio.Future):
+        """Освобождает место в очереди, когда процесс закончил диаграмму (в том числе уже не нужную по таймауту)."""
+        self.pending -= 1
+
+        if not future.cancelled() and future.exception() is None:
+            self.rendered += 1
+
+    async def render(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Выполняет функцию отрисовки в процессе пула.
+
+        :param func: Функция уровня модуля (передается в процесс по имени), например render_chart_currency_capitals_from_country.
+        :param args: Аргументы функции (должны сериализоваться pickle).
+        :return: результат func
+        """
+        if self.saturated:
+            self.rejected += 1
+            raise ChartRenderUnavailableError(f'Очередь отрисовки диаграмм переполнена ({self.pending}/{self.queue_size}).')
+
+        try:
+            future = asyncio.wrap_future(self.get_executor().submit(func, *args))
+        except (BrokenProcessPool, RuntimeError) as error:
+            self.errors += 1
+            self.reset_executor()
+            raise ChartRenderUnavailableError(f'Пул отрисовки диаграмм недоступен: {error!r}') from error
+
+        self.pending += 1
+        self.submitted += 1
+        future.add_done_callback(self.release)
+
+        try:
+            # shield: по таймауту перестаем ждать, но место в очереди занято, пока процесс не закончит
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except TimeoutError as error:
+            self.timeouts += 1
+            raise ChartRenderUnavailableError(f'Диаграмма не построена за {self.timeout} с.') from error
+        except BrokenProcessPool as error:
+            self.errors += 1
+            self.reset_executor()
+            raise ChartRenderUnavailableError(f'Процесс отрисовки диаграмм упал: {error!r}') from error
+        except Exception as error:
+            self.errors += 1
+            logger.error(f'Ошибка при отрисовке диаграммы {getattr(func, "__name__", func)}: {error!r}')
+            raise ChartRenderUnavailableError(f'Ошибка при отрисовке диаграммы: {error!r}') from error
+
+    async def prewarm(self) -> list[float]:
+        """
+        Запускает все процессы пула и прогревает их (импорт matplotlib, шаблоны фигур, шрифты), чтобы первая диаграмма
+        пользователя не ждала запуска процесса. Вызывается в фоне после старта бота.
+        \n\nВремя прогрева процесса не включает его запуск (интерпретатор, повторный импорт __main__ и модулей chartzer),
+        поэтому в лог пишется и общее время прогрева пула.
+
+        :return: время прогрева каждого процесса, секунд
+        """
+        from app.message_designer.chartzer import warm_up_renderer
+
+        start = time.perf_counter()
+        executor = self.get_executor()
+        loop = asyncio.get_running_loop()
+
+        # Задачи отправляются одновременно, поэтому пул запускает сразу все процессы
+        warm_up_times = await asyncio.gather(
+            *(loop.run_in_executor(executor, warm_up_renderer) for _ in range(self.workers)),
+            return_exceptions=True
+        )
+
+        for warm_up_time in warm_up_times:
+            if isinstance(warm_up_time, BaseException):
+                logger.error(f'Ошибка при прогреве пула отрисовки диаграмм: {warm_up_time!r}')
+
+        warm_up_times = [round(warm_up_time, 3) for warm_up_time in warm_up_times if not isinstance(warm_up_time, BaseException)]
+        logger.info(
+            f'Пул отрисовки диаграмм прогрет за {time.perf_counter() - start:.3f} с (вместе с запуском процессов): '
+            f'процессов {len(warm_up_times)}, прогрев, с: {warm_up_times}'
+        )
+
+        return warm_up_times
+
+    def shutdown(self):
+        """Останавливает пул, не дожидаясь недорисованных диаграмм. Вызывается при выключении бота."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: отправлено, нарисовано, отказов по очереди, таймаутов, ошибок, в очереди."""
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'pending': self.pending,
+            'submitted': self.submitted,
+            'rendered': self.rendered,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+        }
+
+
+# Общий пул отрисовки диаграмм для всех обработчиков
+chart_render_pool = ChartRenderPool()
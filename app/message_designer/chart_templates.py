@@ -0,0 +1,193 @@
+import logging
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Бэкенд matplotlib без графического интерфейса: диаграммы только сохраняются в PNG
+MATPLOTLIB_BACKEND = 'Agg'
+
+_figure_classes = None
+
+
+def get_figure_classes():
+    """
+    Возвращает (Figure, FigureCanvasAgg), импортируя matplotlib при первой отрисовке с бэкендом MATPLOTLIB_BACKEND.
+    \n\nИмпорт matplotlib занимает почти секунду, поэтому он не выполняется при загрузке обработчиков бота,
+    а только в процессах пула отрисовки (chart_pool) - при первой диаграмме или при прогреве.
+    \nФигуры создаются без pyplot: они не попадают в реестр фигур pyplot и освобождаются вместе с шаблоном.
+    """
+    global _figure_classes
+
+    if _figure_classes is None:
+        import matplotlib
+
+        matplotlib.use(MATPLOTLIB_BACKEND, force=True)
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        _figure_classes = Figure, FigureCanvasAgg
+
+    return _figure_classes
+
+
+class ChartTemplate:
+    """
+    Заранее построенная фигура одного вида диаграмм: оси, оформление, расположение элементов
+    и постоянные элементы (водяной знак, подписи) создаются один раз.
+    \n\nПри каждой отрисовке добавляются и затем удаляются только элементы данных (data_artists),
+    а постоянные элементы из artists меняются на месте (set_text, set_data, set_segments).
+
+    :param kind: Вид диаграммы (CHART_KIND_*).
+    :param figsize: Размер фигуры, дюймов.
+    :param build: Функция оформления шаблона, получает ChartTemplate и заполняет artists.
+    """
+
+    def __init__(self, kind: str, figsize: Tuple[float, float], build: Callable[['ChartTemplate'], None]):
+        Figure, FigureCanvasAgg = get_figure_classes()
+
+        self.kind = kind
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+
+        self.artists: Dict[str, Any] = {}
+        self.data_artists: List[Any] = []
+        self.renders = 0
+
+        build(self)
+
+    def __repr__(self):
+        return f"ChartTemplate('{self.kind}', 'renders:{self.renders}', 'data_artists:{len(self.data_artists)}')"
+
+    def add_data(self, *artists: Any):
+        """Отмечает элементы данных текущей диаграммы, они удаляются после отрисовки."""
+        self.data_artists.extend(artists)
+
+    def clear_data(self):
+        """Удаляет элементы данных и легенду, оставляя оформление шаблона."""
+        for artist in self.data_artists:
+            artist.remove()
+
+        self.data_artists.clear()
+
+        legend = self.ax.get_legend()
+
+        if legend is not None:
+            legend.remove()
+
+    def to_png(self) -> bytes:
+        """
+        Сохраняет текущую диаграмму в PNG в памяти.
+        \n\nФон фигуры непрозрачный, поэтому PNG сохраняется без альфа-канала (RGB):
+        сжатие - основная часть времени отрисовки, а без альфа-канала оно быстрее и файл меньше.
+        """
+        from PIL import Image
+
+        self.figure.canvas.draw()
+        image = Image.frombuffer('RGBA', self.figure.canvas.get_width_height(), self.figure.canvas.buffer_rgba()).convert('RGB')
+
+        buffer = BytesIO()
+        image.save(buffer, format='png')
+        self.renders += 1
+
+        return buffer.getvalue()
+
+    def release(self):
+        """Освобождает фигуру шаблона."""
+        self.data_artists.clear()
+        self.artists.clear()
+        self.figure.clear()
+
+
+class ChartTemplates:
+    """
+    Шаблоны фигур по видам диаграмм в процессе пула отрисовки: на каждый вид одна фигура на весь процесс,
+    поэтому число фигур ограничено числом видов и не растет с числом отрисовок.
+    \n\nШаблон строится при первой диаграмме своего вида (или при прогреве). Если отрисовка упала,
+    шаблон освобождается и строится заново при следующей диаграмме - полуочищенная фигура не переиспользуется.
+
+    \n\nПример использования
+        chart_templates.register(CHART_KIND_CURRENCY_CAPITALS, (10, 10), build_currency_capitals_template)
+
+        with chart_templates.render(CHART_KIND_CURRENCY_CAPITALS) as template:
+            template.add_data(*template.ax.pie(amount)[0])
+            chart_png = template.to_png()
+    """
+
+    def __init__(self):
+        self._builders: Dict[str, Tuple[Tuple[float, float], Callable[[ChartTemplate], None]]] = {}
+        self._templates: Dict[str, ChartTemplate] = {}
+
+        self.builds = 0
+        self.failures = 0
+
+    def __repr__(self):
+        return f"ChartTemplates('kinds:{len(self._builders)}', 'built:{len(self._templates)}')"
+
+    def register(self, kind: str, figsize: Tuple[float, float], build: Callable[[ChartTemplate], None]):
+        """Регистрирует оформление вида диаграмм. Шаблон строится лениво."""
+        self._builders[kind] = (figsize, build)
+
+    def get(self, kind: str) -> ChartTemplate:
+        """Возвращает шаблон вида диаграмм, строя его при первом обращении."""
+        template = self._templates.get(kind)
+
+        if template is None:
+            figsize, build = self._builders[kind]
+            template = self._templates[kind] = ChartTemplate(kind, figsize, build)
+            self.builds += 1
+
+        return template
+
+    def discard(self, kind: str):
+        """Освобождает шаблон вида диаграмм, следующая диаграмма построит новый."""
+        template: Optional[ChartTemplate] = self._templates.pop(kind, None)
+
+        if template is not None:
+            template.release()
+
+    @contextmanager
+    def render(self, kind: str) -> Iterator[ChartTemplate]:
+        """
+        Отрисовка диаграммы в шаблоне: после блока with элементы данных всегда удаляются,
+        а при ошибке шаблон освобождается целиком.
+        """
+        template = self.get(kind)
+
+        try:
+            yield template
+        except Exception:
+            self.failures += 1
+            self.discard(kind)
+            raise
+        else:
+            template.clear_data()
+
+    def build_all(self) -> List[str]:
+        """Строит шаблоны всех зарегистрированных видов диаграмм (прогрев процесса пула)."""
+        for kind in self._builders:
+            self.get(kind)
+
+        return list(self._builders)
+
+    def release_all(self):
+        for kind in list(self._templates):
+            self.discard(kind)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики для мониторинга: видов, построено шаблонов (в том числе заново), отрисовок по видам, ошибок."""
+        return {
+            'kinds': len(self._builders),
+            'built': len(self._templates),
+            'builds': self.builds,
+            'failures': self.failures,
+            'renders': {kind: template.renders for kind, template in self._templates.items()},
+        }
+
+
+# Шаблоны фигур процесса отрисовки (у каждого процесса пула свои)
+chart_templates = ChartTemplates()
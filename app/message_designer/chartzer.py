@@ -1,41 +1,163 @@
-from matplotlib import pyplot as plt
+import os, time
+from io import BytesIO
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List
 
+import numpy as np
 
-async def create_chart_currency_capitals_from_country(number_match: str, from_name_country: str, data_currency_capitals: list) -> str:
+from app.message_designer.chart_pool import chart_render_pool
+from app.message_designer.chart_cache import chart_cache
+from app.message_designer.chart_data import SECONDS_PER_DAY, get_history_columns, prepare_course_lines, prepare_portfolio_value
+from app.message_designer.chart_templates import ChartTemplate, chart_templates
+
+# Процессы пула отрисовки импортируют этот модуль ради функций render_*, и импорт aiogram (несколько секунд)
+# удлинял бы запуск каждого процесса - BufferedInputFile импортируется только там, где создается фото
+if TYPE_CHECKING:
+    from aiogram.types import BufferedInputFile
+
+
+# Режим отладки (переменная окружения CHART_DEBUG_SAVE=1 в .env): копия каждой диаграммы сохраняется в CHART_DEBUG_DIRECTORY.
+# В обычном режиме диаграмма рисуется в память и отправляется в Telegram без записи на диск.
+CHART_DEBUG_SAVE = os.getenv('CHART_DEBUG_SAVE', '0') == '1'
+CHART_DEBUG_DIRECTORY = 'chart'
+
+# Виды диаграмм для ключей chart_cache
+CHART_KIND_CURRENCY_CAPITALS = 'currency_capitals'
+CHART_KIND_COURSE_HISTORY = 'course_history'
+CHART_KIND_PORTFOLIO_VALUE = 'portfolio_value'
+
+# За сколько последних дней показывается история курсов (переменная окружения CHART_HISTORY_DAYS в .env)
+CHART_HISTORY_DAYS = int(os.getenv('CHART_HISTORY_DAYS', '30'))
+
+# Сколько валют подписывается в легенде диаграмм истории (остальные рисуются без подписи или как «Прочие»)
+CHART_MAX_LEGEND_ITEMS = 10
+
+WATERMARK = (
+    'Telegram Bot:\n'
+    '@Supremacy1914_IMF_Bot'
+)
+
+
+
+def warm_up_renderer() -> float:
     """
-    Создание круглой диаграммы капитала валют конкретного государства
-    
+    Прогрев процесса пула отрисовки: импорт matplotlib, построение шаблонов всех видов диаграмм
+    и отрисовка пустого шаблона (загрузка шрифтов).
+
+    :return: время прогрева, секунд
+    """
+    start = time.perf_counter()
+
+    for kind in chart_templates.build_all():
+        chart_templates.get(kind).figure.savefig(BytesIO(), format='png')
+
+    return time.perf_counter() - start
+
+
+def get_chart_file_name(number_match: str, from_name_country: str) -> str:
+    """Название файла диаграммы капитала: для BufferedInputFile и для копии в режиме отладки."""
+    return f'{number_match}_{from_name_country.replace(" ", "_")}.png'
+
+
+def save_chart_png(template: ChartTemplate, file_name: str, debug_save: bool = False) -> bytes:
+    """
+    Сохраняет диаграмму шаблона в PNG в памяти (выполняется в процессе пула отрисовки).
+
+    :param template: Шаблон с нарисованной диаграммой.
+    :param file_name: Название файла копии в режиме отладки.
+    :param debug_save: сохранить копию диаграммы в CHART_DEBUG_DIRECTORY
+    :return: chart_png : bytes
+    """
+    chart_png = template.to_png()
+
+    if debug_save:
+        os.makedirs(CHART_DEBUG_DIRECTORY, exist_ok=True)
+
+        with open(f'{CHART_DEBUG_DIRECTORY}/{file_name}', 'wb') as file:
+            file.write(chart_png)
+
+    return chart_png
+
+
+async def get_cached_photo(chart_key: str, file_name: str, render: Callable[[], Awaitable[bytes]]) -> 'str | BufferedInputFile':
+    """
+    Фото диаграммы через кэш диаграмм по содержимому (chart_cache): file_id Telegram, PNG из кэша
+    или новая диаграмма, если ее еще нет в кэше.
+
+    :param chart_key: Ключ диаграммы в chart_cache.
+    :param file_name: Название файла для BufferedInputFile.
+    :param render: Корутина отрисовки диаграммы, вызывается только при промахе кэша.
+    :return: file_id или BufferedInputFile
+    """
+    cached_chart = chart_cache.get(chart_key)
+
+    if cached_chart is not None and cached_chart.file_id:
+        return cached_chart.file_id
+
+    from aiogram.types import BufferedInputFile
+
+    chart_png = cached_chart.png if cached_chart is not None else None
+
+    if chart_png is None:
+        chart_png = await render()
+        chart_cache.put(chart_key, chart_png)
+
+    return BufferedInputFile(chart_png, filename=file_name)
+
+
+async def get_photo_chart_currency_capitals_from_country(
+        number_match: str,
+        from_name_country: str,
+        data_currency_capitals: list
+) -> tuple[str, 'str | BufferedInputFile']:
+    """
+    Фото круглой диаграммы капитала для answer_photo через кэш диаграмм по содержимому (chart_cache).
+    \n\nПока капитал не изменился, диаграмма не рисуется заново, а после первой отправки возвращается file_id Telegram.
+    После отправки запомните file_id: chart_cache.set_file_id(chart_key, message.photo[-1].file_id).
+
     :param number_match: номер матча
     :param from_name_country: название государства для которого делается диаграмма
     :param data_currency_capitals: данные капитала данного государства
-    :return: name_chart : str
+    :return: (chart_key, photo) - photo это file_id или BufferedInputFile
     """
-    labels = []
-    amount = []
+    chart_rows = [
+        {'currency_tick': currency_capital['currency_tick'], 'amount': currency_capital['amount']}
+        for currency_capital in data_currency_capitals
+    ]
+    chart_key = chart_cache.make_key(CHART_KIND_CURRENCY_CAPITALS, number_match, from_name_country, chart_rows)
 
-    for currency_capital in data_currency_capitals:
-        labels.append(f'{currency_capital['currency_tick']}')
-        amount.append(f'{currency_capital['amount']}')
-
-    fig, ax = plt.subplots(figsize=(10, 10))
-    ax.pie(
-        amount,
-        labels=labels,
-        autopct='%1.1f%%',
-        wedgeprops=dict(width=0.3),
-        startangle=90
+    photo = await get_cached_photo(
+        chart_key,
+        get_chart_file_name(number_match, from_name_country),
+        lambda: create_chart_currency_capitals_from_country(number_match, from_name_country, data_currency_capitals)
     )
 
-    watermark = (
-        'Telegram Bot:\n'
-        '@Supremacy1914_IMF_Bot\n\n'
-        f'{from_name_country}\n'
-        f'№ матча: {number_match}'
+    return chart_key, photo
+
+
+async def create_chart_currency_capitals_from_country(number_match: str, from_name_country: str, data_currency_capitals: list) -> bytes:
+    """
+    Создание круглой диаграммы капитала валют конкретного государства в пуле процессов отрисовки, не блокируя цикл событий бота.
+    \n\nЕсли пул занят или не успел, выбрасывает ChartRenderUnavailableError - обработчик отвечает без диаграммы.
+
+    :param number_match: номер матча
+    :param from_name_country: название государства для которого делается диаграмма
+    :param data_currency_capitals: данные капитала данного государства
+    :return: chart_png : bytes - PNG для BufferedInputFile
+    """
+    return await chart_render_pool.render(
+        render_chart_currency_capitals_from_country,
+        number_match,
+        from_name_country,
+        data_currency_capitals,
+        CHART_DEBUG_SAVE
     )
 
-    plt.text(
+
+def build_currency_capitals_template(template: ChartTemplate):
+    """Шаблон круглой диаграммы капитала: водяной знак в центре кольца, поля фигуры фиксированы."""
+    template.artists['watermark'] = template.ax.text(
         0, 0,  # Координаты (x, y) относительно графика
-        watermark,  # Ваш текст
+        '',  # Текст ставится при отрисовке
         fontsize=16,  # Размер шрифта
         color='white',  # Цвет текста
         ha='center',  # Выравнивание по горизонтали (центрировано)
@@ -43,16 +165,51 @@ async def create_chart_currency_capitals_from_country(number_match: str, from_na
         bbox=dict(facecolor='black', alpha=0.8, edgecolor='white', boxstyle='round,pad=2')  # Оформление фона
     )
 
-    ax.axis('equal')
-    plt.tight_layout()
+    template.ax.axis('equal')
+    template.figure.subplots_adjust(left=0.02, right=0.98, bottom=0.02, top=0.98)
+
+
+def render_chart_currency_capitals_from_country(
+        number_match: str,
+        from_name_country: str,
+        data_currency_capitals: list,
+        debug_save: bool = False
+) -> bytes:
+    """
+    Отрисовка круглой диаграммы капитала валют конкретного государства (выполняется в процессе пула отрисовки)
+
+    :param number_match: номер матча
+    :param from_name_country: название государства для которого делается диаграмма
+    :param data_currency_capitals: данные капитала данного государства
+    :param debug_save: сохранить копию диаграммы в CHART_DEBUG_DIRECTORY
+    :return: chart_png : bytes
+    """
+    labels = []
+    amount = []
 
-    from_name_country = from_name_country.replace(" ", "_")
+    for currency_capital in data_currency_capitals:
+        labels.append(f'{currency_capital['currency_tick']}')
+        amount.append(float(currency_capital['amount']))
 
-    name_chart = f'chart/{number_match}_{from_name_country}.png'
+    with chart_templates.render(CHART_KIND_CURRENCY_CAPITALS) as template:
+        # Цвета задаются явно: цикл цветов осей шаблона не сбрасывается между диаграммами
+        wedges, texts, autotexts = template.ax.pie(
+            amount,
+            labels=labels,
+            colors=[f'C{index % 10}' for index in range(len(amount))],
+            autopct='%1.1f%%',
+            wedgeprops=dict(width=0.3),
+            startangle=90
+        )
+        template.add_data(*wedges, *texts, *autotexts)
 
-    plt.savefig(name_chart)
+        template.artists['watermark'].set_text(
+            f'{WATERMARK}\n\n'
+            f'{from_name_country}\n'
+            f'№ матча: {number_match}'
+        )
 
-    return name_chart
+        return save_chart_png(template, get_chart_file_name(number_match, from_name_country), debug_save)
 
 
     # cmap = plt.cm.get_cmap()  # Можно заменить на Set3, Paired и т.д.
@@ -64,4 +221,328 @@ async def create_chart_currency_capitals_from_country(number_match: str, from_na
     # ax.axis('equal')
     #
     # # Сохранение диаграммы
-    # plt.savefig('chart.png')
\ No newline at end of file
+    # plt.savefig('chart.png')
+
+def get_history_file_name(number_match: str, kind: str, from_name_country: str = '') -> str:
+    """Название файла диаграммы истории: для BufferedInputFile и для копии в режиме отладки."""
+    return get_chart_file_name(number_match, f'{from_name_country} {kind}'.strip())
+
+
+async def get_photo_chart_course_history(
+        number_match: str,
+        history_rows: List[dict],
+        currency_ticks: Dict[int, str]
+) -> tuple[str, 'str | BufferedInputFile']:
+    """
+    Фото диаграммы истории курсов всех валют матча для answer_photo через кэш диаграмм (chart_cache).
+    \n\nСтроки истории один раз переводятся в столбцы NumPy: по ним считается ключ кэша, и они же передаются
+    в процесс пула отрисовки, где идет вся остальная подготовка данных.
+    После отправки запомните file_id: chart_cache.set_file_id(chart_key, message.photo[-1].file_id).
+
+    :param number_match: номер матча
+    :param history_rows: история курсов (DatabaseManager.get_course_history)
+    :param currency_ticks: Tick валют по id (DatabaseManager.get_currency_ticks)
+    :return: (chart_key, photo) - photo это file_id или BufferedInputFile
+    """
+    history_columns = get_history_columns(history_rows)
+
+    chart_key = chart_cache.make_array_key(
+        CHART_KIND_COURSE_HISTORY,
+        number_match,
+        '',
+        history_columns['timestamp'],
+        history_columns['currency_id'],
+        history_columns['course']
+    )
+
+    photo = await get_cached_photo(
+        chart_key,
+        get_history_file_name(number_match, CHART_KIND_COURSE_HISTORY),
+        lambda: chart_render_pool.render(
+            render_chart_course_history,
+            number_match,
+            history_columns,
+            currency_ticks,
+            CHART_DEBUG_SAVE
+        )
+    )
+
+    return chart_key, photo
+
+
+async def get_photo_chart_portfolio_value(
+        number_match: str,
+        from_name_country: str,
+        history_rows: List[dict],
+        data_currency_capitals: list
+) -> tuple[str, 'str | BufferedInputFile']:
+    """
+    Фото диаграммы стоимости капитала государства в серебре по времени для answer_photo через кэш диаграмм (chart_cache).
+    После отправки запомните file_id: chart_cache.set_file_id(chart_key, message.photo[-1].file_id).
+
+    :param number_match: номер матча
+    :param from_name_country: название государства для которого делается диаграмма
+    :param history_rows: история курсов валют капитала (DatabaseManager.get_course_history)
+    :param data_currency_capitals: данные капитала данного государства (DatabaseManager.get_data_currency_capitals_from_country)
+    :return: (chart_key, photo) - photo это file_id или BufferedInputFile
+    """
+    history_columns = get_history_columns(history_rows)
+
+    count = len(data_currency_capitals)
+    holding_currency_ids = np.fromiter((capital['currency_id'] for capital in data_currency_capitals), dtype=np.int64, count=count)
+    holding_amounts = np.fromiter((capital['amount'] for capital in data_currency_capitals), dtype=np.float64, count=count)
+    currency_ticks = {capital['currency_id']: capital['currency_tick'] for capital in data_currency_capitals}
+
+    chart_key = chart_cache.make_array_key(
+        CHART_KIND_PORTFOLIO_VALUE,
+        number_match,
+        from_name_country,
+        history_columns['timestamp'],
+        history_columns['currency_id'],
+        history_columns['course'],
+        holding_currency_ids,
+        holding_amounts
+    )
+
+    photo = await get_cached_photo(
+        chart_key,
+        get_history_file_name(number_match, CHART_KIND_PORTFOLIO_VALUE, from_name_country),
+        lambda: chart_render_pool.render(
+            render_chart_portfolio_value,
+            number_match,
+            from_name_country,
+            history_columns,
+            holding_currency_ids,
+            holding_amounts,
+            currency_ticks,
+            CHART_DEBUG_SAVE
+        )
+    )
+
+    return chart_key, photo
+
+
+def build_history_template(template: ChartTemplate, title_y_label: str):
+    """
+    Общее оформление шаблонов диаграмм истории: ось дат, сетка, фиксированные поля фигуры,
+    водяной знак в правом нижнем углу и надпись для пустой истории.
+    """
+    from matplotlib import dates as mdates
+
+    ax = template.ax
+
+    ax.xaxis_date()
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m %H:%M'))
+    ax.tick_params(axis='x', labelrotation=30)
+    ax.grid(alpha=0.3)
+    ax.set_ylabel(title_y_label)
+
+    template.artists['watermark'] = ax.text(
+        0.99, 0.02,
+        '',
+        transform=ax.transAxes,
+        fontsize=9,
+        color='white',
+        ha='right',
+        va='bottom',
+        zorder=5,
+        bbox=dict(facecolor='black', alpha=0.6, edgecolor='white', boxstyle='round,pad=0.5')
+    )
+    template.artists['empty'] = ax.text(
+        0.5, 0.5,
+        'История курсов пока пуста',
+        transform=ax.transAxes,
+        ha='center',
+        va='center',
+        fontsize=16,
+        visible=False
+    )
+
+    template.figure.subplots_adjust(left=0.08, right=0.98, bottom=0.12, top=0.95)
+
+
+def build_course_history_template(template: ChartTemplate):
+    """Шаблон истории курсов: одна LineCollection на все валюты, линии меняются через set_segments."""
+    from matplotlib.collections import LineCollection
+
+    build_history_template(template, 'Курс, серебро за единицу валюты')
+
+    template.artists['lines'] = template.ax.add_collection(LineCollection([], linewidths=1.2))
+
+
+def build_portfolio_value_template(template: ChartTemplate):
+    """Шаблон стоимости капитала: линия общей стоимости меняется через set_data, области валют - элементы данных."""
+    build_history_template(template, 'Стоимость, серебро')
+
+    template.artists['total'], = template.ax.plot(
+        [], [],
+        color='black',
+        linewidth=1.5,
+        drawstyle='steps-post',
+        label='Всего',
+        zorder=3
+    )
+
+
+def set_history_limits(ax, x: np.ndarray, y: np.ndarray, log: bool = False):
+    """Границы осей по данным диаграммы (вместо relim/autoscale по всем элементам осей)."""
+    x_min, x_max = x.min(), x.max()
+    y_min, y_max = y.min(), y.max()
+
+    if x_min == x_max:
+        x_min, x_max = x_min - 0.5, x_max + 0.5
+
+    if log:
+        ax.set_yscale('log')
+        ax.set_ylim(y_min / 1.2, y_max * 1.2)
+    else:
+        ax.set_yscale('linear')
+        margin = (y_max - y_min) * 0.05 or abs(y_max) * 0.05 or 1.0
+        ax.set_ylim(0.0 if y_min >= 0 else y_min - margin, y_max + margin)
+
+    ax.set_xlim(x_min, x_max)
+
+
+def set_empty_history_limits(ax):
+    """Границы осей пустой истории: последние CHART_HISTORY_DAYS дней (границы прошлой диаграммы шаблона сбрасываются)."""
+    now = time.time() / SECONDS_PER_DAY
+
+    ax.set_yscale('linear')
+    ax.set_xlim(now - CHART_HISTORY_DAYS, now)
+    ax.set_ylim(0.0, 1.0)
+
+
+def render_chart_course_history(
+        number_match: str,
+        history_columns: Dict[str, np.ndarray],
+        currency_ticks: Dict[int, str],
+        debug_save: bool = False
+) -> bytes:
+    """
+    Отрисовка истории курсов всех валют матча (выполняется в процессе пула отрисовки).
+    \n\nВсе линии - одна LineCollection шаблона, каждая прорежена до CHART_MAX_POINTS_PER_LINE точек,
+    поэтому время отрисовки почти не зависит от длины истории и растет с числом валют линейно и медленно.
+    В легенде - CHART_MAX_LEGEND_ITEMS валют с самым высоким текущим курсом.
+
+    :param number_match: номер матча
+    :param history_columns: столбцы истории курсов (chart_data.get_history_columns)
+    :param currency_ticks: Tick валют по id
+    :param debug_save: сохранить копию диаграммы в CHART_DEBUG_DIRECTORY
+    :return: chart_png : bytes
+    """
+    from matplotlib import colormaps
+    from matplotlib.lines import Line2D
+
+    series_ids, lines = prepare_course_lines(
+        history_columns['timestamp'],
+        history_columns['currency_id'],
+        history_columns['course']
+    )
+
+    with chart_templates.render(CHART_KIND_COURSE_HISTORY) as template:
+        ax = template.ax
+        line_collection = template.artists['lines']
+
+        line_collection.set_segments(lines)
+        template.artists['empty'].set_visible(not lines)
+
+        if lines:
+            colors = colormaps['turbo'](np.linspace(0.05, 0.95, series_ids.size))
+            line_collection.set_color(colors)
+
+            points = np.concatenate(lines)
+            set_history_limits(ax, points[:, 0], points[:, 1], log=bool((points[:, 1] > 0).all()))
+
+            last_courses = np.fromiter((line[-1, 1] for line in lines), dtype=np.float64, count=len(lines))
+            legend_indexes = np.argsort(last_courses)[::-1][:CHART_MAX_LEGEND_ITEMS]
+
+            handles = [
+                Line2D([], [], color=colors[index], label=currency_ticks.get(int(series_ids[index]), str(series_ids[index])))
+                for index in legend_indexes
+            ]
+
+            if series_ids.size > legend_indexes.size:
+                handles.append(Line2D([], [], color='none', label=f'и еще валют: {series_ids.size - legend_indexes.size}'))
+
+            ax.legend(handles=handles, loc='upper left', fontsize=9)
+        else:
+            set_empty_history_limits(ax)
+
+        ax.set_title(f'Курсы валют, № матча: {number_match}')
+        template.artists['watermark'].set_text(f'{WATERMARK}\n№ матча: {number_match}')
+
+        return save_chart_png(template, get_history_file_name(number_match, CHART_KIND_COURSE_HISTORY), debug_save)
+
+
+def render_chart_portfolio_value(
+        number_match: str,
+        from_name_country: str,
+        history_columns: Dict[str, np.ndarray],
+        holding_currency_ids: np.ndarray,
+        holding_amounts: np.ndarray,
+        currency_ticks: Dict[int, str],
+        debug_save: bool = False
+) -> bytes:
+    """
+    Отрисовка стоимости капитала государства в серебре по времени (выполняется в процессе пула отрисовки):
+    области по валютам капитала (CHART_MAX_LEGEND_ITEMS самых дорогих, остальные - «Прочие») и линия общей стоимости.
+
+    :param number_match: номер матча
+    :param from_name_country: название государства для которого делается диаграмма
+    :param history_columns: столбцы истории курсов (chart_data.get_history_columns)
+    :param holding_currency_ids: id валют капитала
+    :param holding_amounts: объемы валют капитала
+    :param currency_ticks: Tick валют по id
+    :param debug_save: сохранить копию диаграммы в CHART_DEBUG_DIRECTORY
+    :return: chart_png : bytes
+    """
+    from matplotlib import colormaps
+
+    dates, series_ids, values = prepare_portfolio_value(
+        history_columns['timestamp'],
+        history_columns['currency_id'],
+        history_columns['course'],
+        holding_currency_ids,
+        holding_amounts
+    )
+
+    with chart_templates.render(CHART_KIND_PORTFOLIO_VALUE) as template:
+        ax = template.ax
+        total_line = template.artists['total']
+
+        template.artists['empty'].set_visible(not dates.size)
+
+        if dates.size:
+            order = np.argsort(values[:, -1])[::-1]
+            shown, rest = order[:CHART_MAX_LEGEND_ITEMS], order[CHART_MAX_LEGEND_ITEMS:]
+
+            stacked = values[shown]
+            labels = [currency_ticks.get(int(series_ids[index]), str(series_ids[index])) for index in shown]
+            colors = list(colormaps['tab20'].colors[:shown.size])
+
+            if rest.size:
+                stacked = np.vstack((stacked, values[rest].sum(axis=0)))
+                labels.append('Прочие')
+                colors.append('lightgray')
+
+            totals = values.sum(axis=0)
+
+            template.add_data(*ax.stackplot(dates, stacked, labels=labels, colors=colors, step='post', alpha=0.8))
+            total_line.set_data(dates, totals)
+
+            set_history_limits(ax, dates, totals)
+            ax.legend(loc='upper left', fontsize=9)
+        else:
+            total_line.set_data([], [])
+            set_empty_history_limits(ax)
+
+        ax.set_title(f'Стоимость капитала: {from_name_country}')
+        template.artists['watermark'].set_text(f'{WATERMARK}\n{from_name_country}, № матча: {number_match}')
+
+        return save_chart_png(template, get_history_file_name(number_match, CHART_KIND_PORTFOLIO_VALUE, from_name_country), debug_save)
+
+
+# Шаблоны фигур по видам диаграмм (строятся в процессе пула отрисовки при первой диаграмме или прогреве)
+chart_templates.register(CHART_KIND_CURRENCY_CAPITALS, (10, 10), build_currency_capitals_template)
+chart_templates.register(CHART_KIND_COURSE_HISTORY, (12, 8), build_course_history_template)
+chart_templates.register(CHART_KIND_PORTFOLIO_VALUE, (12, 8), build_portfolio_value_template)
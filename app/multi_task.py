@@ -1,63 +1,273 @@
 import asyncio
 import logging
-from typing import Callable, Any, Awaitable, Iterable
+import time
+from typing import Callable, Any, Awaitable, Iterable, AsyncIterator, Dict, List, Optional
+
+from app.adaptive_limiter import AdaptiveConcurrencyLimiter
 
 logger = logging.getLogger(__name__)
 
-# TODO есть альтернатива asyncio_gather это multiprocessing. Нужно изучить более подробно.
 
-async def asyncio_gather(
-        tasks: Iterable[Callable[[], Awaitable[Any]]],
-        max_concurrent: int = 0
-) -> list[Any]:
+# Сколько ошибок из отчета выводится в лог (остальные только считаются)
+MAX_LOGGED_ERRORS = 10
+
+
+class TaskOutcome:
+    """
+    Результат одной задачи TaskRunner.
+
+    :param index: Порядковый номер задачи в исходном итераторе.
+    :param result: Результат корутины (None при ошибке).
+    :param error: Исключение задачи, TimeoutError - задача прервана по таймауту, None - задача выполнена.
+    :param duration: Время выполнения, секунд.
+    """
+
+    __slots__ = ('index', 'result', 'error', 'duration')
+
+    def __init__(self, index: int, result: Any = None, error: Optional[BaseException] = None, duration: float = 0.0):
+        self.index = index
+        self.result = result
+        self.error = error
+        self.duration = duration
+
+    def __repr__(self):
+        state = f"'error:{self.error!r}'" if self.error is not None else f"'result:{self.result!r}'"
+        return f"TaskOutcome('index:{self.index}', {state}, 'duration:{self.duration}')"
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def timed_out(self) -> bool:
+        return isinstance(self.error, TimeoutError)
+
+
+class TaskRunner:
     """
-    Универсальная функция для параллельного выполнения асинхронных задач.
-    \nКогда стоит использовать asyncio.gather?
-        \n1. Если ваши задачи зависят от ввода-вывода (например, чтение из базы данных, сетевые запросы).
-        \n2. Если время обработки каждой задачи значительно варьируется.
-        \n3. Если вы хотите ускорить обработку большого количества задач без увеличения нагрузки на систему.
-    \n\nКогда не стоит использовать asyncio.gather?
-        \n1. Если задачи требуют интенсивных вычислений (например, сложные математические расчёты). В таких случаях асинхронность не поможет, и лучше использовать multiprocessing.
-        \n2. Если вы обрабатываете всего одну или две задачи, где параллелизм не даёт значительных преимуществ.
+    Параллельное выполнение асинхронных задач с изоляцией ошибок.
+    \n\nЗадачи - функции без аргументов, возвращающие корутину. Они берутся из итератора по одной, только когда
+    освобождается место (не больше max_concurrent одновременно), поэтому итератор может быть генератором
+    на тысячи матчей - корутины не создаются заранее.
+    \nОшибка или таймаут задачи не прерывает остальные задачи: она попадает в TaskOutcome и в отчет report().
+    \nКак в asyncio.TaskGroup, задачи не переживают запуск: если потребитель прекратил чтение as_completed
+    или сам был отменен, выполняющиеся задачи отменяются и дожидаются завершения.
+    \nС limiter число одновременных задач определяет AdaptiveConcurrencyLimiter по задержкам и ошибкам задач,
+    а max_concurrent не используется.
 
     \n\nПример использования
-        for number_match in all_match_numbers:
-            await asyncio_gather(
-                tasks=[lambda match=number_match: update_course_for_alone_match(match)],
-                max_concurrent=2
-            )
-
-    \n\nОбъяснение
-    Что происходит:
-        1. update_course_for_alone_match(number_match=number_match) сразу вызывается (поскольку это корутина).
-        2. Результат выполнения этой корутины (а это Awaitable объект) передаётся в tasks.
-        3. Внутри asyncio_gather предполагается, что tasks — это итерабельный объект функций, возвращающих корутины. Однако вместо этого туда попадает один Awaitable объект, что приводит к ошибке.
-
-    \n\nЕще лучше использовать так:
-        tasks = [
-            lambda match=number_match: update_course_for_alone_match(match)
-            for number_match in all_match_numbers]
-
-        await asyncio_gather(tasks=tasks, max_concurrent=2)
-
-    :param tasks: Итерабельный список функций (которые возвращают корутины).
+        runner = TaskRunner(max_concurrent=4, timeout=60, name='update_course')
+
+        async for outcome in runner.as_completed(
+                lambda match=number_match: update_course_for_alone_match(match)
+                for number_match in all_match_numbers):
+            ...
+
+        runner.log_report()
+
     :param max_concurrent: Максимальное количество одновременных задач (0 = без ограничений).
-    :return: Список результатов выполнения задач.
+    :param timeout: Максимальное время выполнения одной задачи, секунд (None - без ограничения).
+    :param name: Название запуска для имен задач asyncio и отчета.
+    :param limiter: Адаптивный лимит одновременных задач (может быть общим для нескольких запусков).
+    """
+
+    def __init__(
+            self,
+            max_concurrent: int = 4,
+            timeout: Optional[float] = None,
+            name: str = 'tasks',
+            limiter: Optional[AdaptiveConcurrencyLimiter] = None
+    ):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.name = name
+        self.limiter = limiter
+
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.errors: List[TaskOutcome] = []
+        self.duration = 0.0
+
+    def __repr__(self):
+        return f"TaskRunner('{self.name}', 'max_concurrent:{self.max_concurrent}', 'total:{self.total}', 'failed:{self.failed}')"
+
+    def has_capacity(self, in_flight: int) -> bool:
+        """Можно ли запустить еще одну задачу при in_flight выполняющихся."""
+        if self.limiter is not None:
+            # Хотя бы одна задача выполняется всегда, даже если общий лимит заняли другие запуски
+            return not in_flight or self.limiter.has_capacity()
+
+        return not self.max_concurrent or in_flight < self.max_concurrent
+
+    async def run_one(self, index: int, task: Callable[[], Awaitable[Any]]) -> TaskOutcome:
+        """Выполняет одну задачу с таймаутом и превращает ее исключение в TaskOutcome."""
+        start = time.perf_counter()
+
+        try:
+            async with asyncio.timeout(self.timeout):
+                result = await task()
+
+            outcome = TaskOutcome(index, result=result)
+        except Exception as error:
+            outcome = TaskOutcome(index, error=error)
+
+        duration = time.perf_counter() - start
+        outcome.duration = round(duration, 3)
+
+        if self.limiter is not None:
+            self.limiter.on_finish(duration, outcome.ok)
+
+        return outcome
+
+    def release_cancelled(self, task: asyncio.Task):
+        """Освобождает место в limiter за отмененную задачу (завершенные задачи освобождают его сами в run_one)."""
+        if self.limiter is not None and task.cancelled():
+            self.limiter.on_cancel()
+
+    def account(self, outcome: TaskOutcome):
+        """Учитывает результат задачи в отчете."""
+        self.total += 1
+
+        if outcome.ok:
+            self.succeeded += 1
+            return
+
+        self.failed += 1
+        self.errors.append(outcome)
+
+        if outcome.timed_out:
+            self.timed_out += 1
+
+    async def as_completed(self, tasks: Iterable[Callable[[], Awaitable[Any]]]) -> AsyncIterator[TaskOutcome]:
+        """
+        Выполняет задачи и отдает их результаты по мере завершения (асинхронный генератор).
+
+        :param tasks: Итерабельный объект функций, возвращающих корутины. Читается лениво.
+        """
+        iterator = iter(tasks)
+        in_flight: Dict[asyncio.Task, int] = {}
+        next_index = 0
+        exhausted = False
+        start = time.perf_counter()
+
+        try:
+            while True:
+                while not exhausted and self.has_capacity(len(in_flight)):
+                    try:
+                        task = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    if self.limiter is not None:
+                        self.limiter.on_start()
+
+                    in_flight[asyncio.create_task(self.run_one(next_index, task), name=f'{self.name}:{next_index}')] = next_index
+                    next_index += 1
+
+                if not in_flight:
+                    break
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+                for finished_task in done:
+                    index = in_flight.pop(finished_task)
+
+                    if finished_task.cancelled():
+                        # Задачу отменил кто-то извне, остальные продолжают работу
+                        outcome = TaskOutcome(index, error=asyncio.CancelledError())
+                        self.release_cancelled(finished_task)
+                    else:
+                        outcome = finished_task.result()
+
+                    self.account(outcome)
+
+                    yield outcome
+        finally:
+            for running_task in in_flight:
+                running_task.cancel()
+
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+            for running_task in in_flight:
+                self.release_cancelled(running_task)
+
+            self.duration = round(self.duration + time.perf_counter() - start, 3)
+
+    async def run(self, tasks: Iterable[Callable[[], Awaitable[Any]]]) -> List[TaskOutcome]:
+        """
+        Выполняет все задачи и возвращает результаты в порядке задач в tasks.
+
+        :param tasks: Итерабельный объект функций, возвращающих корутины. Читается лениво.
+        """
+        outcomes = [outcome async for outcome in self.as_completed(tasks)]
+
+        return sorted(outcomes, key=lambda outcome: outcome.index)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Сводный отчет: всего задач, успешных, с ошибкой, по таймауту, ошибки [{'index', 'error'}], время, секунд,
+        и метрики limiter, если он задан.
+        """
+        return {
+            'name': self.name,
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'errors': [{'index': outcome.index, 'error': repr(outcome.error)} for outcome in self.errors],
+            'duration': self.duration,
+            'limiter': self.limiter.stats() if self.limiter is not None else None,
+        }
+
+    def log_report(self):
+        """Пишет сводный отчет в лог: итог одной строкой и первые MAX_LOGGED_ERRORS ошибок."""
+        limiter_info = f' Лимит одновременных задач: {self.limiter.current_limit}.' if self.limiter is not None else ''
+
+        logger.info(
+            f'Задачи {self.name}: выполнено {self.succeeded}/{self.total}, ошибок {self.failed}, '
+            f'из них по таймауту {self.timed_out}, за {self.duration} с.{limiter_info}'
+        )
+
+        for outcome in self.errors[:MAX_LOGGED_ERRORS]:
+            logger.error(f'Задача {self.name} #{outcome.index} завершилась ошибкой: {outcome.error!r}')
+
+        if len(self.errors) > MAX_LOGGED_ERRORS:
+            logger.error(f'Задачи {self.name}: еще ошибок {len(self.errors) - MAX_LOGGED_ERRORS}, не выведены.')
+
+
+async def run_tasks(
+        tasks: Iterable[Callable[[], Awaitable[Any]]],
+        max_concurrent: int = 4,
+        timeout: Optional[float] = None,
+        name: str = 'tasks',
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None
+) -> List[TaskOutcome]:
     """
-    try:
-        if max_concurrent > 0:
-            semaphore = asyncio.Semaphore(max_concurrent)
+    Выполняет задачи через TaskRunner, пишет сводный отчет в лог и возвращает результаты в порядке задач.
 
-            async def limited_task(task: Callable[[], Awaitable[Any]]) -> Any:
-                async with semaphore:
-                    return await task()
+    \n\nПример использования
+        outcomes = await run_tasks(
+            tasks=(lambda match=number_match: update_course_for_alone_match(match) for number_match in all_match_numbers),
+            max_concurrent=4,
+            timeout=60,
+            name='update_course'
+        )
 
-            return await asyncio.gather(*(limited_task(task) for task in tasks))
-        else:
-            return await asyncio.gather(*(task() for task in tasks))
-    except Exception as error:
-        logger.error(f"Ошибка при выполнении задач: {error}")
-        raise
+        results = [outcome.result for outcome in outcomes if outcome.ok]
 
+    :param tasks: Итерабельный объект функций, возвращающих корутины. Читается лениво.
+    :param max_concurrent: Максимальное количество одновременных задач (0 = без ограничений).
+    :param timeout: Максимальное время выполнения одной задачи, секунд (None - без ограничения).
+    :param name: Название запуска для отчета в логе.
+    :param limiter: Адаптивный лимит одновременных задач вместо max_concurrent.
+    """
+    runner = TaskRunner(max_concurrent=max_concurrent, timeout=timeout, name=name, limiter=limiter)
 
+    outcomes = await runner.run(tasks)
+    runner.log_report()
 
+    return outcomes
@@ -1,14 +1,62 @@
-import asyncio, logging
+import logging
+from itertools import chain
+from typing import Dict
+
 import aiofiles
-import schedule
 
-from app.multi_task import asyncio_gather
-from app.DatabaseWork.database import DatabaseManager
+from app.async_scheduler import AsyncScheduler
+from app.course_sweep import sweep_courses_in_process_pool, COURSE_SWEEP_WORKERS
+from app.multi_task import run_tasks
+from app.adaptive_limiter import AdaptiveConcurrencyLimiter
+from app.DatabaseWork.database import DatabaseManager, STORAGE_MODE, STORAGE_CONSOLIDATED
 
 logger = logging.getLogger(__name__)
 
 db_master_manager = DatabaseManager()
 
+# Расписание задач, секунд: (интервал, таймаут, jitter)
+# Курсы пересчитываются сразу после изменений (course_tracker), полный обход - страховка согласованности
+COURSE_UPDATE_INTERVAL = 5 * 60 * 60
+COURSE_UPDATE_TIMEOUT = 30 * 60
+COURSE_UPDATE_JITTER = 60
+
+WAL_CHECKPOINT_INTERVAL = 10 * 60
+WAL_CHECKPOINT_TIMEOUT = 5 * 60
+WAL_CHECKPOINT_JITTER = 30
+
+COURSE_HISTORY_COMPACT_INTERVAL = 60 * 60
+COURSE_HISTORY_COMPACT_TIMEOUT = 10 * 60
+COURSE_HISTORY_COMPACT_JITTER = 60
+
+# Обход матчей внутри задачи: границы числа одновременно обрабатываемых матчей и таймаут одного матча, секунд
+MATCH_TASK_MIN_CONCURRENCY = 1
+MATCH_TASK_MAX_CONCURRENCY = 16
+MATCH_TASK_TIMEOUT = 2 * 60
+
+# Время последних запусков задач, чтобы расписание переживало перезапуск бота
+SCHEDULER_STATE_PATH = 'database/scheduler_state.json'
+
+scheduler = AsyncScheduler(state_path=SCHEDULER_STATE_PATH)
+
+# Свой адаптивный лимит у каждого вида обхода матчей: базовая задержка лимитера - самое быстрое окно,
+# поэтому быстрые задачи (checkpoint WAL) в общем лимите делали бы медленные (пересчет курсов) "перегрузкой".
+# Лимит растет, пока базы отвечают быстро, и снижается, когда растут задержки (например, под нагрузкой от пользователей).
+match_task_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def get_match_task_limiter(name: str) -> AdaptiveConcurrencyLimiter:
+    """Возвращает лимит одновременных задач для вида обхода матчей name, создавая его при первом обращении."""
+    limiter = match_task_limiters.get(name)
+
+    if limiter is None:
+        limiter = match_task_limiters[name] = AdaptiveConcurrencyLimiter(
+            min_limit=MATCH_TASK_MIN_CONCURRENCY,
+            max_limit=MATCH_TASK_MAX_CONCURRENCY,
+            name=name
+        )
+
+    return limiter
+
 
 async def master_db_exists() -> bool:
     """возвращает true если существует master.db"""
@@ -19,20 +67,13 @@ async def master_db_exists() -> bool:
         return False
 
 
-async def update_course_currency_for_alone_match(number_match: str):
-    """Обновляет курсы валют для одного матча."""
-    try:
-        db_number_match_manager = DatabaseManager(database_path=number_match)
-        data_currencies: list[dict] | None = await db_number_match_manager.get_all_data_currencies()
-
-        if not data_currencies:
-            raise Exception(f'Список валют пуст')
-
-        for data_currency in data_currencies:
-            if data_currency:
-                await db_number_match_manager.update_course_alone_currency(data_currency=data_currency)
-    except Exception as error:
-        logger.error(f"Ошибка при обновлении курсов валют для № match: {number_match}: {error}")
+async def update_course_currency_for_alone_match(number_match: str) -> int:
+    """
+    Обновляет курсы валют для одного матча. Ошибки попадают в отчет run_tasks.
+    \n\nМатч без валют (например, только что созданный) - не ошибка: возвращается 0, иначе каждый обход
+    новых матчей засчитывался бы адаптивному лимиту как ошибки и снижал число одновременных задач.
+    """
+    return await DatabaseManager(database_path=number_match).update_course_all_currencies()
 
 
 async def async_update_course_currency_for_all_match():
@@ -48,32 +89,153 @@ async def async_update_course_currency_for_all_match():
         if not all_match_numbers:
             raise Exception('Список матчей в master.db пустой')
 
-        tasks = [
+        if STORAGE_MODE == STORAGE_CONSOLIDATED:
+            # Все матчи в одной базе - курсы пересчитываются одним запросом
+            count_updated = await DatabaseManager.update_course_all_matches()
+            logger.info(f'Курсы валют обновлены во всех матчах одним запросом. Валют: {count_updated}')
+            return
+
+        if COURSE_SWEEP_WORKERS > 0:
+            # Файлы матчей обходятся в пуле процессов, цикл событий бота остается свободным для обработчиков
+            report = await sweep_courses_in_process_pool(match_numbers=all_match_numbers)
+
+            for number_match, error in report['errors'].items():
+                logger.error(f"Ошибка при обновлении курсов валют для № match: {number_match}: {error}")
+
+            logger.info(
+                f"Курсы валют обновлены за {report['duration']} с: матчей {report['updated_matches']}/{report['matches']}, "
+                f"валют {report['currencies']}, ошибок {len(report['errors'])}, процессов {report['workers']}"
+            )
+            return
+
+        tasks = (
             lambda match=number_match: update_course_currency_for_alone_match(number_match=match)
             for number_match in all_match_numbers
-        ]
+        )
 
-        await asyncio_gather(tasks=tasks, max_concurrent=4)
+        await run_tasks(tasks=tasks, limiter=get_match_task_limiter('update_course'), timeout=MATCH_TASK_TIMEOUT, name='update_course')
     except Exception as error:
         logger.error(f"Ошибка при обновлении курсов валют: {error}")
 
 
-def update_course_currency_for_all_match():
-    """Синхронная обёртка для вызова асинхронной функции async_update_course_currency_all_match"""
-    asyncio.create_task(async_update_course_currency_for_all_match())
+async def checkpoint_alone_database(number_match: str = None) -> dict | None:
+    """
+    Пассивный checkpoint WAL-журнала одной базы данных: матча или, без number_match, master.db.
+    Ошибки попадают в отчет run_tasks.
+    """
+    db_manager = DatabaseManager(database_path=number_match)
+    name_database = db_manager.SPyderSQLite.db_path
+
+    result_checkpoint = await db_manager.checkpoint_wal()
+
+    if result_checkpoint:
+        logger.info(
+            f"WAL {name_database}: {result_checkpoint['wal_size'] / 1024:.1f} КиБ, "
+            f"перенесено страниц {result_checkpoint['checkpointed_frames']} из {result_checkpoint['wal_frames']}"
+            f"{', база занята' if result_checkpoint['busy'] else ''}"
+        )
+
+    return result_checkpoint
+
 
+async def async_checkpoint_all_databases():
+    """Пассивный checkpoint WAL-журналов master.db и баз данных всех текущих матчей."""
+    logger.info('Запуск процесса: checkpoint WAL-журналов баз данных.')
 
-async def schedule_runner():
-    """Асинхронный планировщик всех задач"""
-    schedule.every(5).hours.do(update_course_currency_for_all_match)
+    try:
+        if not await master_db_exists():
+            raise Exception('Master.db не создана')
+
+        all_match_numbers: list[str] | None = await db_master_manager.get_all_match_numbers() or []
+
+        if STORAGE_MODE == STORAGE_CONSOLIDATED:
+            # Все матчи в одной базе - достаточно одного checkpoint
+            all_match_numbers = all_match_numbers[:1]
+
+        # master.db и базы матчей одним потоком задач: ошибка одной базы не мешает остальным
+        tasks = chain(
+            [checkpoint_alone_database],
+            (
+                lambda match=number_match: checkpoint_alone_database(number_match=str(match))
+                for number_match in all_match_numbers
+            )
+        )
+
+        outcomes = await run_tasks(tasks=tasks, limiter=get_match_task_limiter('checkpoint_wal'), timeout=MATCH_TASK_TIMEOUT, name='checkpoint_wal')
+        results_checkpoint = [outcome.result for outcome in outcomes if outcome.ok and outcome.result]
+
+        logger.info(
+            f"Checkpoint WAL завершен. Матчей с WAL-журналом: {len(results_checkpoint)}, "
+            f"общий размер WAL: {sum(result['wal_size'] for result in results_checkpoint) / 1024:.1f} КиБ"
+        )
+    except Exception as error:
+        logger.error(f"Ошибка при checkpoint WAL-журналов: {error}")
+
+
+async def async_compact_course_history_for_all_match():
+    """Сжатие истории курсов (raw -> hour -> day) и удаление устаревших точек во всех текущих матчах."""
+    logger.info('Запуск процесса: сжатие истории курсов валют, во всех текущих матчах.')
+
+    try:
+        if not await master_db_exists():
+            raise Exception('Master.db не создана')
+
+        all_match_numbers: list[str] | None = await db_master_manager.get_all_match_numbers()
+
+        if not all_match_numbers:
+            raise Exception('Список матчей в master.db пустой')
+
+        if STORAGE_MODE == STORAGE_CONSOLIDATED:
+            # Все матчи в одной базе - история сжимается одной транзакцией
+            count_deleted = await DatabaseManager.compact_course_history_all_matches()
+        else:
+            tasks = (
+                lambda match=number_match: DatabaseManager(database_path=str(match)).compact_course_history()
+                for number_match in all_match_numbers
+            )
 
-    while True:
-        schedule.run_pending()  # Запуск отложенных задач
-        await asyncio.sleep(1)  # Асинхронное ожидание вместо time.sleep
+            outcomes = await run_tasks(tasks=tasks, limiter=get_match_task_limiter('compact_course_history'), timeout=MATCH_TASK_TIMEOUT, name='compact_course_history')
+            count_deleted = sum(outcome.result for outcome in outcomes if outcome.ok)
+
+        logger.info(f'Сжатие истории курсов завершено. Удалено точек: {count_deleted}')
+    except Exception as error:
+        logger.error(f"Ошибка при сжатии истории курсов: {error}")
+
+
+def register_jobs():
+    """Регистрирует периодические задачи бота в планировщике."""
+    scheduler.register(
+        name='update_course_currency_for_all_match',
+        func=async_update_course_currency_for_all_match,
+        interval=COURSE_UPDATE_INTERVAL,
+        timeout=COURSE_UPDATE_TIMEOUT,
+        jitter=COURSE_UPDATE_JITTER
+    )
+
+    scheduler.register(
+        name='checkpoint_all_databases',
+        func=async_checkpoint_all_databases,
+        interval=WAL_CHECKPOINT_INTERVAL,
+        timeout=WAL_CHECKPOINT_TIMEOUT,
+        jitter=WAL_CHECKPOINT_JITTER
+    )
+
+    scheduler.register(
+        name='compact_course_history',
+        func=async_compact_course_history_for_all_match,
+        interval=COURSE_HISTORY_COMPACT_INTERVAL,
+        timeout=COURSE_HISTORY_COMPACT_TIMEOUT,
+        jitter=COURSE_HISTORY_COMPACT_JITTER
+    )
 
 
 async def run_scheduler():
     """Асинхронная обёртка для запуска планировщика"""
-    await schedule_runner()
+    register_jobs()
+
+    await scheduler.run()
 
 
+async def stop_scheduler():
+    """Останавливает планировщик, дожидаясь завершения выполняющихся задач. Вызывается при выключении бота."""
+    await scheduler.stop()
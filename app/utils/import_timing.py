@@ -0,0 +1,84 @@
+import builtins, importlib.util, logging, sys, time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ImportTimer:
+    """
+    Замер времени импорта модулей при запуске бота (аналог python -X importtime в логе).
+    \n\nНа время блока with подменяет builtins.__import__ и для каждого впервые загружаемого модуля считает
+    полное время (вместе с вложенными импортами) и собственное время (без них).
+
+    \n\nПример использования
+        with ImportTimer() as import_timer:
+            from app.handlers import router
+
+        import_timer.log_report()
+    """
+
+    def __init__(self):
+        self.inclusive: Dict[str, float] = {}
+        self.self_time: Dict[str, float] = {}
+        self.total = 0.0
+
+        self._original_import = None
+        self._stack: List[List[float]] = []  # [начало, время вложенных импортов]
+        self._start = 0.0
+
+    def __repr__(self):
+        return f"ImportTimer('modules:{len(self.inclusive)}', 'total:{self.total:.3f}')"
+
+    def __enter__(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        builtins.__import__ = self._original_import
+        self.total = time.perf_counter() - self._start
+        return False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module_name = name
+
+        if level:
+            # Относительный импорт: полное имя модуля считается от пакета импортирующего модуля
+            try:
+                module_name = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                return self._original_import(name, globals, locals, fromlist, level)
+
+        # Замеряются только еще не загруженные модули, остальные импорты идут как обычно
+        if module_name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._stack.append([time.perf_counter(), 0.0])
+
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            start, nested = self._stack.pop()
+            elapsed = time.perf_counter() - start
+
+            self.inclusive[module_name] = self.inclusive.get(module_name, 0.0) + elapsed
+            self.self_time[module_name] = self.self_time.get(module_name, 0.0) + elapsed - nested
+
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def top(self, limit: int = 15) -> List[Tuple[str, float, float]]:
+        """Самые долгие импорты верхнего уровня: [(модуль, полное время, собственное время), ...], секунд."""
+        return sorted(
+            ((name, self.inclusive[name], self.self_time[name]) for name in self.inclusive),
+            key=lambda item: item[1],
+            reverse=True
+        )[:limit]
+
+    def log_report(self, limit: int = 15):
+        """Пишет в лог общее время импорта и limit самых долгих модулей."""
+        logger.info(f'Импорт модулей при запуске: {self.total * 1000:.0f} мс, модулей {len(self.inclusive)}')
+
+        for name, inclusive, self_time in self.top(limit):
+            logger.info(f'    {inclusive * 1000:8.1f} мс (собственное {self_time * 1000:7.1f} мс)  {name}')
@@ -1,5 +1,5 @@
-from SPyderSQL import SQLite
 import ClassesStatesMachine.Statuses as Status
+from app.DatabaseWork.database import DatabaseManager
 
 
 async def identify_chat_type(chat_type : str) -> Status.TypeChat:
@@ -33,20 +33,13 @@ async def identify_chat_type(chat_type : str) -> Status.TypeChat:
 
 async def identify_user_admin(chat_id: int) -> Status.TypeUser:
     """
+    Проверяет по списку администраторов в памяти (admin_registry), без запроса к базе данных.
 
-    :param chat_id: message.chat.id
+    :param chat_id: message.chat.id | callback.from_user.id
     :return: status user type
     """
-    data_users = SQLite.select_table('database/master.db',
-                                 'users',
-                                 ['telegram_id', 'admin'])
+    if await DatabaseManager().is_admin(chat_id):
 
-    for user in data_users:
-
-        if chat_id == user['telegram_id']:
-
-            if user['admin']:
-
-                return Status.TypeUser.ADMIN
+        return Status.TypeUser.ADMIN
 
     return Status.TypeUser.SIMPLE
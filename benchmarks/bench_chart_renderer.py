@@ -0,0 +1,122 @@
+"""
+Бенчмарк отрисовщика диаграмм: скорость и память на RENDERS отрисовок подряд в одном процессе,
+как в процессе пула отрисовки.
+
+Сравниваются:
+- шаблоны фигур (chart_templates): фигура каждого вида строится один раз, перерисовываются только данные;
+- прежняя отрисовка через pyplot: plt.subplots на каждую диаграмму, tight_layout и фигура без plt.close
+  (LEGACY_RENDERS отрисовок - реестр фигур pyplot растет, память растет вместе с ним).
+
+Каждые REPORT_EVERY (LEGACY_REPORT_EVERY) отрисовок выводятся отрисовок в секунду и RSS процесса.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_chart_renderer
+"""
+import gc, os, resource, sys, time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.message_designer.chart_templates import chart_templates
+from app.message_designer.chartzer import render_chart_currency_capitals_from_country, warm_up_renderer
+
+
+RENDERS = 10_000
+LEGACY_RENDERS = 200  # каждая незакрытая фигура 10x10 держит ~4 МБ
+REPORT_EVERY = 1_000
+LEGACY_REPORT_EVERY = 50
+CURRENCIES = 8
+
+
+def get_rss_mb() -> float:
+    """Текущий RSS процесса, МБ (вне Linux - пиковый)."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def make_capitals(index: int) -> list:
+    """Капитал государства: данные меняются от отрисовки к отрисовке, как у разных пользователей."""
+    return [
+        {'currency_tick': f'T{currency}', 'amount': (index * 7 + currency * 13) % 1000 + 1}
+        for currency in range(1, CURRENCIES + 1)
+    ]
+
+
+def render_legacy(number_match: str, from_name_country: str, data_currency_capitals: list) -> bytes:
+    """Прежняя отрисовка: новая фигура 10x10 через pyplot на каждую диаграмму, фигура не закрывается."""
+    from matplotlib import pyplot as plt
+
+    plt.rcParams['figure.max_open_warning'] = 0
+
+    fig, ax = plt.subplots(figsize=(10, 10))
+    ax.pie(
+        [capital['amount'] for capital in data_currency_capitals],
+        labels=[capital['currency_tick'] for capital in data_currency_capitals],
+        autopct='%1.1f%%',
+        wedgeprops=dict(width=0.3),
+        startangle=90
+    )
+    plt.text(
+        0, 0,
+        f'Telegram Bot:\n@Supremacy1914_IMF_Bot\n\n{from_name_country}\n№ матча: {number_match}',
+        fontsize=16,
+        color='white',
+        ha='center',
+        va='center',
+        bbox=dict(facecolor='black', alpha=0.8, edgecolor='white', boxstyle='round,pad=2')
+    )
+    ax.axis('equal')
+    plt.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+
+    return buffer.getvalue()
+
+
+def run(name: str, render, renders: int, report_every: int = REPORT_EVERY):
+    gc.collect()
+    start_rss = get_rss_mb()
+    start = time.perf_counter()
+    window_start = start
+
+    print(f'{name}: {renders} отрисовок, RSS в начале {start_rss:.1f} МБ')
+
+    for index in range(1, renders + 1):
+        render('1', 'Франция', make_capitals(index))
+
+        if index % report_every == 0 or index == renders:
+            now = time.perf_counter()
+            window = (index - 1) % report_every + 1
+
+            rss = get_rss_mb()
+
+            print(
+                f'  {index:6d}: {window / (now - window_start):6.1f} отрисовок/с, '
+                f'RSS {rss:7.1f} МБ (+{rss - start_rss:.1f})'
+            )
+            window_start = now
+
+    elapsed = time.perf_counter() - start
+    print(f'  итого: {renders / elapsed:.1f} отрисовок/с, прирост RSS {get_rss_mb() - start_rss:.1f} МБ')
+
+
+def main():
+    warm_up_renderer()
+
+    run('Шаблоны фигур', render_chart_currency_capitals_from_country, RENDERS)
+    print(f'  шаблоны: {chart_templates.stats()}, pyplot загружен: {"matplotlib.pyplot" in sys.modules}')
+
+    run('pyplot без plt.close (прежняя отрисовка)', render_legacy, LEGACY_RENDERS, LEGACY_REPORT_EVERY)
+
+    from matplotlib import pyplot as plt
+
+    print(f'  фигур в реестре pyplot: {len(plt.get_fignums())}')
+    plt.close('all')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Бенчмарк диаграмм истории курсов и стоимости капитала.
+
+Строит синтетическую историю курсов за CHART_HISTORY_DAYS дней (сырые точки за 2 дня каждые 10 минут,
+дальше часовые) для матчей с разным числом валют и замеряет:
+перевод строк в столбцы NumPy (выполняется в цикле событий бота), подготовку данных и полную отрисовку PNG
+(выполняются в процессе пула отрисовки). Время отрисовки сравнивается с бюджетом CHART_RENDER_TIMEOUT.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_history_charts
+"""
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.message_designer.chart_data import get_history_columns, prepare_course_lines, prepare_portfolio_value
+from app.message_designer.chart_pool import CHART_RENDER_TIMEOUT
+from app.message_designer.chartzer import (
+    CHART_HISTORY_DAYS,
+    render_chart_course_history,
+    render_chart_portfolio_value,
+    warm_up_renderer
+)
+
+
+CURRENCY_COUNTS = (10, 50, 100, 200)
+REPEATS = 5
+HOLDINGS = 30  # сколько валют в капитале государства
+
+
+def make_history_rows(currency_count: int, now: int) -> list:
+    """История курсов в формате DatabaseManager.get_course_history: упорядочено по currency_id и timestamp."""
+    rng = np.random.default_rng(currency_count)
+
+    raw_start = now - 2 * 24 * 60 * 60
+    hour_timestamps = np.arange(now - CHART_HISTORY_DAYS * 24 * 60 * 60, raw_start, 60 * 60)
+    raw_timestamps = np.arange(raw_start, now, 10 * 60)
+    timestamps = np.concatenate((hour_timestamps, raw_timestamps))
+    resolutions = ['hour'] * hour_timestamps.size + ['raw'] * raw_timestamps.size
+
+    rows = []
+
+    for currency_id in range(1, currency_count + 1):
+        courses = np.exp(np.cumsum(rng.normal(0, 0.01, timestamps.size))) * rng.uniform(0.01, 100)
+
+        rows.extend(
+            {'timestamp': int(timestamp), 'currency_id': currency_id, 'course': float(course), 'amount': 1_000_000.0, 'resolution': resolution}
+            for timestamp, course, resolution in zip(timestamps, courses, resolutions)
+        )
+
+    return rows
+
+
+def measure(func, *args) -> float:
+    """Среднее время func(*args) за REPEATS запусков, мс."""
+    start = time.perf_counter()
+
+    for _ in range(REPEATS):
+        func(*args)
+
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main():
+    warm_up_renderer()
+
+    now = int(time.time())
+    budget = CHART_RENDER_TIMEOUT * 1000
+
+    print(f'Бюджет отрисовки (CHART_RENDER_TIMEOUT): {budget:.0f} мс, история за {CHART_HISTORY_DAYS} дн.')
+
+    for currency_count in CURRENCY_COUNTS:
+        rows = make_history_rows(currency_count, now)
+        columns = get_history_columns(rows)
+        ticks = {currency_id: f'T{currency_id}' for currency_id in range(1, currency_count + 1)}
+
+        holding_ids = np.arange(1, min(HOLDINGS, currency_count) + 1, dtype=np.int64)
+        holding_amounts = np.full(holding_ids.size, 1_000_000.0)
+
+        columns_time = measure(get_history_columns, rows)
+        lines_time = measure(prepare_course_lines, columns['timestamp'], columns['currency_id'], columns['course'])
+        portfolio_time = measure(
+            prepare_portfolio_value,
+            columns['timestamp'], columns['currency_id'], columns['course'], holding_ids, holding_amounts
+        )
+        course_render_time = measure(render_chart_course_history, '1', columns, ticks)
+        portfolio_render_time = measure(render_chart_portfolio_value, '1', 'Франция', columns, holding_ids, holding_amounts, ticks)
+
+        worst = max(course_render_time, portfolio_render_time)
+
+        print(
+            f'  валют {currency_count:4d}, точек {len(rows):7d}: '
+            f'столбцы {columns_time:6.1f} мс | подготовка: курсы {lines_time:6.1f} мс, капитал {portfolio_time:6.1f} мс | '
+            f'отрисовка: курсы {course_render_time:7.1f} мс, капитал {portfolio_render_time:7.1f} мс | '
+            f'{"в бюджете" if worst <= budget else "ПРЕВЫШЕН БЮДЖЕТ"}'
+        )
+
+
+if __name__ == '__main__':
+    main()
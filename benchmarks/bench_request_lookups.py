@@ -0,0 +1,93 @@
+"""
+Регрессионный бенчмарк поиска заявок в базе данных матча.
+
+Заполняет таблицы заявок N строками и замеряет среднее время check_requests,
+check_choice_country_in_match_db, get_data_form_emis_nat_currency_request и check_data_currency_exists.
+При поиске через индекс (WHERE ... LIMIT 1) время почти не зависит от N.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_request_lookups
+"""
+import asyncio, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.DatabaseWork.database import DatabaseManager
+from app.DatabaseWork.connection_registry import connection_registry
+
+
+SIZES = (1_000, 10_000, 50_000)
+REPEATS = 200
+
+
+async def fill_match(number_match: str, size: int):
+    """Создает матч и заполняет таблицы заявок size строками чужих пользователей, искомая строка - последняя."""
+    match_db = DatabaseManager(database_path=number_match)
+    await match_db.initialize_match(type_match='Мир в огне')
+
+    await match_db.SPyderSQLite.insert(
+        name_table='country_choice_requests',
+        names_columns=['telegram_id', 'number_match', 'name_country', 'unique_word', 'admin_decision_message_id']
+    ).executemany([
+        (telegram_id, int(number_match), 'Франция', f'word{telegram_id}', 0)
+        for telegram_id in range(1, size + 1)
+    ])
+
+    await match_db.SPyderSQLite.insert(
+        name_table='currency_emission_requests',
+        names_columns=['number_match', 'telegram_id', 'country_id', 'name_currency', 'tick_currency',
+                       'status_confirmed', 'date_confirmed']
+    ).executemany([
+        (int(number_match), telegram_id, telegram_id % 100 + 1, f'cur{telegram_id}', f'T{telegram_id}', True, '2025-01-01 00:00:00')
+        for telegram_id in range(1, size + 1)
+    ] + [(int(number_match), size, 1, 'target', 'TRG', False, '')])
+
+    await match_db.SPyderSQLite.insert(
+        name_table='currency',
+        names_columns=['country_id', 'name', 'tick']
+    ).executemany([
+        (currency_id % 100 + 1, f'currency{currency_id}', f'T{currency_id}')
+        for currency_id in range(1, size + 1)
+    ])
+
+    return match_db
+
+
+async def measure(name: str, factory) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        await factory()
+    elapsed = (time.perf_counter() - start) / REPEATS * 1000
+    print(f'    {name:<45} {elapsed:8.3f} ms')
+    return elapsed
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        os.makedirs('database')
+
+        try:
+            for size in SIZES:
+                number_match = str(size)
+                match_db = await fill_match(number_match, size)
+
+                print(f'Строк в таблицах заявок: {size}')
+                await measure('check_requests(country_choice)',
+                              lambda: match_db.check_requests('country_choice', user_id=size))
+                await measure('check_requests(currency_emission)',
+                              lambda: match_db.check_requests('currency_emission', user_id=size))
+                await measure('check_choice_country_in_match_db',
+                              lambda: match_db.check_choice_country_in_match_db(user_id=size))
+                await measure('get_data_form_emis_nat_currency_request',
+                              lambda: match_db.get_data_form_emis_nat_currency_request(user_id=size))
+                await measure('check_data_currency_exists(name)',
+                              lambda: match_db.check_data_currency_exists(name_currency=f'currency{size}'))
+                await measure('check_data_currency_exists(tick)',
+                              lambda: match_db.check_data_currency_exists(tick_currency=f'T{size}'))
+        finally:
+            await connection_registry.close_all()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
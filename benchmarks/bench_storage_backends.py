@@ -0,0 +1,128 @@
+"""
+Сравнение способов хранения матчей: отдельный файл на матч (files) и общая база (consolidated).
+
+Для 10/100/1000 матчей замеряет:
+    - создание матча (initialize_match);
+    - обход планировщика: пересчет курсов валют во всех матчах;
+    - типичный сценарий обработчика банковского перевода в случайном матче
+      (данные государства, капитал, список бенефициаров, перевод).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_storage_backends
+"""
+import asyncio, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.DatabaseWork.database import DatabaseManager, STORAGE_FILES, STORAGE_CONSOLIDATED, get_country_names
+from app.DatabaseWork.connection_registry import connection_registry
+from app.multi_task import run_tasks
+
+
+SIZES = (10, 100, 1000)
+TYPE_MATCH = 'Великая война'
+COUNTRIES_PER_MATCH = 5
+HANDLER_FLOWS = 300
+
+
+async def fill_match(number_match: str, storage_mode: str) -> float:
+    """Создает матч с COUNTRIES_PER_MATCH занятыми государствами, у каждого своя валюта. Возвращает время создания, мс."""
+    match_db = DatabaseManager(database_path=number_match, storage_mode=storage_mode)
+
+    start = time.perf_counter()
+    await match_db.initialize_match(type_match=TYPE_MATCH)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    for number, name_country in enumerate(get_country_names(TYPE_MATCH)[:COUNTRIES_PER_MATCH], start=1):
+        await match_db.register_country_in_match({'telegram_id': number, 'name_country': name_country, 'unique_word': f'w{number}'})
+
+        await match_db.register_currency_emission_in_match({
+            'id': number,
+            'country_id': await match_db.get_country_id(country_name=name_country),
+            'name_currency': f'валюта{number}',
+            'tick_currency': f'T{number}',
+            'following_resource': 'silver',
+            'course_following': 1000.0,
+            'capitalization': 50000,
+            'amount_emission_currency': 1_000_000.0
+        })
+
+        await match_db.set_national_currency_in_currency_capitals(user_id=number, number_match=number_match)
+
+    return elapsed
+
+
+async def sweep(match_numbers: list[str], storage_mode: str):
+    """Пересчет курсов во всех матчах так же, как это делает планировщик."""
+    if storage_mode == STORAGE_CONSOLIDATED:
+        await DatabaseManager.update_course_all_matches()
+        return
+
+    await run_tasks(
+        tasks=(
+            lambda match=number_match: DatabaseManager(database_path=match, storage_mode=storage_mode).update_course_all_currencies()
+            for number_match in match_numbers
+        ),
+        max_concurrent=4,
+        name='sweep'
+    )
+
+
+async def handler_flow(number_match: str, storage_mode: str):
+    """Запросы, которые делают обработчики банковского перевода от выбора бенефициара до перевода."""
+    match_db = DatabaseManager(database_path=number_match, storage_mode=storage_mode)
+
+    data_country = await match_db.get_data_country(number_match=number_match, user_id=1)
+    await match_db.get_countries_names(busy=True)
+    await match_db.get_data_currency_capitals_from_country(country_id=data_country['country_id'], number_match=number_match)
+
+    beneficiary_country_id = await match_db.get_country_id(country_name=get_country_names(TYPE_MATCH)[1])
+    capitals = await match_db.get_data_currency_capitals_from_country(country_id=data_country['country_id'], number_match=number_match)
+
+    await match_db.perform_bank_transfer(
+        number_match=number_match,
+        payer_country_id=data_country['country_id'],
+        beneficiary_country_id=beneficiary_country_id,
+        currency_id=capitals[0]['currency_id'],
+        amount_currency_transfer=1.0,
+        comment='benchmark',
+        date_request_creation='2025-01-01 00:00:00'
+    )
+
+
+async def run_backend(size: int, storage_mode: str):
+    match_numbers = [str(1_000_000 + number) for number in range(size)]
+
+    initialize_ms = [await fill_match(number_match, storage_mode) for number_match in match_numbers]
+
+    start = time.perf_counter()
+    await sweep(match_numbers, storage_mode)
+    sweep_ms = (time.perf_counter() - start) * 1000
+
+    random.seed(size)
+    start = time.perf_counter()
+    for _ in range(HANDLER_FLOWS):
+        await handler_flow(random.choice(match_numbers), storage_mode)
+    flow_ms = (time.perf_counter() - start) / HANDLER_FLOWS * 1000
+
+    print(f'    {storage_mode:<13} создание матча {sum(initialize_ms) / size:8.3f} мс   '
+          f'обход курсов {sweep_ms:9.2f} мс   сценарий перевода {flow_ms:7.3f} мс')
+
+    await connection_registry.close_all()
+
+
+async def main():
+    for size in SIZES:
+        print(f'Матчей: {size}')
+
+        for storage_mode in (STORAGE_FILES, STORAGE_CONSOLIDATED):
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                os.makedirs('database')
+                DatabaseManager.consolidated_ready = False
+
+                await run_backend(size, storage_mode)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,9 +1,4 @@
 import asyncio, logging, sys
-from app.config import bot, dp
-
-from app.scheduler import run_scheduler
-
-from app.handlers import router
 
 
 # Вывод действий бота в консоль
@@ -16,15 +11,80 @@ def log_processing(state_status : bool):
         logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
 
+# Ссылки на фоновые задачи, чтобы их не удалил сборщик мусора
+background_tasks: set[asyncio.Task] = set()
+
+
+async def on_startup():
+    """Вызывается aiogram при запуске polling: прогрев пула отрисовки диаграмм в фоне, не задерживая polling."""
+    from app.message_designer.chart_pool import chart_render_pool, CHART_RENDER_PREWARM
+
+    if CHART_RENDER_PREWARM:
+        prewarm_task = asyncio.create_task(chart_render_pool.prewarm())
+        prewarm_task.add_done_callback(background_tasks.discard)
+        background_tasks.add(prewarm_task)
+
+
 async def main():
+    """
+    Запуск бота.
+    \n\nМодули бота импортируются здесь, а не на уровне модуля: процессы пулов (обход курсов, отрисовка диаграмм)
+    запускаются методом spawn и заново импортируют run.py как __mp_main__, и импорт app.config на уровне модуля
+    создавал бы в каждом процессе пула своего бота (несколько секунд на запуск процесса).
+    """
+    from app.utils.import_timing import ImportTimer
+
+    # Время импорта модулей пишется в лог при запуске
+    with ImportTimer() as import_timer:
+        from app.config import bot, dp
+
+        from app.scheduler import run_scheduler, stop_scheduler
+
+        from app.handlers import router
+
+        from app.course_sweep import course_sweep_pool
+        from app.DatabaseWork.connection_registry import connection_registry
+        from app.DatabaseWork.course_tracker import course_tracker
+        from app.message_designer.chart_pool import chart_render_pool
+        from app.DatabaseWork.database import DatabaseManager, COUNTRIES_BY_TYPE_MATCH, STORAGE_MODE, STORAGE_CONSOLIDATED
+
+    import_timer.log_report()
+
     # Посредник между файлами run.py и handlers.py
     dp.include_router(router)
+    dp.startup.register(on_startup)
+
+    if STORAGE_MODE == STORAGE_CONSOLIDATED:
+        # Все матчи в одной базе: схема создается один раз при запуске
+        await DatabaseManager.initialize_consolidated_storage()
+    else:
+        # Подготовка шаблонов баз данных матчей, чтобы создание матча было копированием файла
+        for type_match in COUNTRIES_BY_TYPE_MATCH:
+            await DatabaseManager.prepare_match_template(type_match=type_match)
+
+    # Список администраторов загружается в память один раз, дальше проверки прав идут без запросов к master.db
+    await DatabaseManager().load_admin_registry()
 
     # Запуск планировщика
-    asyncio.create_task(run_scheduler())
+    scheduler_task = asyncio.create_task(run_scheduler())
 
     # Запуск бота
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        # Остановка планировщика: выполняющиеся задачи дорабатывают до конца
+        await stop_scheduler()
+        await scheduler_task
+
+        # Пересчет курсов валют, изменения которых еще ждут debounce
+        await course_tracker.flush_all()
+
+        # Остановка процессов обхода курсов и отрисовки диаграмм
+        course_sweep_pool.shutdown()
+        chart_render_pool.shutdown()
+
+        # Закрытие всех открытых соединений с базами данных
+        await connection_registry.close_all()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+from app.adaptive_limiter import AdaptiveConcurrencyLimiter
+
+
+def run_window(limiter: AdaptiveConcurrencyLimiter, latency: float):
+    """Одно окно из limit задач с задержкой latency при занятых местах."""
+    count = limiter.current_limit
+
+    for _ in range(count):
+        limiter.on_start()
+
+    for _ in range(count):
+        limiter.on_finish(latency, ok=True)
+
+
+def test_limit_grows_at_stable_latency():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=16, initial=4)
+
+    for _ in range(10):
+        run_window(limiter, 0.03)
+
+    assert limiter.current_limit == 14
+
+
+def test_limit_backs_off_when_latency_grows():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=16, initial=8)
+
+    run_window(limiter, 0.03)
+    run_window(limiter, 0.3)
+
+    assert limiter.current_limit < 8
+
+
+def test_scheduler_jobs_have_separate_limiters():
+    """Быстрые задачи одного вида не задают базовую задержку задачам другого вида."""
+    from app.scheduler import get_match_task_limiter
+
+    checkpoint_limiter = get_match_task_limiter('checkpoint_wal')
+    sweep_limiter = get_match_task_limiter('update_course')
+
+    assert checkpoint_limiter is not sweep_limiter
+    assert get_match_task_limiter('update_course') is sweep_limiter
+
+    run_window(checkpoint_limiter, 0.001)
+    limit = sweep_limiter.current_limit
+
+    for _ in range(5):
+        run_window(sweep_limiter, 0.03)
+
+    assert sweep_limiter.current_limit > limit
+
+
+def test_sweep_over_matches_without_currencies_keeps_limit(monkeypatch):
+    """Обход новых матчей без валют не считается ошибками и не снижает лимит update_course."""
+    import asyncio
+
+    from app import scheduler
+    from app.DatabaseWork.database import DatabaseManager, STORAGE_FILES
+
+    async def master_db_exists():
+        return True
+
+    async def get_all_match_numbers():
+        return [str(number_match) for number_match in range(1, 201)]
+
+    async def update_course_all_currencies(self):
+        await asyncio.sleep(0.02)  # задержка заметно больше разброса времени цикла событий
+        return 0
+
+    monkeypatch.setattr(scheduler, 'match_task_limiters', {})
+    monkeypatch.setattr(scheduler, 'COURSE_SWEEP_WORKERS', 0)
+    monkeypatch.setattr(scheduler, 'STORAGE_MODE', STORAGE_FILES)
+    monkeypatch.setattr(scheduler, 'master_db_exists', master_db_exists)
+    monkeypatch.setattr(scheduler.db_master_manager, 'get_all_match_numbers', get_all_match_numbers)
+    monkeypatch.setattr(DatabaseManager, 'update_course_all_currencies', update_course_all_currencies)
+
+    limiter = scheduler.get_match_task_limiter('update_course')
+    limit = limiter.current_limit
+
+    asyncio.run(scheduler.async_update_course_currency_for_all_match())
+
+    assert limiter.completed == 200
+    assert limiter.errors == 0
+    assert limiter.decreases == 0
+    assert limiter.current_limit >= limit
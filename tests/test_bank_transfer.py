@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from app.MyException import InsufficientFundsError
+from app.DatabaseWork.connection_registry import connection_registry
+from app.DatabaseWork.course_tracker import course_tracker
+from app.DatabaseWork.database import DatabaseManager, COUNTRIES_BY_TYPE_MATCH
+
+NUMBER_MATCH = '1'
+
+ISSUER_ID = 1
+PAYER_ID = 2
+BENEFICIARY_ID = 3
+CURRENCY_ID = 1
+
+
+@pytest.fixture
+def match_db(tmp_path, monkeypatch):
+    """Матч в файле database/1.db во временном каталоге: валюта государства 1, у государств 1 и 2 есть ее запас."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'database').mkdir()
+
+    db_manager = DatabaseManager(database_path=NUMBER_MATCH)
+
+    async def prepare():
+        await DatabaseManager.build_match_schema(db_manager.SPyderSQLite.db_path, next(iter(COUNTRIES_BY_TYPE_MATCH)))
+        await db_manager.execute(
+            "INSERT INTO currency (id, country_id, name, tick, following_resource, course_following, capitalization, "
+            "emission, current_amount, current_course) VALUES (?, ?, 'крон', 'KRN', 'silver', 1000.0, 50000, 1000.0, 600.0, 1.0)",
+            (CURRENCY_ID, ISSUER_ID)
+        )
+        await db_manager.execute(
+            "INSERT INTO currency_holdings (country_id, currency_id, amount) VALUES (?, ?, 600.0), (?, ?, 100.0)",
+            (ISSUER_ID, CURRENCY_ID, PAYER_ID, CURRENCY_ID)
+        )
+
+    run(prepare())
+
+    return db_manager
+
+
+def run(coroutine):
+    """Выполняет сценарий в своем цикле событий и закрывает соединения, открытые в нем."""
+    async def scenario():
+        try:
+            return await coroutine
+        finally:
+            await course_tracker.flush_all()
+            await connection_registry.close_all()
+
+    return asyncio.run(scenario())
+
+
+def transfer(db_manager: DatabaseManager, payer_country_id: int, beneficiary_country_id: int, amount: float):
+    return db_manager.perform_bank_transfer(
+        number_match=NUMBER_MATCH,
+        payer_country_id=payer_country_id,
+        beneficiary_country_id=beneficiary_country_id,
+        currency_id=CURRENCY_ID,
+        amount_currency_transfer=amount,
+        comment='',
+        date_request_creation='2026-01-01 00:00:00'
+    )
+
+
+def get_state(db_manager: DatabaseManager) -> dict:
+    """{'holdings': {country_id: amount}, 'current_amount', 'transfers'} после перевода."""
+    async def scenario():
+        holdings = await db_manager.execute('SELECT country_id, amount FROM currency_holdings WHERE currency_id = ?', (CURRENCY_ID,))
+        currency = await db_manager.execute('SELECT current_amount FROM currency WHERE id = ?', (CURRENCY_ID,))
+        transfers = await db_manager.execute('SELECT COUNT(*) AS count FROM bank_transfer_requests')
+
+        return {
+            'holdings': {row['country_id']: row['amount'] for row in holdings},
+            'current_amount': currency[0]['current_amount'],
+            'transfers': transfers[0]['count'],
+        }
+
+    return run(scenario())
+
+
+@pytest.mark.parametrize('amount', [0, -5])
+def test_non_positive_amount_is_rejected(amount):
+    db_manager = DatabaseManager(database_path=NUMBER_MATCH)
+
+    with pytest.raises(ValueError):
+        asyncio.run(transfer(db_manager, PAYER_ID, BENEFICIARY_ID, amount))
+
+
+def test_transfer_moves_whole_holding(match_db):
+    """Весь запас отправителя переходит получателю, нулевой остаток удаляется, запас эмитента не меняется."""
+    run(transfer(match_db, PAYER_ID, BENEFICIARY_ID, 100.0))
+
+    assert get_state(match_db) == {
+        'holdings': {ISSUER_ID: 600.0, BENEFICIARY_ID: 100.0},
+        'current_amount': 600.0,
+        'transfers': 1,
+    }
+
+
+def test_issuer_transfer_updates_current_amount(match_db):
+    """Эмитент отдает свою валюту - current_amount уменьшается, получает обратно - растет."""
+    run(transfer(match_db, ISSUER_ID, PAYER_ID, 50.0))
+    assert get_state(match_db)['current_amount'] == 550.0
+
+    run(transfer(match_db, PAYER_ID, ISSUER_ID, 30.0))
+
+    assert get_state(match_db) == {
+        'holdings': {ISSUER_ID: 580.0, PAYER_ID: 120.0},
+        'current_amount': 580.0,
+        'transfers': 2,
+    }
+
+
+def test_overdraft_leaves_balances_unchanged(match_db):
+    """Перевод больше остатка - InsufficientFundsError, ни один остаток и ни одна заявка не записаны."""
+    before = get_state(match_db)
+
+    with pytest.raises(InsufficientFundsError):
+        run(transfer(match_db, PAYER_ID, BENEFICIARY_ID, 100.5))
+
+    assert get_state(match_db) == before
+
+
+def test_concurrent_transfers_do_not_overdraw(match_db):
+    """Два одновременных перевода, вместе больше остатка: проходит ровно один."""
+    async def scenario():
+        return await asyncio.gather(
+            transfer(match_db, PAYER_ID, BENEFICIARY_ID, 70.0),
+            transfer(DatabaseManager(database_path=NUMBER_MATCH), PAYER_ID, BENEFICIARY_ID, 70.0),
+            return_exceptions=True
+        )
+
+    results = run(scenario())
+
+    assert sum(isinstance(result, int) for result in results) == 1
+    assert sum(isinstance(result, InsufficientFundsError) for result in results) == 1
+    assert get_state(match_db) == {
+        'holdings': {ISSUER_ID: 600.0, PAYER_ID: 30.0, BENEFICIARY_ID: 70.0},
+        'current_amount': 600.0,
+        'transfers': 1,
+    }
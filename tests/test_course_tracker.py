@@ -0,0 +1,104 @@
+import asyncio
+
+from app.DatabaseWork.course_tracker import CourseUpdateTracker
+
+
+def test_currencies_marked_during_flush_are_recalculated():
+    """Валюта, отмеченная во время пересчета, пересчитывается следующим кругом того же таймера."""
+    async def scenario():
+        tracker = CourseUpdateTracker(debounce=0.05, max_delay=1.0)
+        recalculated = []
+
+        async def recalculate(currency_ids):
+            recalculated.append(set(currency_ids))
+            await asyncio.sleep(0.1)
+            return len(currency_ids)
+
+        tracker.mark_dirty('match', [1], recalculate)
+        await asyncio.sleep(0.08)  # первый пересчет уже идет
+
+        tracker.mark_dirty('match', [2], recalculate)
+        await asyncio.sleep(0.5)
+
+        return recalculated, tracker.stats()
+
+    recalculated, stats = asyncio.run(scenario())
+
+    assert recalculated == [{1}, {2}]
+    assert stats['pending_matches'] == 0
+    assert stats['recalculated'] == 2
+
+
+def test_marks_within_debounce_are_batched():
+    """Серия отметок в пределах debounce дает один пересчет."""
+    async def scenario():
+        tracker = CourseUpdateTracker(debounce=0.05, max_delay=1.0)
+        recalculated = []
+
+        async def recalculate(currency_ids):
+            recalculated.append(set(currency_ids))
+            return len(currency_ids)
+
+        for currency_id in range(5):
+            tracker.mark_dirty('match', [currency_id], recalculate)
+            await asyncio.sleep(0.01)
+
+        await asyncio.sleep(0.2)
+
+        return recalculated
+
+    assert asyncio.run(scenario()) == [{0, 1, 2, 3, 4}]
+
+
+def test_failed_recalculation_is_retried():
+    """После ошибки пересчета валюты возвращаются в ожидание и пересчитываются через debounce."""
+    async def scenario():
+        tracker = CourseUpdateTracker(debounce=0.05, max_delay=1.0)
+        attempts = []
+
+        async def recalculate(currency_ids):
+            attempts.append(set(currency_ids))
+
+            if len(attempts) == 1:
+                raise OSError('database is locked')
+
+            return len(currency_ids)
+
+        tracker.mark_dirty('match', [1, 2], recalculate)
+        await asyncio.sleep(0.3)
+
+        return attempts, tracker.stats()
+
+    attempts, stats = asyncio.run(scenario())
+
+    assert attempts == [{1, 2}, {1, 2}]
+    assert stats['errors'] == 1
+    assert stats['recalculated'] == 2
+    assert stats['pending_matches'] == 0
+
+
+def test_flush_all_waits_for_running_recalculation():
+    """flush_all не отменяет идущий пересчет и пересчитывает валюты, которые еще ждут debounce."""
+    async def scenario():
+        tracker = CourseUpdateTracker(debounce=0.05, max_delay=1.0)
+        finished = []
+
+        async def recalculate(currency_ids):
+            await asyncio.sleep(0.1)
+            finished.append(set(currency_ids))
+            return len(currency_ids)
+
+        tracker.mark_dirty('running', [1], recalculate)
+        await asyncio.sleep(0.08)  # пересчет 'running' уже идет
+
+        tracker.mark_dirty('waiting', [2], recalculate)
+        count_updated = await tracker.flush_all()
+
+        return finished, count_updated, tracker.stats()
+
+    finished, count_updated, stats = asyncio.run(scenario())
+
+    assert sorted(map(sorted, finished)) == [[1], [2]]
+    assert count_updated == 1
+    assert stats['recalculated'] == 2
+    assert stats['pending_matches'] == 0